@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MMO_board.settings')
+# Страницы для чтения - асинхронными view (mmo_board_chat/async_views.py)
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 CKEDITOR_UPLOAD_PATH = "uploads/"
+# Загрузки из редактора хранятся с дедупликацией по содержимому, как и Post.image
+CKEDITOR_STORAGE_BACKEND = 'mmo_board_chat.storage.ContentAddressedStorage'
 CKEDITOR_CONFIGS = {
     'default': {
         'toolbar': 'Custom',
@@ -73,9 +75,16 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
 
+# Очередь исходящих писем (mmo_board_chat/mail.py, manage.py send_outbox)
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60  # секунды, удваивается после каждой неудачи
+
 
 SITE_URL = 'http://127.0.0.1:8000'
 
+EMAIL_CONFIRMATION_MAX_AGE = 3 * 24 * 60 * 60  # Срок действия кода подтверждения, секунды
+
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
@@ -85,11 +94,16 @@ LOGIN_REDIRECT_URL = 'mmo_board_chat:profile'
 LOGOUT_REDIRECT_URL = 'mmo_board_chat:home'
 
 MIDDLEWARE = [
+    'mmo_board_chat.middleware.PrecompressedStaticMiddleware',  # Собранная статика - до всей цепочки
+    'mmo_board_chat.middleware.RequestMetricsMiddleware',  # Замер всей цепочки
     'django.middleware.security.SecurityMiddleware',
+    'mmo_board_chat.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Пользователь сессии из кеша - только с общим кешем (Redis), см. mmo_board_chat/cache.py
+    'mmo_board_chat.middleware.CachedAuthenticationMiddleware' if os.getenv('REDIS_URL')
+    else 'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -98,7 +112,7 @@ ROOT_URLCONF = 'MMO_board.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'mmo_board_chat.metrics.InstrumentedDjangoTemplates',  # DjangoTemplates + замер времени
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -107,6 +121,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'mmo_board_chat.context_processors.fragment_cache',
             ],
         },
     },
@@ -114,17 +129,164 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'MMO_board.wsgi.application'
 
+# Замеры запросов (mmo_board_chat/metrics.py): заголовок Server-Timing и журнал медленных запросов
+SERVER_TIMING_HEADER = True
+REQUEST_SLOW_MS = int(os.getenv('REQUEST_SLOW_MS', 500))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Медленные запросы - одной JSON-строкой на запрос
+        'mmo_board_chat.requests': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+# Асинхронные версии home/post_detail/profile/api_posts; asgi.py включает их по умолчанию
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', '0') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# sqlite3 с PRAGMA при подключении; транзакции с записью - через write_transaction() с BEGIN IMMEDIATE
+# (см. mmo_board_chat/sqlite_backend)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'mmo_board_chat.sqlite_backend',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'pragmas': {
+                'journal_mode': 'wal',  # Читатели не блокируются записью
+                'synchronous': 'normal',  # В режиме WAL - без fsync на каждый коммит
+                'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),  # мс ожидания блокировки
+                'cache_size': -20000,  # ~20 МБ кеша страниц на соединение
+                'mmap_size': 128 * 1024 * 1024,
+                'temp_store': 'memory',
+            },
+        },
     }
 }
 
+# Копии для чтения: пути к файлам SQLite через запятую (manage.py sync_replicas копирует в них основную базу)
+# Запросы GET читают с копий; после записи пользователь читает с основной базы, пока копии не синхронизированы
+# (время синхронизации пишет sync_replicas), но не дольше REPLICA_PIN_SECONDS
+
+REPLICA_DATABASES = []
+for index, replica_path in enumerate(filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': replica_path.strip(),
+        'OPTIONS': {
+            **DATABASES['default']['OPTIONS'],
+            'pragmas': {**DATABASES['default']['OPTIONS']['pragmas'], 'query_only': 1},
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['mmo_board_chat.routers.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 300))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# По умолчанию - кеш в памяти процесса; при заданном REDIS_URL - общий Redis
+
+FRAGMENT_CACHE_TIMEOUT = 60 * 60  # Карточки объявлений, секунды
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        },
+        'fragments': {
+            'BACKEND': 'mmo_board_chat.cache.StatsRedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'KEY_PREFIX': 'fragments',
+            'TIMEOUT': FRAGMENT_CACHE_TIMEOUT,
+        },
+        'ratelimit': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'KEY_PREFIX': 'ratelimit',
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'KEY_PREFIX': 'sessions',
+        },
+    }
+    RATELIMIT_BACKEND = 'mmo_board_chat.ratelimit.CacheBackend'
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'mmo-board-default',
+        },
+        'fragments': {
+            'BACKEND': 'mmo_board_chat.cache.StatsLocMemCache',
+            'LOCATION': 'mmo-board-fragments',
+            'TIMEOUT': FRAGMENT_CACHE_TIMEOUT,
+            'OPTIONS': {
+                'MAX_ENTRIES': 5000,  # Сверх лимита вытесняются давно не читанные карточки
+                'CULL_FREQUENCY': 10,  # За раз вытесняется 1/10 записей
+            },
+        },
+        'ratelimit': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'mmo-board-ratelimit',
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'mmo-board-sessions',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+    RATELIMIT_BACKEND = 'mmo_board_chat.ratelimit.LocalBackend'
+
+
+# Сессии: с общим кешем (Redis) чтение из кеша, запись - в кеш и в базу (база - на случай
+# вытеснения из кеша и перезапуска); кеш в памяти процесса не видел бы выхода и смены пароля
+# в других процессах, поэтому без Redis - только база.
+# Строки истёкших сессий в базе удаляет manage.py clearsessions (cron)
+
+if os.getenv('REDIS_URL'):
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_COOKIE_AGE = 14 * 24 * 60 * 60
+
+# Загруженный пользователь сессии (CachedAuthenticationMiddleware, только с Redis), сбрасывается при сохранении User
+AUTH_USER_CACHE_ALIAS = 'sessions'
+AUTH_USER_CACHE_TIMEOUT = 5 * 60
+
+
+# Ограничение частоты запросов (mmo_board_chat/ratelimit.py)
+# Без Redis счётчики свои у каждого процесса - лимиты действуют на процесс
+
+RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', '1') == '1'
+RATELIMIT_CACHE = 'ratelimit'
+# За обратным прокси: заголовок с адресом клиента (например HTTP_X_FORWARDED_FOR) и число прокси перед Django
+RATELIMIT_IP_HEADER = os.getenv('RATELIMIT_IP_HEADER') or None
+RATELIMIT_TRUSTED_PROXIES = int(os.getenv('RATELIMIT_TRUSTED_PROXIES', 1))
+RATE_LIMITS = {
+    'login:ip': '30/m',
+    'login:account': '10/5m',
+    'register:ip': '5/h',
+    'confirm:ip': '20/m',
+    'resend:ip': '5/h',
+    'resend:account': '3/h',
+}
+AUTH_MAX_CONCURRENT = int(os.getenv('AUTH_MAX_CONCURRENT', 4))  # Одновременных проверок пароля на процесс
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -162,6 +324,14 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'mmo_board_chat/static')]
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# manage.py build_assets: бандлы, имена с хешем, сжатые копии .gz/.br (mmo_board_chat/assets.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'mmo_board_chat.storage.CompressedManifestStaticFilesStorage'},
+}
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60  # Кеш браузера для файлов с хешем в имени, секунды
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -169,4 +339,8 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'mmo_board_chat/static')]
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Уменьшенные копии изображений объявлений (mmo_board_chat/images.py)
+IMAGE_VARIANT_WORKERS = 2  # Фоновые потоки обработки загрузок
+IMAGE_VARIANTS_INLINE = False  # True - обрабатывать сразу после коммита, без фонового потока
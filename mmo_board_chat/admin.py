@@ -1,9 +1,53 @@
 from django.contrib import admin
-from .models import User, Category, Post, Reply
+from django.utils import timezone
+from .models import User, Category, Post, Reply, OutgoingEmail
 
 admin.site.register(Category)
-admin.site.register(Post)
-admin.site.register(Reply)
+
+
+@admin.register(Post)
+class PostAdmin(admin.ModelAdmin):
+    list_display = ('title', 'author', 'category', 'reply_count', 'accepted_reply_count', 'created_at')
+    list_select_related = ('author', 'category')
+    readonly_fields = ('reply_count', 'accepted_reply_count')
+
+
+@admin.register(Reply)
+class ReplyAdmin(admin.ModelAdmin):
+    list_display = ('post', 'author', 'is_accepted', 'created_at')
+    list_select_related = ('post', 'author')
+    list_filter = ('is_accepted',)
+    actions = ['accept_replies']
+
+    @admin.action(description='Принять выбранные отклики')
+    def accept_replies(self, request, queryset):
+        """
+        Принятие через save(), чтобы сработали сигналы:
+        счётчики объявлений и уведомления авторов
+        """
+        accepted = 0
+        for reply in queryset.filter(is_accepted=False):
+            reply.is_accepted = True
+            reply.save()
+            accepted += 1
+        self.message_user(request, f'Принято откликов: {accepted}')
+
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient', 'subject', 'dedup_key')
+    actions = ['retry_now']
+
+    @admin.action(description='Отправить повторно при следующем запуске воркера')
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=OutgoingEmail.SENT).update(
+            status=OutgoingEmail.PENDING, attempts=0, next_attempt_at=timezone.now(),
+        )
+        self.message_user(request, f'Поставлено в очередь: {updated}')
+
 
 from django.contrib.auth.admin import UserAdmin
 
@@ -13,6 +57,7 @@ class CustomUserAdmin(UserAdmin):
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Personal info', {'fields': ('username',)}),
+        ('Notifications', {'fields': ('notification_frequency',)}),
         ('Permissions', {'fields': ('is_active', 'is_staff', 'is_superuser')}),
     )
     add_fieldsets = (
@@ -8,3 +8,11 @@ class MmoBoardChatConfig(AppConfig):
     def ready(self):
         # Импортируем сигналы только после полной загрузки приложения
         import mmo_board_chat.signals
+        from django.db.backends.signals import connection_created
+        from mmo_board_chat.metrics import install_query_recorder
+        from mmo_board_chat.routers import install_write_detector
+
+        # Замер SQL-запросов для RequestMetricsMiddleware
+        connection_created.connect(install_query_recorder, dispatch_uid='mmo_board_chat.metrics')
+        # Запись через cursor() мимо роутера тоже закрепляет запрос за основной базой
+        connection_created.connect(install_write_detector, dispatch_uid='mmo_board_chat.routers')
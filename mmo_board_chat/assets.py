@@ -0,0 +1,105 @@
+"""
+СБОРКА СТАТИКИ
+
+Bootstrap и Bootstrap Icons хранятся у нас (static/mmo_board_chat/vendor,
+manage.py build_assets --fetch скачивает их с CDN), а не грузятся с
+jsdelivr на каждой странице. build_assets склеивает их со своими стилями
+в бандлы dist/site.css и dist/site.js (CSS минифицируется, относительные
+url() пересчитываются под каталог dist) и запускает collectstatic:
+хранилище CompressedManifestStaticFilesStorage (storage.py) даёт файлам
+имена с хешем содержимого и пишет рядом сжатые .gz/.br. Раздаёт их
+PrecompressedStaticMiddleware с заголовками на год (immutable).
+
+Пока бандлы не собраны, шаблон ({% asset_bundle %}) подключает исходные
+файлы с CDN, как раньше.
+"""
+import posixpath
+import re
+
+# Каталог статики приложения относительно STATICFILES_DIRS
+STATIC_PREFIX = 'mmo_board_chat'
+
+# Файл в vendor/ -> откуда скачивать
+VENDOR_FILES = {
+    'bootstrap/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'bootstrap/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'bootstrap-icons/bootstrap-icons.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css',
+    'bootstrap-icons/fonts/bootstrap-icons.woff2':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/fonts/bootstrap-icons.woff2',
+    'bootstrap-icons/fonts/bootstrap-icons.woff':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/fonts/bootstrap-icons.woff',
+}
+
+# Бандл в dist/ -> исходные файлы (пути относительно STATIC_PREFIX) по порядку
+BUNDLES = {
+    'site.css': [
+        'vendor/bootstrap/bootstrap.min.css',
+        'vendor/bootstrap-icons/bootstrap-icons.css',
+        'css/styles.css',
+    ],
+    'site.js': [
+        'vendor/bootstrap/bootstrap.bundle.min.js',
+    ],
+}
+
+# Подключение без сборки: внешние адреса или пути статики
+UNBUILT_BUNDLES = {
+    'site.css': [VENDOR_FILES['bootstrap/bootstrap.min.css'],
+                 VENDOR_FILES['bootstrap-icons/bootstrap-icons.css'],
+                 'css/styles.css'],
+    'site.js': [VENDOR_FILES['bootstrap/bootstrap.bundle.min.js']],
+}
+
+_SOURCE_MAP_RE = re.compile(r'^\s*(?:/\*#\s*sourceMappingURL=.*?\*/|//#\s*sourceMappingURL=.*)$', re.M)
+_STRING = r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\''
+_CSS_COMMENT_RE = re.compile(rf'({_STRING})|/\*(?!!).*?\*/', re.S)
+_CSS_STRING_RE = re.compile(rf'({_STRING})')
+_CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+_URL_SUFFIX_RE = re.compile(r'([^?#]*)(.*)', re.S)
+
+
+def bundle_path(name):
+    return f'{STATIC_PREFIX}/dist/{name}'
+
+
+def strip_source_maps(text):
+    """Ссылки на .map убираются: карт у нас нет, а collectstatic требует существующий файл"""
+    return _SOURCE_MAP_RE.sub('', text)
+
+
+def minify_css(css):
+    """Удаление комментариев (кроме /*! лицензий */) и лишних пробелов; строки не трогаются"""
+    css = _CSS_COMMENT_RE.sub(lambda match: match.group(1) or '', css)
+    parts = _CSS_STRING_RE.split(css)
+    for index in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[index])
+        part = re.sub(r'\s*([{};,])\s*', r'\1', part)
+        part = re.sub(r':\s+', ':', part)  # Пробел перед двоеточием значим (a :hover), после - нет
+        parts[index] = part.replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def rebase_css_urls(css, source, target_dir):
+    """Относительные url() файла source (путь от STATIC_PREFIX) - относительно каталога target_dir"""
+    source_dir = posixpath.dirname(source)
+
+    def rebase(match):
+        quote, url = match.groups()
+        if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        path, suffix = _URL_SUFFIX_RE.match(url).groups()  # suffix - ?query и #fragment
+        target = posixpath.normpath(posixpath.join(source_dir, path))
+        return f'url({quote}{posixpath.relpath(target, target_dir)}{suffix}{quote})'
+
+    return _CSS_URL_RE.sub(rebase, css)
+
+
+def build_bundle(name, read):
+    """Текст бандла; read(path) возвращает исходный файл по пути от STATIC_PREFIX"""
+    sources = BUNDLES[name]
+    if name.endswith('.css'):
+        return minify_css('\n'.join(
+            rebase_css_urls(strip_source_maps(read(source)), source, 'dist') for source in sources
+        ))
+    return ';\n'.join(strip_source_maps(read(source)).strip().rstrip(';') for source in sources) + ';\n'
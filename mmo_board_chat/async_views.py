@@ -0,0 +1,95 @@
+"""
+АСИНХРОННЫЕ ВЕРСИИ СТРАНИЦ ДЛЯ ЧТЕНИЯ (ASGI)
+
+Под ASGI синхронный view целиком выполняется в общем потоке sync_to_async
+и держит его, пока ждёт базу. Эти версии ходят в базу асинхронным ORM
+(aget, aaggregate, async for), а шаблон рендерят через sync_to_async
+уже по загруженным данным. Условные GET (304) - те же, что у синхронных
+версий (conditional.py). Запросы, меняющие данные (POST), передаются
+синхронным view. Подключаются в urls.py при ASYNC_VIEWS = True
+(выставляется в asgi.py).
+
+Логика выборок общая с views.py - здесь только порядок await.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
+
+from . import views
+from .conditional import conditional_view
+from .forms import ReplyForm
+from .models import Post
+from .pagination import apaginate_keyset
+from .serializers import PostSerializer, astream_page
+
+arender = sync_to_async(render)
+
+
+async def _load_user(request):
+    """
+    Загрузка пользователя из сессии до рендеринга
+    request.user ленивый: первое обращение из шаблона в async-контексте ходило бы в базу
+    """
+    return await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+
+
+@conditional_view(views.feed_freshness, personal=True)
+async def home(request):
+    """Главная страница со списком объявлений, постранично по курсору"""
+    await _load_user(request)
+    posts = views.home_queryset()
+    try:
+        page = await apaginate_keyset(posts, before=request.GET.get('before'), after=request.GET.get('after'))
+    except ValueError:
+        page = await apaginate_keyset(posts)
+    return await arender(request, 'mmo_board_chat/home.html', views.home_context(page))
+
+
+@conditional_view(views.post_freshness, personal=True)
+async def post_detail(request, post_id):
+    """Просмотр объявления; отправка отклика (POST) - синхронной версией"""
+    if request.method == 'POST':
+        return await sync_to_async(views.post_detail)(request, post_id)
+
+    await _load_user(request)
+    try:
+        post = await Post.objects.select_related('author', 'category').aget(id=post_id)
+    except Post.DoesNotExist:
+        raise Http404('Объявление не найдено')
+    replies = [reply async for reply in views.post_replies(post)]
+    return await arender(request, 'mmo_board_chat/post_detail.html', {
+        'post': post,
+        'replies': replies,
+        'form': ReplyForm(),
+    })
+
+
+async def profile(request):
+    """Приватная страница с откликами на объявления пользователя"""
+    user = await _load_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+
+    status_filter, post_filter = views.profile_filters(request)
+    replies = views.profile_replies(user, status_filter, post_filter)
+    try:
+        page = await apaginate_keyset(replies, before=request.GET.get('before'), after=request.GET.get('after'))
+    except ValueError:
+        page = await apaginate_keyset(replies)
+
+    user_posts = [post async for post in views.profile_user_posts(user)]
+    totals = await views.profile_counted_posts(user, post_filter).aaggregate(**views.PROFILE_TOTALS)
+
+    context = views.profile_context(request, page, user_posts, totals, status_filter, post_filter)
+    return await arender(request, 'mmo_board_chat/profile.html', context)
+
+
+@conditional_view(views.api_posts_freshness)
+async def api_posts(request):
+    """Список объявлений (JSON), строки читаются асинхронно"""
+    try:
+        posts = views.api_posts_queryset(request)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return views.api_page_response(request, posts, PostSerializer, stream=astream_page)
@@ -0,0 +1,135 @@
+"""
+КЕШ С УЧЁТОМ ПОПАДАНИЙ
+
+Обёртки над стандартными бэкендами Django, которые считают попадания
+и промахи в текущем процессе. Статистика доступна персоналу по
+/staff/cache-stats/ и нужна для подбора размера кеша и TTL.
+
+Здесь же - кеш загруженного пользователя сессии (CachedAuthenticationMiddleware):
+авторизованный запрос не ходит в базу за User. Запись сбрасывается
+при сохранении/удалении пользователя (signals.py) и истекает через
+AUTH_USER_CACHE_TIMEOUT. Включается только с общим кешем (REDIS_URL):
+в кеше отдельного процесса сброс не дошёл бы до остальных процессов.
+"""
+import threading
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.utils.crypto import constant_time_compare
+
+_MISSING = object()
+
+
+class CacheStatsMixin:
+    """Подсчёт попаданий/промахов для get() и get_many()"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, hits, misses):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count(0, 1)
+            return default
+        self._count(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version=version)
+        self._count(len(found), len(keys) - len(found))
+        return found
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 3) if total else None,
+        }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.hits = self.misses = 0
+
+
+class StatsLocMemCache(CacheStatsMixin, LocMemCache):
+    """
+    Кеш в памяти процесса
+    При переполнении MAX_ENTRIES вытесняются давно не использованные записи (LRU)
+    """
+
+    def stats(self):
+        data = super().stats()
+        data['entries'] = len(self._cache)
+        data['max_entries'] = self._max_entries
+        return data
+
+
+class StatsRedisCache(CacheStatsMixin, RedisCache):
+    """Redis (общий для процессов); вытеснение задаётся maxmemory-policy allkeys-lru на сервере"""
+
+
+def all_cache_stats():
+    """Статистика всех кешей, которые её ведут"""
+    return {
+        alias: caches[alias].stats()
+        for alias in caches.settings
+        if isinstance(caches[alias], CacheStatsMixin)
+    }
+
+
+def _user_cache():
+    return caches[getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'default')]
+
+
+def user_cache_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def _can_authenticate(backend_path, user):
+    user_can_authenticate = getattr(auth.load_backend(backend_path), 'user_can_authenticate', None)
+    return user_can_authenticate is None or user_can_authenticate(user)
+
+
+def get_cached_user(request):
+    """
+    Пользователь сессии: сначала из кеша, при промахе - стандартной загрузкой из базы
+    Закешированный объект принимается, только если совпадают хеш сессии
+    (его пароль) и бэкенд и бэкенд по-прежнему допускает пользователя
+    (is_active) - как при обычной проверке в django.contrib.auth
+    """
+    user_id = request.session.get(SESSION_KEY)
+    if user_id is None:
+        return AnonymousUser()
+    backend = request.session.get(BACKEND_SESSION_KEY)
+    cache = _user_cache()
+    cached = cache.get(user_cache_key(user_id))
+    if cached is not None:
+        cached_backend, user = cached
+        session_hash = request.session.get(HASH_SESSION_KEY, '')
+        if (cached_backend == backend and backend in settings.AUTHENTICATION_BACKENDS
+                and constant_time_compare(session_hash, user.get_session_auth_hash())
+                and _can_authenticate(backend, user)):
+            return user
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(user_cache_key(user_id), (backend, user), settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+def forget_cached_user(user_id):
+    _user_cache().delete(user_cache_key(user_id))
@@ -0,0 +1,107 @@
+"""
+УСЛОВНЫЕ GET-ЗАПРОСЫ (ETag / Last-Modified)
+
+Перед view выполняется дешёвая проверка свежести (один запрос по индексу:
+Post.updated_at, время последнего отклика, MAX(updated_at) ленты и
+FeedVersion - её меняют удаления и переименования авторов и категорий). Если
+у клиента или прокси та же версия, ответ - 304 без выборок страницы и
+шаблонов. Счётчики откликов и готовые превью меняют Post.updated_at,
+поэтому новая версия страницы видна по этой отметке.
+
+Страницы с персональной частью (шапка с пользователем, форма с CSRF)
+помечаются personal=True: в ETag добавляется id пользователя, ответ
+получает Vary: Cookie и Cache-Control: private для вошедших, а
+Last-Modified отдаётся только анонимам - по одной дате нельзя отличить
+страницу, показанную другому пользователю. Пока в сессии есть
+непоказанные сообщения (messages), условный ответ не выдаётся.
+
+Django 4.2 condition() не умеет async-view, поэтому здесь своя обёртка
+над get_conditional_response для обоих вариантов.
+"""
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+def _personal_part(request):
+    """Часть ETag от пользователя; None - условный ответ не выдаётся"""
+    if len(messages.get_messages(request)):  # len() не помечает сообщения показанными
+        return None
+    user_id = request.user.pk if request.user.is_authenticated else 0
+    return [user_id, settings.CSRF_COOKIE_NAME in request.COOKIES]
+
+
+def _validators(request, name, freshness, personal, args, kwargs):
+    """(ETag, Last-Modified, private) для GET/HEAD; (None, None, False) - без условного ответа"""
+    if request.method not in ('GET', 'HEAD'):
+        return None, None, False
+    stamps = freshness(request, *args, **kwargs)
+    if stamps is None:
+        return None, None, False
+
+    parts = [name, *stamps]
+    private = False
+    if personal:
+        personal_part = _personal_part(request)
+        if personal_part is None:
+            return None, None, False
+        parts += personal_part
+        private = request.user.is_authenticated
+    etag = quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+    last_modified = None
+    moments = [stamp for stamp in stamps if isinstance(stamp, datetime)]
+    if moments and not private:
+        last_modified = int(max(moments).timestamp())
+    return etag, last_modified, private
+
+
+def _finish(request, response, etag, last_modified, private, personal):
+    if etag is None or not (200 <= response.status_code < 300 or response.status_code == 304):
+        return response
+    if not response.has_header('ETag'):
+        response.headers['ETag'] = etag
+    if last_modified and not response.has_header('Last-Modified'):
+        response.headers['Last-Modified'] = http_date(last_modified)
+    # Кешировать можно, но каждый раз сверяясь с сервером
+    patch_cache_control(response, no_cache=True, **({'private': True} if private else {}))
+    if personal:
+        patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def conditional_view(freshness, personal=False):
+    """
+    Декоратор view (синхронного или async): 304 по ETag/Last-Modified
+    freshness(request, *args, **kwargs) - список отметок версии (datetime, числа)
+    или None, если условный ответ невозможен (например, объекта нет - пусть view вернёт 404)
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                etag, last_modified, private = await sync_to_async(_validators)(
+                    request, view.__name__, freshness, personal, args, kwargs)
+                response = None
+                if etag is not None:
+                    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(request, response, etag, last_modified, private, personal)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                etag, last_modified, private = _validators(request, view.__name__, freshness, personal, args, kwargs)
+                response = None
+                if etag is not None:
+                    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                return _finish(request, response, etag, last_modified, private, personal)
+        return wrapper
+    return decorator
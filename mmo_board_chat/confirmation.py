@@ -0,0 +1,39 @@
+"""
+ТОКЕНЫ ПОДТВЕРЖДЕНИЯ EMAIL
+
+Код подтверждения не хранится в базе: это подписанный (django.core.signing,
+SECRET_KEY) токен с id пользователя, отпечатком email и временем выдачи.
+Проверка - подпись, срок EMAIL_CONFIRMATION_MAX_AGE и одна выборка по
+первичному ключу. Выдача токена базу не трогает.
+
+Токен перестаёт действовать после подтверждения (ищется только
+неподтверждённый пользователь) и после смены email (не совпадёт отпечаток).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core import signing
+
+from .models import User
+
+SALT = 'mmo_board_chat.email_confirmation'
+
+
+def _email_digest(email):
+    return hashlib.sha256(email.lower().encode()).hexdigest()[:12]
+
+
+def make_confirmation_token(user):
+    return signing.dumps([user.pk, _email_digest(user.email)], salt=SALT)
+
+
+def user_by_confirmation_token(token):
+    """Неподтверждённый пользователь по токену; None - токен неверный, истёк или уже использован"""
+    try:
+        pk, digest = signing.loads(token, salt=SALT, max_age=settings.EMAIL_CONFIRMATION_MAX_AGE)
+        user = User.objects.filter(pk=int(pk), email_confirmed=False).first()
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    if user is None or _email_digest(user.email) != digest:
+        return None
+    return user
@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def fragment_cache(request):
+    """Срок кеша фрагментов для {% cache %} в любом шаблоне (карточки объявлений)"""
+    return {'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT}
@@ -0,0 +1,53 @@
+"""
+ДЕНОРМАЛИЗОВАННЫЕ СЧЁТЧИКИ ОТКЛИКОВ
+
+Post.reply_count и Post.accepted_reply_count меняются атомарно через F(),
+чтобы параллельные запросы не затирали значения друг друга. Вместе с ними
+обновляется Post.updated_at - по нему проверяется свежесть страниц (conditional.py).
+Изменения ленты, которые не видны по Post.updated_at, увеличивают FeedVersion.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def change_reply_counters(post_id, replies=0, accepted=0):
+    """Сдвиг счётчиков объявления на заданные величины одним UPDATE"""
+    from .models import Post
+
+    changes = {}
+    if replies:
+        changes['reply_count'] = F('reply_count') + replies
+    if accepted:
+        changes['accepted_reply_count'] = F('accepted_reply_count') + accepted
+    if changes:
+        Post.objects.filter(pk=post_id).update(updated_at=timezone.now(), **changes)
+
+
+def bump_feed_version():
+    """Новая версия ленты (удаление объявления, переименование автора или категории) - в текущей транзакции"""
+    from .models import FeedVersion
+
+    if not FeedVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        FeedVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
+def rebuild_reply_counters(post_model, reply_model, posts=None):
+    """
+    Полный пересчёт счётчиков одним UPDATE с подзапросами
+    Принимает модели явно, чтобы работать и из миграций
+    Возвращает число обновлённых объявлений
+    """
+    def counted(condition=None):
+        replies = reply_model.objects.filter(post=OuterRef('pk'))
+        if condition is not None:
+            replies = replies.filter(condition)
+        subquery = replies.order_by().values('post').annotate(n=Count('pk')).values('n')
+        return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+    if posts is None:
+        posts = post_model.objects.all()
+    return posts.update(
+        reply_count=counted(),
+        accepted_reply_count=counted(Q(is_accepted=True)),
+    )
@@ -0,0 +1,112 @@
+"""
+СВОДКИ ОБ ОТКЛИКАХ
+
+Для авторов, выбравших часовую или дневную сводку, уведомления о новых
+откликах копятся в ReplyNotification. send_digests() собирает их двумя
+сгруппированными запросами и ставит в очередь одно письмо на автора за окно.
+При переходе автора на мгновенные письма накопленное уходит сразу
+одной сводкой (flush_digest).
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from .mail import enqueue_email
+from .models import ReplyNotification, User
+
+
+def window_end(frequency, now=None):
+    """
+    Граница окна сводки: начало текущего часа или дня
+    В сводку попадают уведомления, созданные до этой границы
+    """
+    now = timezone.localtime(now or timezone.now())
+    if frequency == User.NOTIFY_HOURLY:
+        return now.replace(minute=0, second=0, microsecond=0)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def window_label(frequency, start):
+    """Человекочитаемое начало сводки (самое старое уведомление) для темы письма"""
+    start = timezone.localtime(start)
+    if frequency == User.NOTIFY_HOURLY:
+        return start.strftime('%d.%m.%Y %H:00')
+    return start.strftime('%d.%m.%Y')
+
+
+def build_digest_body(author, total, posts):
+    """Текст сводки: общее число откликов и разбивка по объявлениям"""
+    lines = [f'Здравствуйте, {author["recipient__username"]}!', '', f'Новых откликов: {total}', '']
+    for title, count in posts:
+        lines.append(f'  • "{title}": {count}')
+    lines += ['', f'Просмотреть все отклики: {settings.SITE_URL}/profile/']
+    return '\n'.join(lines)
+
+
+def enqueue_digests(pending, frequency, dedup_key):
+    """
+    Одна сводка на автора по уведомлениям pending (двумя сгруппированными запросами)
+    dedup_key(author) - ключ письма; возвращает число сводок
+    """
+    # Запрос 1: итоги по каждому автору
+    authors = list(
+        pending.values('recipient_id', 'recipient__email', 'recipient__username')
+        .annotate(total=Count('pk'), last_id=Max('pk'), first_at=Min('created_at'))
+        .order_by('recipient_id')
+    )
+    if not authors:
+        return 0
+
+    # Запрос 2: разбивка по объявлениям для всех авторов сразу
+    per_post = defaultdict(list)
+    rows = (
+        pending.values('recipient_id', 'reply__post__title')
+        .annotate(count=Count('pk'))
+        .order_by('recipient_id', '-count')
+    )
+    for row in rows:
+        per_post[row['recipient_id']].append((row['reply__post__title'], row['count']))
+
+    for author in authors:
+        with transaction.atomic():
+            enqueue_email(
+                dedup_key=dedup_key(author),
+                recipient=author['recipient__email'],
+                subject=f'Сводка откликов на ваши объявления с {window_label(frequency, author["first_at"])}',
+                body=build_digest_body(author, author['total'], per_post[author['recipient_id']]),
+            )
+            pending.filter(recipient_id=author['recipient_id'], pk__lte=author['last_id']).update(sent_at=timezone.now())
+    return len(authors)
+
+
+def send_digests(frequency, now=None):
+    """
+    Постановка в очередь сводок за закрытое окно для выбранной частоты
+    Уведомления помечаются отправленными в той же транзакции, что и письмо,
+    поэтому повторный запуск ничего не дублирует
+    Возвращает число поставленных в очередь сводок
+    """
+    end = window_end(frequency, now)
+    pending = ReplyNotification.objects.filter(
+        sent_at__isnull=True,
+        recipient__notification_frequency=frequency,
+        created_at__lt=end,
+    )
+    return enqueue_digests(
+        pending, frequency, lambda author: f'digest:{frequency}:{author["recipient_id"]}:{end.isoformat()}',
+    )
+
+
+def flush_digest(user, frequency):
+    """
+    Сводка из всех ещё не отправленных уведомлений пользователя, не дожидаясь окна
+    Вызывается при переходе на мгновенные письма: send_digests их больше не выберет
+    frequency - прежняя частота (для темы письма)
+    """
+    pending = ReplyNotification.objects.filter(sent_at__isnull=True, recipient=user)
+    return enqueue_digests(
+        pending, frequency, lambda author: f'digest:flush:{author["recipient_id"]}:{author["last_id"]}',
+    )
@@ -0,0 +1,165 @@
+"""
+ЖИВЫЕ УВЕДОМЛЕНИЯ ОБ ОТКЛИКАХ (SERVER-SENT EVENTS)
+
+Хаб внутри процесса: сигналы Reply публикуют события после фиксации
+транзакции, а асинхронный view /profile/events/ раздаёт их подписчикам.
+Последние события каждого пользователя хранятся в кольцевом буфере,
+чтобы переподключившийся браузер получил пропущенное по Last-Event-ID.
+Буферы не копятся бесконечно: событие хранится EVENT_BUFFER_TTL секунд,
+буферов - не больше EVENT_BUFFER_USERS (вытесняются давно не получавшие
+событий пользователи).
+
+Хаб живёт в памяти процесса: события видят только соединения того же
+процесса, поэтому SSE и запись откликов должен обслуживать один
+ASGI-процесс (uvicorn/daphne MMO_board.asgi:application). Под WSGI
+поток занимал бы рабочий поток сервера и ничего не доставлял -
+/profile/events/ отвечает 204, и страница не подключается вовсе.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+
+EVENT_BUFFER_SIZE = getattr(settings, 'EVENT_BUFFER_SIZE', 50)  # Событий на пользователя для повтора
+EVENT_BUFFER_TTL = getattr(settings, 'EVENT_BUFFER_TTL', 10 * 60)  # Сколько секунд событие доступно для повтора
+EVENT_BUFFER_USERS = getattr(settings, 'EVENT_BUFFER_USERS', 10000)  # Пользователей с буфером на процесс
+EVENT_HEARTBEAT_SECONDS = getattr(settings, 'EVENT_HEARTBEAT_SECONDS', 15)
+EVENT_RETRY_MS = 5000  # Через сколько браузер переподключается после обрыва
+# Поток закрывается сервером не реже этого срока (браузер сразу переподключается с Last-Event-ID);
+# так освобождаются подписки клиентов, которые ушли, не закрыв соединение явно
+EVENT_STREAM_MAX_SECONDS = getattr(settings, 'EVENT_STREAM_MAX_SECONDS', 300)
+
+# Очередь подписчика не растёт бесконечно, если клиент не успевает читать
+_SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Event:
+    def __init__(self, event_id, event_type, data):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+        self.created = time.monotonic()
+
+    def encode(self):
+        """Кадр в формате text/event-stream"""
+        payload = json.dumps(self.data, cls=DjangoJSONEncoder, ensure_ascii=False)
+        return f'id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n'
+
+
+class EventHub:
+    """
+    Публикация из любого потока, подписка из цикла событий asyncio
+    Номера событий растут монотонно в пределах процесса
+    """
+
+    def __init__(self, buffer_size=EVENT_BUFFER_SIZE, buffer_ttl=EVENT_BUFFER_TTL, max_users=EVENT_BUFFER_USERS):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._buffer_size = buffer_size
+        self._buffer_ttl = buffer_ttl
+        self._max_users = max_users
+        self._buffers = OrderedDict()  # user_id -> deque событий; в начале - давно не получавшие событий
+        self._subscribers = defaultdict(set)  # user_id -> {(loop, queue)}
+
+    def _evict_buffers(self, now):
+        """Буферы сверх лимита и буферы, все события которых старше TTL (под self._lock)"""
+        while self._buffers:
+            user_id, buffer = next(iter(self._buffers.items()))
+            if len(self._buffers) <= self._max_users and buffer[-1].created > now - self._buffer_ttl:
+                break
+            del self._buffers[user_id]
+
+    def publish(self, user_id, event_type, data):
+        with self._lock:
+            event = Event(next(self._ids), event_type, data)
+            buffer = self._buffers.pop(user_id, None) or deque(maxlen=self._buffer_size)
+            buffer.append(event)
+            self._buffers[user_id] = buffer
+            self._evict_buffers(event.created)
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._deliver, queue, event)
+        return event
+
+    @staticmethod
+    def _deliver(queue, event):
+        if queue.full():
+            queue.get_nowait()  # Медленный клиент теряет самое старое событие
+        queue.put_nowait(event)
+
+    def subscribe(self, user_id, last_event_id=None):
+        """
+        Регистрация подписчика в текущем цикле событий
+        Возвращает (очередь новых событий, пропущенные события после last_event_id)
+        """
+        queue = asyncio.Queue(maxsize=_SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[user_id].add((asyncio.get_running_loop(), queue))
+            missed = []
+            if last_event_id is not None:
+                oldest = time.monotonic() - self._buffer_ttl
+                missed = [event for event in self._buffers.get(user_id, ())
+                          if event.id > last_event_id and event.created > oldest]
+        return queue, missed
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            remaining = {item for item in self._subscribers.get(user_id, ()) if item[1] is not queue}
+            if remaining:
+                self._subscribers[user_id] = remaining
+            else:
+                self._subscribers.pop(user_id, None)
+
+
+hub = EventHub()
+
+
+def streaming_supported(request):
+    """Бесконечный поток имеет смысл только под ASGI"""
+    return isinstance(request, ASGIRequest)
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def event_stream(user_id, last_event_id=None, heartbeat=EVENT_HEARTBEAT_SECONDS,
+                       max_seconds=EVENT_STREAM_MAX_SECONDS):
+    """Асинхронный генератор кадров SSE: повтор пропущенного, затем новые события и пинги"""
+    queue, missed = hub.subscribe(user_id, last_event_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    try:
+        yield f'retry: {EVENT_RETRY_MS}\n\n'
+        for event in missed:
+            yield event.encode()
+        while loop.time() < deadline:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=min(heartbeat, max(deadline - loop.time(), 0)))
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'  # Комментарий SSE: держит соединение через прокси
+                continue
+            yield event.encode()
+    finally:
+        hub.unsubscribe(user_id, queue)
+
+
+def reply_event_data(reply):
+    return {
+        'reply_id': reply.pk,
+        'post_id': reply.post_id,
+        'post_title': reply.post.title,
+        'author': reply.author.username,
+        'text': reply.text[:200],
+        'is_accepted': reply.is_accepted,
+        'created_at': reply.created_at,
+    }
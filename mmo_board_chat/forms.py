@@ -16,13 +16,12 @@ class RegisterForm(UserCreationForm):
     def save(self, commit=True):
         """
         Переопределенный метод сохранения
-        Генерирует код подтверждения после создания пользователя
+        Одна запись в базу: код подтверждения не хранится (см. confirmation.py)
         """
         user = super().save(commit=False)
         user.email = self.cleaned_data['email']
         if commit:
             user.save()
-            user.generate_confirmation_code()  # Генерируем код подтверждения
         return user
 
 class PostForm(forms.ModelForm):
@@ -68,4 +67,13 @@ class ReplyForm(forms.ModelForm):
         }
         labels = {
             'text': ''
-        }
\ No newline at end of file
+        }
+
+class NotificationSettingsForm(forms.ModelForm):
+    """ФОРМА НАСТРОЙКИ УВЕДОМЛЕНИЙ ОБ ОТКЛИКАХ"""
+    class Meta:
+        model = User
+        fields = ['notification_frequency']
+        widgets = {
+            'notification_frequency': forms.Select(attrs={'class': 'form-select'}),
+        }
@@ -0,0 +1,166 @@
+"""
+ПРОИЗВОДНЫЕ ИЗОБРАЖЕНИЯ ОБЪЯВЛЕНИЙ
+
+После загрузки Post.image в фоне создаются уменьшенные копии (JPEG и WebP):
+thumb - превью для ленты, display - для страницы объявления.
+Файлы кладутся рядом с оригиналом, их имена и размеры хранятся
+в Post.image_variants. Для уже загруженных картинок -
+manage.py build_image_variants.
+"""
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .sqlite_backend.base import write_transaction
+
+logger = logging.getLogger(__name__)
+
+# Имя варианта -> (ширина, высота, обрезать до точного размера)
+# Необрезанные варианты сохраняют пропорции оригинала и вместе образуют srcset
+VARIANTS = {
+    'thumb': (480, 270, True),
+    'display_small': (640, 640, False),
+    'display': (1280, 1280, False),
+}
+
+# Формат Pillow -> (расширение, параметры сохранения)
+FORMATS = {
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Пул фоновых потоков создаётся при первой загрузке картинки, а не при импорте моделей"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2),
+                    thread_name_prefix='image-variants',
+                )
+    return _executor
+
+
+def responsive_variants():
+    """Варианты с пропорциями оригинала - для srcset"""
+    return [name for name, (width, height, crop) in VARIANTS.items() if not crop]
+
+
+def image_storage():
+    from .models import Post
+
+    return Post._meta.get_field('image').storage
+
+
+def variant_name(original_name, variant, extension):
+    """posts/abc.png -> posts/abc__thumb.webp"""
+    directory, filename = posixpath.split(original_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, f'{stem}__{variant}.{extension}')
+
+
+def render_variant(image, width, height, crop):
+    """Уменьшенная копия; маленькие картинки не увеличиваются"""
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    copy = image.copy()
+    copy.thumbnail((width, height), Image.LANCZOS)
+    return copy
+
+
+def generate_variants(original_name, storage=None):
+    """
+    Создание всех вариантов для файла из хранилища
+    Файлы сохраняются через storage: ContentAddressedStorage при этом записывает
+    счётчики ссылок (StoredBlob) в БД, поэтому в дочернем процессе нужны
+    загруженный Django и своё соединение (см. build_image_variants)
+    Возвращает словарь для Post.image_variants
+    """
+    storage = storage or image_storage()
+    with storage.open(original_name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    variants = {}
+    for variant, (width, height, crop) in VARIANTS.items():
+        resized = render_variant(image, width, height, crop)
+        entry = {'width': resized.width, 'height': resized.height}
+        for image_format, (extension, options) in FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, image_format.upper(), **options)
+            name = variant_name(original_name, variant, extension)
+            entry[image_format] = storage.save(name, ContentFile(buffer.getvalue()))
+        variants[variant] = entry
+    return variants
+
+
+def variant_files(variants):
+    """Пути всех файлов из Post.image_variants"""
+    return [entry[image_format] for entry in variants.values() for image_format in FORMATS if entry.get(image_format)]
+
+
+def release_files(names, storage=None):
+    """Освобождение файлов в хранилище (при дедупликации - снятие ссылки)"""
+    storage = storage or image_storage()
+    for name in names:
+        if name:
+            storage.delete(name)
+
+
+def store_variants(post_id, original_name, variants):
+    """
+    Запись результата, только если картинку за это время не заменили
+    Прежние копии освобождаются; если запись не состоялась - освобождаются новые
+    """
+    from .models import Post
+
+    with write_transaction():  # Чтение под блокировкой записи, затем запись
+        current = (
+            Post.objects.select_for_update()
+            .filter(pk=post_id, image=original_name)
+            .values_list('image_variants', flat=True)
+            .first()
+        )
+        if current is not None:
+            # updated_at - карточка и страница объявления меняются (превью)
+            Post.objects.filter(pk=post_id).update(image_variants=variants, updated_at=timezone.now())
+    release_files(variant_files(variants if current is None else current))
+
+
+def process_post_image(post_id, original_name):
+    """Задача фонового потока: создать варианты и сохранить их в БД"""
+    try:
+        store_variants(post_id, original_name, generate_variants(original_name))
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s объявления %s', original_name, post_id)
+    finally:
+        connections.close_all()  # Соединения этого потока
+
+
+def schedule_variants(post):
+    """
+    Постановка обработки изображения объявления после фиксации транзакции
+    При IMAGE_VARIANTS_INLINE = True обработка идёт сразу (удобно в тестах)
+    """
+    post_id, original_name = post.pk, post.image.name
+
+    def run():
+        if getattr(settings, 'IMAGE_VARIANTS_INLINE', False):
+            store_variants(post_id, original_name, generate_variants(original_name))
+        else:
+            get_executor().submit(process_post_image, post_id, original_name)
+
+    transaction.on_commit(run)
@@ -0,0 +1,106 @@
+"""
+ОЧЕРЕДЬ ПИСЕМ (OUTBOX)
+
+enqueue_email() только пишет строку в таблицу OutgoingEmail - вызывается
+внутри транзакции вместе с изменением данных, SMTP в запросе не участвует.
+deliver_outbox() забирает письма пачками и отправляет их через одно
+SMTP-соединение; вызывается командой manage.py send_outbox.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+
+def outbox_setting(name):
+    """Настройки очереди читаются при вызове - работает override_settings"""
+    defaults = {
+        'OUTBOX_BATCH_SIZE': 50,
+        'OUTBOX_MAX_ATTEMPTS': 5,
+        'OUTBOX_RETRY_DELAY': 60,  # секунды, удваивается с каждой попыткой
+    }
+    return getattr(settings, name, defaults[name])
+
+
+def enqueue_email(dedup_key, recipient, subject, body):
+    """
+    Постановка письма в очередь
+    Повторная постановка с тем же dedup_key игнорируется
+    """
+    OutgoingEmail.objects.bulk_create(
+        [OutgoingEmail(dedup_key=dedup_key, recipient=recipient, subject=subject, body=body)],
+        ignore_conflicts=True,
+    )
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед следующей попыткой"""
+    return timedelta(seconds=outbox_setting('OUTBOX_RETRY_DELAY') * 2 ** (attempts - 1))
+
+
+def deliver_outbox(batch_size=None, max_attempts=None, max_batches=None):
+    """
+    Отправка накопившихся писем пачками по batch_size
+    Все пачки идут через одно соединение get_connection()
+    batch_size и max_attempts по умолчанию - из настроек OUTBOX_*
+    Возвращает (отправлено, ошибок)
+    """
+    batch_size = batch_size or outbox_setting('OUTBOX_BATCH_SIZE')
+    max_attempts = max_attempts or outbox_setting('OUTBOX_MAX_ATTEMPTS')
+    sent = failed = batches = 0
+    connection = get_connection(fail_silently=False)
+    opened = False  # Открываем явно, иначе бэкенд закрывает соединение после каждого письма
+    try:
+        while max_batches is None or batches < max_batches:
+            due = list(
+                OutgoingEmail.objects
+                .filter(status=OutgoingEmail.PENDING, next_attempt_at__lte=timezone.now())
+                .order_by('next_attempt_at', 'pk')[:batch_size]
+            )
+            if not due:
+                break
+            batches += 1
+
+            for email in due:
+                message = EmailMessage(
+                    subject=email.subject,
+                    body=email.body,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[email.recipient],
+                    connection=connection,
+                )
+                try:
+                    if not opened:
+                        connection.open()
+                        opened = True
+                    message.send()
+                except Exception as exc:
+                    failed += 1
+                    attempts = email.attempts + 1
+                    logger.warning('Не удалось отправить письмо %s (попытка %s): %s', email.pk, attempts, exc)
+                    OutgoingEmail.objects.filter(pk=email.pk).update(
+                        attempts=attempts,
+                        status=OutgoingEmail.FAILED if attempts >= max_attempts else OutgoingEmail.PENDING,
+                        next_attempt_at=timezone.now() + retry_delay(attempts),
+                        last_error=str(exc),
+                    )
+                    # Соединение могло оборваться - следующая отправка откроет новое
+                    connection.close()
+                    opened = False
+                else:
+                    sent += 1
+                    OutgoingEmail.objects.filter(pk=email.pk).update(
+                        status=OutgoingEmail.SENT,
+                        attempts=email.attempts + 1,
+                        sent_at=timezone.now(),
+                        last_error='',
+                    )
+    finally:
+        connection.close()
+    return sent, failed
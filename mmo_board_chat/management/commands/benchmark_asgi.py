@@ -0,0 +1,125 @@
+import asyncio
+import importlib
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import clear_url_caches
+
+from mmo_board_chat.models import Post, User
+
+
+def _reload_urlconfs():
+    """Пересборка URL после смены ASYNC_VIEWS"""
+    import mmo_board_chat.urls
+    import MMO_board.urls
+
+    importlib.reload(mmo_board_chat.urls)
+    importlib.reload(MMO_board.urls)
+    clear_url_caches()
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает MMO_board.asgi.application множеством одновременных медленных клиентов '
+        'и сравнивает синхронные и асинхронные версии страниц для чтения. '
+        'Работает с текущей базой: нужны объявления (и пользователь для --login)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=50, help='Одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=5.0, help='Длительность прогона, секунды')
+        parser.add_argument('--client-delay', type=float, default=0.05,
+                            help='Задержка клиента на каждом фрагменте ответа (медленная сеть), секунды')
+        parser.add_argument('--login', help='Email пользователя: добавить в нагрузку /profile/ от его имени')
+
+    def handle(self, *args, **options):
+        from MMO_board.asgi import application
+
+        post_id = Post.objects.order_by('-created_at').values_list('pk', flat=True).first()
+        if post_id is None:
+            raise CommandError('В базе нет объявлений')
+        paths = ['/', f'/posts/{post_id}/', '/api/posts/?limit=50']
+
+        cookie = ''
+        if options['login']:
+            user = User.objects.filter(email=options['login']).first()
+            if user is None:
+                raise CommandError(f'Пользователь {options["login"]} не найден')
+            client = Client()
+            client.force_login(user)
+            cookie = '; '.join(f'{key}={morsel.value}' for key, morsel in client.cookies.items())
+            paths.append('/profile/')
+
+        for mode, async_views in (('sync', False), ('async', True)):
+            with override_settings(ASYNC_VIEWS=async_views):
+                _reload_urlconfs()
+                result = asyncio.run(self.run_load(application, paths, cookie, options))
+            self.report(mode, result, options['duration'])
+        _reload_urlconfs()
+
+    async def run_load(self, application, paths, cookie, options):
+        deadline = time.monotonic() + options['duration']
+        latencies = []
+        errors = 0
+
+        async def client(offset):
+            nonlocal errors
+            index = offset
+            while time.monotonic() < deadline:
+                path = paths[index % len(paths)]
+                index += 1
+                started = time.monotonic()
+                status = await self.request(application, path, cookie, options['client_delay'])
+                if status != 200:
+                    errors += 1
+                latencies.append(time.monotonic() - started)
+
+        await asyncio.gather(*(client(offset) for offset in range(options['clients'])))
+        return {'latencies': sorted(latencies), 'errors': errors}
+
+    async def request(self, application, path, cookie, delay):
+        """Один запрос по протоколу ASGI; клиент медленно читает каждый фрагмент тела"""
+        path, _, query = path.partition('?')
+        headers = [(b'host', b'localhost')]
+        if cookie:
+            headers.append((b'cookie', cookie.encode()))
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'query_string': query.encode(), 'root_path': '', 'headers': headers,
+            'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+        }
+        request_sent = False
+        status = None
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Event().wait()  # Клиент не отключается до конца ответа
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body' and delay:
+                await asyncio.sleep(delay)
+
+        await application(scope, receive, send)
+        return status
+
+    def report(self, mode, result, duration):
+        latencies = result['latencies']
+        if not latencies:
+            self.stdout.write(f'{mode:>6}: нет завершённых запросов')
+            return
+
+        def percentile(share):
+            return latencies[min(int(len(latencies) * share), len(latencies) - 1)] * 1000
+
+        self.stdout.write(
+            f'{mode:>6}: запросов/с {len(latencies) / duration:8.1f}  '
+            f'p50 {percentile(0.5):7.1f} мс  p95 {percentile(0.95):7.1f} мс  ошибок {result["errors"]}'
+        )
@@ -0,0 +1,136 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F
+
+from mmo_board_chat.models import Category, Post, Reply, User
+from mmo_board_chat.sqlite_backend.base import DEFAULT_PRAGMAS, write_transaction
+
+# Поведение стандартного бэкенда: журнал отката, полный fsync, BEGIN DEFERRED
+BASELINE_OPTIONS = {'pragmas': {'journal_mode': 'delete', 'synchronous': 'full'}, 'transaction_mode': None}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite при параллельных чтении и записи: '
+        'стандартные настройки против PRAGMA из DATABASES и записи через write_transaction (BEGIN IMMEDIATE)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=5.0, help='Длительность каждого прогона, секунды')
+        parser.add_argument('--readers', type=int, default=4, help='Потоков чтения')
+        parser.add_argument('--writers', type=int, default=2, help='Потоков записи')
+        parser.add_argument('--posts', type=int, default=200, help='Объявлений в тестовой базе')
+
+    def handle(self, *args, **options):
+        # Миграция 0002 заполняет счётчики в базе 'default', даже когда мигрируется другая база
+        executor = MigrationExecutor(connections['default'])
+        if executor.migration_plan(executor.loader.graph.leaf_nodes()):
+            raise CommandError('Сначала примените миграции основной базы: manage.py migrate')
+
+        default = connections['default'].settings_dict
+        tuned = {
+            'pragmas': default['OPTIONS'].get('pragmas', DEFAULT_PRAGMAS),
+            'transaction_mode': default['OPTIONS'].get('transaction_mode'),
+        }
+        # Профиль -> (OPTIONS, чем открывать транзакцию записи)
+        profiles = [('baseline', BASELINE_OPTIONS, transaction.atomic), ('tuned', tuned, write_transaction)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name, db_options, begin_write in profiles:
+                alias = f'benchmark_{name}'
+                connections.settings[alias] = {
+                    **default,
+                    'ENGINE': 'mmo_board_chat.sqlite_backend',
+                    'NAME': os.path.join(directory, f'{name}.sqlite3'),
+                    'OPTIONS': db_options,
+                    'TEST': {**default.get('TEST', {}), 'NAME': None},
+                }
+                self.prepare(alias, options['posts'])
+                result = self.run_workload(alias, options, begin_write)
+                connections[alias].close()
+                self.report(name, result, options['duration'])
+
+    def prepare(self, alias, posts):
+        """Схема и данные для прогона; сигналы не вызываются (bulk_create)"""
+        call_command('migrate', database=alias, verbosity=0)
+        author = User.objects.db_manager(alias).create_user(email='bench@example.com', username='bench', password='x')
+        category = Category.objects.using(alias).create(name='tank')
+        Post.objects.using(alias).bulk_create([
+            Post(title=f'Объявление {index}', content='<p>Текст</p>', content_html='<p>Текст</p>',
+                 excerpt='Текст', author_id=author.pk, category_id=category.pk)
+            for index in range(posts)
+        ])
+
+    def run_workload(self, alias, options, begin_write):
+        """Потоки чтения (лента) и записи (отклик + счётчик) работают одновременно duration секунд"""
+        author_id = User.objects.using(alias).values_list('pk', flat=True).first()
+        post_ids = list(Post.objects.using(alias).values_list('pk', flat=True))
+        stop = threading.Event()
+        lock = threading.Lock()
+        result = {'reads': 0, 'writes': 0, 'errors': 0, 'write_latency': []}
+
+        def reader():
+            done = errors = 0
+            while not stop.is_set():
+                try:
+                    list(
+                        Post.objects.using(alias)
+                        .select_related('author', 'category')
+                        .defer(*Post.HEAVY_FIELDS)
+                        .order_by('-created_at', '-id')[:20]
+                    )
+                    done += 1
+                except OperationalError:
+                    errors += 1
+            connections[alias].close()
+            with lock:
+                result['reads'] += done
+                result['errors'] += errors
+
+        def writer(offset):
+            done = errors = 0
+            latency = []
+            index = offset
+            while not stop.is_set():
+                post_id = post_ids[index % len(post_ids)]
+                index += 1
+                started = time.perf_counter()
+                try:
+                    with begin_write(using=alias):
+                        Reply.objects.using(alias).bulk_create([Reply(post_id=post_id, author_id=author_id, text='+')])
+                        Post.objects.using(alias).filter(pk=post_id).update(reply_count=F('reply_count') + 1)
+                    done += 1
+                    latency.append(time.perf_counter() - started)
+                except OperationalError:
+                    errors += 1
+            connections[alias].close()
+            with lock:
+                result['writes'] += done
+                result['errors'] += errors
+                result['write_latency'] += latency
+
+        threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=writer, args=(index,)) for index in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return result
+
+    def report(self, name, result, duration):
+        latency = sorted(result['write_latency'])
+        p95 = latency[int(len(latency) * 0.95)] * 1000 if latency else 0
+        self.stdout.write(
+            f'{name:>8}: чтений/с {result["reads"] / duration:8.1f}  '
+            f'записей/с {result["writes"] / duration:8.1f}  '
+            f'p95 записи {p95:6.1f} мс  ошибок блокировки {result["errors"]}'
+        )
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from mmo_board_chat.models import Post
+from mmo_board_chat.perf import LATENCY_SCALE, VIEW_BUDGETS, benchmark_targets, measure_view
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50/p95 и число SQL-запросов страниц home, post_detail, profile и api_posts '
+        'через тестовый клиент на текущей базе (см. seed_board); ошибка - при превышении бюджета'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--report', help='Сохранить результаты в JSON-файл')
+        parser.add_argument('--no-fail', action='store_true', help='Только отчёт, без проверки бюджетов')
+
+    def handle(self, *args, **options):
+        if not Post.objects.exists():
+            raise CommandError('В базе нет объявлений: сначала manage.py seed_board')
+
+        user, urls = benchmark_targets()
+        setup_test_environment()  # Тестовый клиент в обычном окружении
+        try:
+            client = Client()
+            client.force_login(user)
+            results = [measure_view(client, name, url, options['iterations']) for name, url in urls.items()]
+        finally:
+            teardown_test_environment()
+
+        for stats in results:
+            self.stdout.write(str(stats))
+        if options['report']:
+            with open(options['report'], 'w') as report:
+                json.dump({stats.name: stats.as_dict() for stats in results}, report, ensure_ascii=False, indent=2)
+
+        errors = [error for stats in results for error in stats.budget_errors(VIEW_BUDGETS, LATENCY_SCALE)]
+        if errors and not options['no_fail']:
+            raise CommandError('Превышены бюджеты:\n' + '\n'.join(errors))
@@ -0,0 +1,76 @@
+import gzip
+import os
+from urllib.request import urlopen
+
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from mmo_board_chat.assets import BUNDLES, STATIC_PREFIX, VENDOR_FILES, build_bundle, strip_source_maps
+
+
+class Command(BaseCommand):
+    help = (
+        'Собирает статику: Bootstrap и Bootstrap Icons из static/mmo_board_chat/vendor (--fetch - скачать с CDN) '
+        'и наши стили склеиваются в dist/site.css и dist/site.js, затем collectstatic '
+        '(имена с хешем содержимого и сжатые копии .gz/.br)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fetch', action='store_true', help='Скачать недостающие файлы vendor/')
+        parser.add_argument('--refresh', action='store_true', help='Скачать все файлы vendor/ заново')
+        parser.add_argument('--no-collect', action='store_true', help='Только бандлы, без collectstatic')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.root = os.path.join(apps.get_app_config('mmo_board_chat').path, 'static', STATIC_PREFIX)
+
+        self.vendor(fetch=options['fetch'] or options['refresh'], refresh=options['refresh'])
+        for name in BUNDLES:
+            self.write_bundle(name)
+        if not options['no_collect']:
+            call_command('collectstatic', interactive=False, verbosity=self.verbosity)
+
+    def log(self, message):
+        if self.verbosity:
+            self.stdout.write(message)
+
+    def source_path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def vendor(self, fetch, refresh):
+        missing = [name for name in VENDOR_FILES if refresh or not os.path.exists(self.source_path(f'vendor/{name}'))]
+        if missing and not fetch:
+            raise CommandError('Нет файлов в vendor/: ' + ', '.join(missing) + '. Запустите с --fetch')
+        for name in missing:
+            url = VENDOR_FILES[name]
+            self.log(f'Скачивание {url}')
+            try:
+                with urlopen(url, timeout=30) as response:
+                    data = response.read()
+            except OSError as exc:
+                raise CommandError(f'Не удалось скачать {url}: {exc}')
+            if name.endswith(('.css', '.js')):
+                data = strip_source_maps(data.decode('utf-8')).encode('utf-8')
+            path = self.source_path(f'vendor/{name}')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(data)
+
+    def read(self, name):
+        with open(self.source_path(name), encoding='utf-8') as file:
+            return file.read()
+
+    def write_bundle(self, name):
+        text = build_bundle(name, self.read)
+        path = self.source_path(f'dist/{name}')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+
+        data = text.encode('utf-8')
+        source_size = sum(os.path.getsize(self.source_path(source)) for source in BUNDLES[name])
+        self.log(
+            f'dist/{name}: исходные {source_size / 1024:.1f} КБ, бандл {len(data) / 1024:.1f} КБ, '
+            f'gzip {len(gzip.compress(data, compresslevel=9)) / 1024:.1f} КБ'
+        )
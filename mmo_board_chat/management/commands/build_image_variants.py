@@ -0,0 +1,58 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from mmo_board_chat.images import generate_variants, store_variants
+from mmo_board_chat.models import Post
+
+
+def _generate(post_id, name):
+    """
+    Работа дочернего процесса: файлы вариантов и их счётчики ссылок (StoredBlob)
+    Соединение с БД у процесса своё; Post.image_variants записывает родительский процесс
+    """
+    try:
+        return post_id, name, generate_variants(name), None
+    except Exception as exc:
+        return post_id, name, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии для уже загруженных изображений объявлений (параллельно, в нескольких процессах)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                            help='Число процессов обработки')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Сколько изображений отдавать в пул за раз')
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать варианты и для уже обработанных изображений')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            posts = posts.filter(image_variants={})
+        pending = list(posts.order_by('pk').values_list('pk', 'image'))
+
+        # Дочерние процессы открывают свои соединения (StoredBlob) и не должны наследовать открытое
+        connections.close_all()
+
+        done = failed = 0
+        batch_size = options['batch_size']
+        # При запуске процессов через spawn (Windows, macOS) дочерний процесс начинает с чистого
+        # интерпретатора - приложения Django нужно загрузить заново
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            for start in range(0, len(pending), batch_size):
+                futures = [pool.submit(_generate, pk, name) for pk, name in pending[start:start + batch_size]]
+                for future in as_completed(futures):
+                    post_id, name, variants, error = future.result()
+                    if error:
+                        failed += 1
+                        self.stderr.write(f'{name}: {error}')
+                        continue
+                    store_variants(post_id, name, variants)
+                    done += 1
+        self.stdout.write(self.style.SUCCESS(f'Обработано изображений: {done}, ошибок: {failed}'))
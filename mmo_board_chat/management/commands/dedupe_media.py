@@ -0,0 +1,59 @@
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+
+from mmo_board_chat.images import variant_files
+from mmo_board_chat.models import Post
+from mmo_board_chat.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит изображения объявлений, загруженные до дедупликации, '
+        'в хранилище с адресацией по содержимому и удаляет дубликаты'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет перенесено')
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        if not isinstance(storage, ContentAddressedStorage):
+            self.stderr.write('Post.image не использует ContentAddressedStorage - переносить некуда')
+            return
+        legacy = FileSystemStorage(location=storage.location, base_url=storage.base_url)
+
+        moved = missing = 0
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image', 'image_variants')
+        for post in posts.iterator(chunk_size=200):
+            old_files = [post.image.name] + variant_files(post.image_variants)
+            if all(storage.is_content_addressed(name) for name in old_files):
+                continue
+            if not storage.exists(post.image.name):
+                missing += 1
+                self.stderr.write(f'Нет файла {post.image.name} (объявление {post.pk})')
+                continue
+            self.stdout.write(f'{post.pk}: {post.image.name}')
+            if options['dry_run']:
+                continue
+
+            renamed = {}
+            for name in old_files:
+                if storage.is_content_addressed(name) or not storage.exists(name):
+                    renamed[name] = name
+                    continue
+                with legacy.open(name, 'rb') as content:
+                    renamed[name] = storage.save(name, content)
+            variants = {
+                variant: {key: renamed.get(value, value) if key in ('jpeg', 'webp') else value
+                          for key, value in entry.items()}
+                for variant, entry in post.image_variants.items()
+            }
+            Post.objects.filter(pk=post.pk).update(image=renamed[post.image.name], image_variants=variants)
+            moved += 1
+
+            # Старый файл удаляется, если на него больше никто не ссылается
+            for old_name, new_name in renamed.items():
+                if old_name != new_name and not Post.objects.filter(image=old_name).exists():
+                    legacy.delete(old_name)
+
+        self.stdout.write(self.style.SUCCESS(f'Перенесено объявлений: {moved}, без файла: {missing}'))
@@ -0,0 +1,34 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand
+
+from mmo_board_chat.transfer import export_lines
+
+
+class Command(BaseCommand):
+    help = 'Выгружает категории, пользователей, объявления и отклики в JSONL (.gz - со сжатием, "-" - в stdout)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Файл для выгрузки')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Сколько строк читать из БД за раз')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        if output == '-':
+            stream = sys.stdout
+        elif output.endswith('.gz'):
+            stream = gzip.open(output, 'wt', encoding='utf-8')
+        else:
+            stream = open(output, 'w', encoding='utf-8')
+
+        total = 0
+        try:
+            for line in export_lines(options['chunk_size']):
+                stream.write(line)
+                total += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(f'Выгружено записей: {total}'))
@@ -0,0 +1,41 @@
+import gzip
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mmo_board_chat.models import ImportRun
+from mmo_board_chat.transfer import Importer, ImportFormatError
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает JSONL из export_board пачками с заменой id; '
+        'повторный запуск с тем же --run продолжает прерванную загрузку. '
+        'Файлы изображений не переносятся - только пути'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл выгрузки (.jsonl или .jsonl.gz)')
+        parser.add_argument('--run', help='Имя загрузки для продолжения (по умолчанию - имя файла)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Записей в одной транзакции')
+        parser.add_argument('--trust-privileges', action='store_true',
+                            help='Перенести хеши паролей и права персонала (is_staff, is_superuser); '
+                                 'только для выгрузок из своей базы')
+
+    def handle(self, *args, **options):
+        path = options['input']
+        name = options['run'] or os.path.basename(path)
+        run, created = ImportRun.objects.get_or_create(name=name, defaults={'source': path})
+        if run.finished_at:
+            raise CommandError(f'Загрузка "{name}" уже завершена {run.finished_at:%d.%m.%Y %H:%M}')
+        if not created:
+            self.stdout.write(f'Продолжение загрузки "{name}" со строки {run.lines_done + 1}')
+
+        opener = gzip.open if path.endswith('.gz') else open
+        importer = Importer(run, batch_size=options['batch_size'], trust_privileges=options['trust_privileges'])
+        try:
+            with opener(path, 'rt', encoding='utf-8') as lines:
+                importer.run_lines(lines, progress=lambda done: self.stdout.write(f'Обработано строк: {done}'))
+        except ImportFormatError as exc:
+            raise CommandError(f'{exc} (загрузку можно продолжить после исправления файла)')
+        self.stdout.write(self.style.SUCCESS(f'Загрузка "{name}" завершена'))
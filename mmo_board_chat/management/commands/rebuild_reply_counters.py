@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from mmo_board_chat.counters import rebuild_reply_counters
+from mmo_board_chat.models import Post, Reply
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает Post.reply_count и Post.accepted_reply_count по таблице откликов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--post', type=int, action='append', dest='posts',
+                            help='Пересчитать только указанные объявления (можно несколько раз)')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if options['posts']:
+            posts = posts.filter(pk__in=options['posts'])
+        updated = rebuild_reply_counters(Post, Reply, posts)
+        self.stdout.write(self.style.SUCCESS(f'Счётчики пересчитаны для {updated} объявлений'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mmo_board_chat.search import rebuild_index, search_available
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс объявлений (FTS5) с нуля'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Сколько объявлений читать и вставлять за раз')
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError('Полнотекстовый поиск доступен только на SQLite')
+        total = rebuild_index(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано объявлений: {total}'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from mmo_board_chat.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает очищенный HTML и анонс (Post.content_html, Post.excerpt) для существующих объявлений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Сколько объявлений читать и записывать за раз')
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать все объявления, а не только без анонса')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        posts = Post.objects.only('id', 'content').order_by('pk')
+        if not options['all']:
+            posts = posts.filter(content_html='')
+
+        total = 0
+        batch = []
+        for post in posts.iterator(chunk_size=chunk_size):
+            post.render_content()
+            batch.append(post)
+            if len(batch) >= chunk_size:
+                Post.objects.bulk_update(batch, ['content_html', 'excerpt'])
+                total += len(batch)
+                batch = []
+        if batch:
+            Post.objects.bulk_update(batch, ['content_html', 'excerpt'])
+            total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Обработано объявлений: {total}'))
@@ -0,0 +1,145 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from mmo_board_chat.counters import rebuild_reply_counters
+from mmo_board_chat.models import Category, Post, Reply, User
+from mmo_board_chat.resources import CATEGORIES
+from mmo_board_chat.sanitize import make_excerpt, sanitize_html
+from mmo_board_chat.search import rebuild_index, search_available
+
+WORDS = (
+    'ищу группу рейд подземелье танк хил урон гильдия квест награда броня меч щит посох '
+    'зелье свиток заклинание кузнец кожа руда сет легендарный эпический вечером выходные '
+    'опыт голос дискорд тактика босс фарм золото аукцион крафт уровень прокачка арена'
+).split()
+
+SEED_EMAIL_DOMAIN = 'seed.example.com'
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу реалистичным объёмом данных для нагрузочных тестов '
+        '(bulk_create, без сигналов; счётчики и поисковый индекс пересчитываются в конце)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--replies', type=int, default=1_000_000)
+        parser.add_argument('--accepted-share', type=float, default=0.1, help='Доля принятых откликов')
+        parser.add_argument('--days', type=int, default=365, help='За сколько дней распределить даты')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1, help='Зерно генератора (повторяемые данные)')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.span = timedelta(days=options['days']).total_seconds()
+
+        Category.objects.bulk_create([Category(name=code) for code, _ in CATEGORIES], ignore_conflicts=True)
+        category_ids = list(Category.objects.values_list('pk', flat=True))
+
+        user_ids = self.seed_users(options['users']) or list(User.objects.values_list('pk', flat=True))
+        posts = self.seed_posts(options['posts'], user_ids, category_ids)
+        self.seed_replies(options['replies'], posts, user_ids, options['accepted_share'])
+
+        self.log('Пересчёт счётчиков откликов...')
+        rebuild_reply_counters(Post, Reply)
+        if search_available():
+            self.log('Перестройка поискового индекса...')
+            rebuild_index()
+        self.log(self.style.SUCCESS(
+            f'Создано: пользователей {len(user_ids)}, объявлений {len(posts)}, откликов {options["replies"]}'
+        ))
+
+    def log(self, message):
+        if self.verbosity:
+            self.stdout.write(message)
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield range(start, min(start + self.batch_size, total))
+
+    def random_moment(self, not_before=None):
+        moment = self.now - timedelta(seconds=self.random.random() * self.span)
+        if not_before is not None and moment < not_before:
+            moment = not_before + timedelta(seconds=self.random.random() * (self.now - not_before).total_seconds())
+        return moment
+
+    def text(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def seed_users(self, total):
+        # Хеш пароля дорогой - один на всех пользователей (пароль "seed")
+        password = make_password('seed')
+        offset = User.objects.filter(email__endswith=f'@{SEED_EMAIL_DOMAIN}').count()
+        ids = []
+        for batch in self.batches(total):
+            users = [
+                User(email=f'user{offset + index}@{SEED_EMAIL_DOMAIN}', username=f'player{offset + index}',
+                     password=password, email_confirmed=True)
+                for index in batch
+            ]
+            with transaction.atomic():
+                ids += [user.pk for user in User.objects.bulk_create(users)]
+        return ids
+
+    @staticmethod
+    def save_with_dates(model, objects, moments, fields):
+        """
+        bulk_create с заданными датами: auto_now/auto_now_add при вставке ставят
+        текущее время, поэтому даты записываются следом через bulk_update (он их не трогает)
+        """
+        with transaction.atomic():
+            objects = model.objects.bulk_create(objects)
+            for obj, moment in zip(objects, moments):
+                for field in fields:
+                    setattr(obj, field, moment)
+            model.objects.bulk_update(objects, fields)
+        return objects
+
+    def seed_posts(self, total, user_ids, category_ids):
+        """Возвращает [(id, created_at)] - даты нужны, чтобы отклики были не раньше объявления"""
+        created = []
+        for batch in self.batches(total):
+            posts, moments = [], []
+            for _ in batch:
+                content = ''.join(f'<p>{self.text(self.random.randint(10, 40))}</p>'
+                                  for _ in range(self.random.randint(1, 4)))
+                moments.append(self.random_moment())
+                posts.append(Post(
+                    title=self.text(self.random.randint(3, 8)).capitalize(),
+                    content=content,
+                    content_html=sanitize_html(content),
+                    excerpt=make_excerpt(content),
+                    author_id=self.random.choice(user_ids),
+                    category_id=self.random.choice(category_ids),
+                ))
+            posts = self.save_with_dates(Post, posts, moments, ['created_at', 'updated_at'])
+            created += [(post.pk, post.created_at) for post in posts]
+            self.log(f'Объявлений: {len(created)}/{total}')
+        return created
+
+    def seed_replies(self, total, posts, user_ids, accepted_share):
+        created_total = 0
+        for batch in self.batches(total):
+            replies, moments = [], []
+            for _ in batch:
+                post_id, post_created = self.random.choice(posts)
+                moments.append(self.random_moment(not_before=post_created))
+                replies.append(Reply(
+                    post_id=post_id,
+                    author_id=self.random.choice(user_ids),
+                    text=self.text(self.random.randint(5, 30)),
+                    is_accepted=self.random.random() < accepted_share,
+                ))
+            self.save_with_dates(Reply, replies, moments, ['created_at'])
+            created_total += len(replies)
+            self.log(f'Откликов: {created_total}/{total}')
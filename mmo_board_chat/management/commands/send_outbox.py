@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from mmo_board_chat.mail import deliver_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Отправляет письма из очереди OutgoingEmail пачками через одно SMTP-соединение. '
+        'Рассчитан на один экземпляр воркера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            help='Сколько писем забирать из очереди за раз (по умолчанию OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--max-attempts', type=int,
+                            help='После стольких неудач письмо помечается как неотправленное '
+                                 '(по умолчанию OUTBOX_MAX_ATTEMPTS)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, опрашивая очередь')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Пауза между опросами очереди в режиме --loop, секунды')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_outbox(options['batch_size'], options['max_attempts'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(f'Отправлено: {sent}, ошибок: {failed}')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
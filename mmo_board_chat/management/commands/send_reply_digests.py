@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from mmo_board_chat.digests import send_digests
+from mmo_board_chat.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Собирает сводки новых откликов за прошедший час/день и ставит их в очередь писем. '
+        'Запускать по расписанию (cron) в начале часа или дня.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frequency', choices=[User.NOTIFY_HOURLY, User.NOTIFY_DAILY],
+                            default=User.NOTIFY_HOURLY, help='Для каких пользователей собирать сводку')
+
+    def handle(self, *args, **options):
+        queued = send_digests(options['frequency'])
+        self.stdout.write(self.style.SUCCESS(f'Сводок поставлено в очередь: {queued}'))
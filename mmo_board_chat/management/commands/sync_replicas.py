@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from mmo_board_chat.routers import PRIMARY_DATABASE, replica_aliases, synced_marker_path
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в файлы копий для чтения (REPLICA_DATABASES); для локального запуска с копиями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Повторять каждые N секунд (0 - один раз)')
+
+    def handle(self, *args, **options):
+        aliases = replica_aliases()
+        if not aliases:
+            raise CommandError('Копии не настроены: задайте DATABASE_REPLICAS')
+        while True:
+            self.sync(aliases)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self, aliases):
+        primary = connections[PRIMARY_DATABASE]
+        primary.ensure_connection()
+        for alias in aliases:
+            started = time.monotonic()
+            synced_at = time.time()  # Копия содержит всё, что записано до начала копирования
+            # Напрямую через sqlite3: соединение Django с копией открыто только на чтение
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.write_marker(alias, synced_at)
+            self.stdout.write(f'{alias}: скопировано за {time.monotonic() - started:.2f} с')
+
+    def write_marker(self, alias, synced_at):
+        """Время синхронизации для ReplicaPinningMiddleware; запись атомарная (через временный файл)"""
+        path = synced_marker_path(alias)
+        with open(f'{path}.tmp', 'w') as file:
+            file.write(f'{synced_at:.3f}')
+        os.replace(f'{path}.tmp', path)
@@ -0,0 +1,204 @@
+"""
+ЗАМЕРЫ ЗАПРОСОВ: SQL, ШАБЛОНЫ, VIEW
+
+RequestMetrics текущего запроса хранится в contextvar. SQL считается
+обёрткой execute_wrapper, которая ставится на каждое новое соединение
+(сигнал connection_created, см. apps.py) и ничего не делает вне
+запроса. Время шаблонов - через InstrumentedDjangoTemplates (бэкенд
+шаблонов в settings.TEMPLATES). Итоги запроса уходят в заголовок
+Server-Timing, в журнал медленных запросов и в счётчики по view
+(страница /staff/request-stats/).
+"""
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger('mmo_board_chat.requests')
+
+# Сколько повторяющихся запросов показывать в журнале медленных запросов
+_LOGGED_DUPLICATES = 3
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счётчики одного запроса"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_name = None
+        self.view_started = None
+        self.view_ms = 0.0
+        self.total_ms = 0.0
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.statements = Counter()
+
+    @property
+    def duplicate_count(self):
+        """Лишние выполнения одинакового SQL (признак N+1)"""
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def duplicates(self, limit=_LOGGED_DUPLICATES):
+        return [(sql, count) for sql, count in self.statements.most_common(limit) if count > 1]
+
+    def finish(self):
+        now = time.perf_counter()
+        self.total_ms = (now - self.started) * 1000
+        if self.view_started is not None:
+            self.view_ms = (now - self.view_started) * 1000
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing"""
+        return ', '.join([
+            # Заголовок - только ASCII
+            f'db;dur={self.sql_ms:.1f};desc="{self.sql_count} queries, {self.duplicate_count} duplicates"',
+            f'tpl;dur={self.template_ms:.1f}',
+            f'view;dur={self.view_ms:.1f}',
+            f'total;dur={self.total_ms:.1f}',
+        ])
+
+    def as_log_record(self, request, status):
+        return {
+            'method': request.method,
+            'path': request.path,
+            'view': self.view_name,
+            'status': status,
+            'total_ms': round(self.total_ms, 1),
+            'view_ms': round(self.view_ms, 1),
+            'sql_count': self.sql_count,
+            'sql_ms': round(self.sql_ms, 1),
+            'template_ms': round(self.template_ms, 1),
+            'duplicates': [{'sql': sql[:300], 'count': count} for sql, count in self.duplicates()],
+        }
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_metrics():
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper: время и текст SQL (без параметров - одинаковые запросы совпадают)"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_ms += (time.perf_counter() - started) * 1000
+        metrics.sql_count += 1
+        metrics.statements[sql] += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """Обработчик connection_created"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class _TimedTemplate:
+    """Обёртка шаблона бэкенда: время render() идёт в счётчик текущего запроса"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_ms += (time.perf_counter() - started) * 1000
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates с замером времени рендеринга (вложенные include входят во внешний шаблон)"""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+
+class ViewCounters:
+    """Накопленные счётчики по view в пределах процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def add(self, metrics, slow):
+        name = metrics.view_name or '<unresolved>'
+        with self._lock:
+            stats = self._views.setdefault(name, {
+                'requests': 0, 'slow': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'sql_count': 0, 'sql_ms': 0.0, 'duplicates': 0, 'template_ms': 0.0,
+            })
+            stats['requests'] += 1
+            stats['slow'] += int(slow)
+            stats['total_ms'] += metrics.total_ms
+            stats['max_ms'] = max(stats['max_ms'], metrics.total_ms)
+            stats['sql_count'] += metrics.sql_count
+            stats['sql_ms'] += metrics.sql_ms
+            stats['duplicates'] += metrics.duplicate_count
+            stats['template_ms'] += metrics.template_ms
+
+    def snapshot(self):
+        """Средние значения на запрос по каждому view"""
+        with self._lock:
+            views = {name: dict(stats) for name, stats in self._views.items()}
+        result = {}
+        for name, stats in sorted(views.items(), key=lambda item: -item[1]['total_ms']):
+            requests = stats['requests']
+            result[name] = {
+                'requests': requests,
+                'slow': stats['slow'],
+                'avg_ms': round(stats['total_ms'] / requests, 2),
+                'max_ms': round(stats['max_ms'], 2),
+                'avg_sql_count': round(stats['sql_count'] / requests, 2),
+                'avg_sql_ms': round(stats['sql_ms'] / requests, 2),
+                'avg_template_ms': round(stats['template_ms'] / requests, 2),
+                'duplicates': stats['duplicates'],
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+view_counters = ViewCounters()
+
+
+def report_request(request, response, metrics):
+    """Заголовок Server-Timing, журнал медленных запросов и счётчики по view"""
+    metrics.finish()
+    slow = metrics.total_ms >= getattr(settings, 'REQUEST_SLOW_MS', 500)
+    if getattr(settings, 'SERVER_TIMING_HEADER', True):
+        response['Server-Timing'] = metrics.server_timing()
+    if slow:
+        logger.warning(json.dumps(metrics.as_log_record(request, response.status_code), ensure_ascii=False))
+    view_counters.add(metrics, slow)
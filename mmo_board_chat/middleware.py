@@ -0,0 +1,211 @@
+import mimetypes
+import os
+import time
+from abc import ABC, abstractmethod
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+
+from .cache import get_cached_user
+from .metrics import current_metrics, end_request, report_request, start_request
+from .routers import replica_aliases, replica_reads, replicas_synced_since, wrote_to_primary
+
+# Cookie "недавно записывал" со временем записи: пока копии не догнали его, чтение идёт с основной базы
+PIN_COOKIE = 'db_primary'
+
+
+class BaseMiddleware(ABC):
+    """
+    Основа для middleware, работающих и в синхронной, и в асинхронной цепочке
+    (иначе Django под ASGI выполнял бы async-view через async_to_sync)
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.handle(request)
+
+    @abstractmethod
+    def handle(self, request):
+        """Синхронная цепочка"""
+
+    @abstractmethod
+    async def __acall__(self, request):
+        """Асинхронная цепочка"""
+
+
+class ReplicaPinningMiddleware(BaseMiddleware):
+    """
+    Чтение с копий для безопасных запросов (GET/HEAD)
+    После запроса с записью выставляет cookie со временем записи: пока копия
+    не синхронизирована после этого момента, запросы с cookie читают с основной
+    базы (не дольше REPLICA_PIN_SECONDS); когда догнали все копии, cookie удаляется
+    """
+
+    @staticmethod
+    def pinned_at(request):
+        try:
+            return float(request.COOKIES[PIN_COOKIE])
+        except (KeyError, ValueError):
+            return None
+
+    def allowed_replicas(self, request):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return []
+        if PIN_COOKIE not in request.COOKIES:
+            return replica_aliases()
+        pinned_at = self.pinned_at(request)
+        return replicas_synced_since(pinned_at) if pinned_at is not None else []
+
+    def update_pin(self, request, response, allowed, wrote):
+        if wrote:
+            response.set_cookie(PIN_COOKIE, f'{time.time():.3f}', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 300),
+                                httponly=True, samesite='Lax')
+        elif PIN_COOKIE in request.COOKIES and len(allowed) == len(replica_aliases()):
+            response.delete_cookie(PIN_COOKIE, samesite='Lax')
+        return response
+
+    def handle(self, request):
+        if not replica_aliases():
+            return self.get_response(request)
+        allowed = self.allowed_replicas(request)
+        with replica_reads(allowed):
+            response = self.get_response(request)
+            wrote = wrote_to_primary()
+        return self.update_pin(request, response, allowed, wrote)
+
+    async def __acall__(self, request):
+        if not replica_aliases():
+            return await self.get_response(request)
+        allowed = await sync_to_async(self.allowed_replicas)(request)
+        with replica_reads(allowed):
+            response = await self.get_response(request)
+            wrote = wrote_to_primary()
+        return self.update_pin(request, response, allowed, wrote)
+
+
+class RequestMetricsMiddleware(BaseMiddleware):
+    """
+    Число и время SQL-запросов, повторы, время шаблонов и view (см. metrics.py)
+    Ставится первым в MIDDLEWARE, чтобы total включал всю цепочку
+    """
+
+    def handle(self, request):
+        metrics, token = start_request()
+        try:
+            response = self.get_response(request)
+            report_request(request, response, metrics)
+        finally:
+            end_request(token)
+        return response
+
+    async def __acall__(self, request):
+        metrics, token = start_request()
+        try:
+            response = await self.get_response(request)
+            report_request(request, response, metrics)
+        finally:
+            end_request(token)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.view_name = request.resolver_match.view_name if request.resolver_match else None
+            metrics.view_started = time.perf_counter()
+        return None
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware, который берёт пользователя сессии из кеша
+    (см. cache.get_cached_user); как и стандартный, загружает его лениво
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
+
+
+class PrecompressedStaticMiddleware(BaseMiddleware):
+    """
+    Раздача собранной статики из STATIC_ROOT в начале цепочки (без сессий и прочих middleware)
+    Сжатая копия (.br/.gz) выбирается по Accept-Encoding. Файлы с хешем
+    в имени кешируются браузером на год как неизменяемые - повторные
+    загрузки страниц не запрашивают их вовсе. Пока collectstatic не
+    запускался, запросы проходят дальше (в разработке статику отдаёт runserver)
+    """
+    ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.prefix = settings.STATIC_URL
+        self.root = settings.STATIC_ROOT
+        self.hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def is_static(self, request):
+        return bool(self.hashed_names) and request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix)
+
+    @staticmethod
+    def accepted_encodings(request):
+        accepted = set()
+        for item in request.headers.get('Accept-Encoding', '').split(','):
+            encoding, _, quality = item.replace(' ', '').partition(';q=')
+            try:
+                if quality and float(quality) <= 0:
+                    continue  # Явный отказ: gzip;q=0
+            except ValueError:
+                pass
+            accepted.add(encoding.strip().lower())
+        return accepted
+
+    def static_response(self, request):
+        name = request.path[len(self.prefix):]
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        accepted = self.accepted_encodings(request)
+        encoding, served = None, path
+        for candidate, suffix in self.ENCODINGS:
+            if candidate in accepted and os.path.isfile(path + suffix):
+                encoding, served = candidate, path + suffix
+                break
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        # Файл отдаётся по частям и закрывается сервером после отправки
+        response = FileResponse(open(served, 'rb'), content_type=content_type)
+        del response['Content-Disposition']  # FileResponse подставил бы имя сжатой копии
+        if encoding:
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ['Accept-Encoding'])
+        if name in self.hashed_names:
+            response['Cache-Control'] = f'public, max-age={settings.STATIC_IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            response['Cache-Control'] = 'public, max-age=3600'
+        return response
+
+    def handle(self, request):
+        response = self.static_response(request) if self.is_static(request) else None
+        return response or self.get_response(request)
+
+    async def __acall__(self, request):
+        response = await sync_to_async(self.static_response)(request) if self.is_static(request) else None
+        return response or await self.get_response(request)
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.20 on 2026-10-18 10:10
+
+from django.db import migrations, models
+
+
+def fill_reply_counters(apps, schema_editor):
+    """Начальное заполнение счётчиков по существующим откликам"""
+    from mmo_board_chat.counters import rebuild_reply_counters
+
+    rebuild_reply_counters(apps.get_model('mmo_board_chat', 'Post'), apps.get_model('mmo_board_chat', 'Reply'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mmo_board_chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='accepted_reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Принятых откликов'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Откликов'),
+        ),
+        migrations.RunPython(fill_reply_counters, migrations.RunPython.noop),
+    ]
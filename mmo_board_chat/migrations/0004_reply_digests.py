@@ -0,0 +1,35 @@
+# Generated by Django 4.2.20 on 2026-10-18 10:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mmo_board_chat', '0003_outgoing_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='notification_frequency',
+            field=models.CharField(choices=[('immediate', 'Сразу'), ('hourly', 'Сводка раз в час'), ('daily', 'Сводка раз в день')], default='immediate', max_length=10, verbose_name='Уведомления об откликах'),
+        ),
+        migrations.CreateModel(
+            name='ReplyNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Включено в сводку')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Получатель')),
+                ('reply', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='mmo_board_chat.reply', verbose_name='Отклик')),
+            ],
+            options={
+                'verbose_name': 'Уведомление об отклике',
+                'verbose_name_plural': 'Уведомления об откликах',
+                'indexes': [models.Index(fields=['sent_at', 'recipient', 'created_at'], name='reply_notif_pending_idx')],
+            },
+        ),
+    ]
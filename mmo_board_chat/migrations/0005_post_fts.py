@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    """Виртуальная таблица FTS5 для поиска (только SQLite)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS mmo_board_chat_post_fts "
+        "USING fts5(title, body, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS mmo_board_chat_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mmo_board_chat', '0004_reply_digests'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
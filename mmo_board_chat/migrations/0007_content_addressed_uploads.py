@@ -0,0 +1,31 @@
+# Generated by Django 4.2.20 on 2026-10-18 10:17
+
+from django.db import migrations, models
+import mmo_board_chat.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mmo_board_chat', '0006_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Путь')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл загрузки',
+                'verbose_name_plural': 'Файлы загрузок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=mmo_board_chat.storage.upload_storage, upload_to='posts/', verbose_name='Изображение'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.20 on 2026-10-18 10:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mmo_board_chat', '0009_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='Имя загрузки')),
+                ('source', models.CharField(max_length=500, verbose_name='Файл')),
+                ('lines_done', models.PositiveBigIntegerField(default=0, verbose_name='Обработано строк')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='Начата')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+            ],
+            options={
+                'verbose_name': 'Загрузка данных',
+                'verbose_name_plural': 'Загрузки данных',
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportMapping',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=20, verbose_name='Модель')),
+                ('old_id', models.BigIntegerField(verbose_name='id в файле')),
+                ('new_id', models.BigIntegerField(verbose_name='id в базе')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mappings', to='mmo_board_chat.importrun')),
+            ],
+            options={
+                'verbose_name': 'Соответствие id при загрузке',
+                'verbose_name_plural': 'Соответствия id при загрузке',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='importmapping',
+            constraint=models.UniqueConstraint(fields=('run', 'model', 'old_id'), name='import_mapping_unique'),
+        ),
+    ]
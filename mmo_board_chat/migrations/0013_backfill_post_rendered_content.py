@@ -0,0 +1,36 @@
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def render_existing_posts(apps, schema_editor):
+    """Очищенный HTML и анонс для объявлений, созданных до появления этих полей"""
+    from mmo_board_chat.sanitize import make_excerpt, sanitize_html
+
+    post_model = apps.get_model('mmo_board_chat', 'Post')
+    posts = (
+        post_model.objects.using(schema_editor.connection.alias)
+        .filter(content_html='').exclude(content='')
+        .only('id', 'content').order_by('pk')
+    )
+    batch = []
+    for post in posts.iterator(chunk_size=BATCH_SIZE):
+        post.content_html = sanitize_html(post.content)
+        post.excerpt = make_excerpt(post.content)
+        batch.append(post)
+        if len(batch) >= BATCH_SIZE:
+            post_model.objects.using(schema_editor.connection.alias).bulk_update(batch, ['content_html', 'excerpt'])
+            batch = []
+    if batch:
+        post_model.objects.using(schema_editor.connection.alias).bulk_update(batch, ['content_html', 'excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mmo_board_chat', '0012_post_updated_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(render_existing_posts, migrations.RunPython.noop),
+    ]
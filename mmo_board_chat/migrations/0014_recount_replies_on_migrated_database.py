@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def recount_replies(apps, schema_editor):
+    """
+    Пересчёт счётчиков откликов в той базе, которую мигрируют
+    0002 заполняла их всегда в базе 'default' - в остальных базах счётчики могли остаться нулевыми
+    """
+    from mmo_board_chat.counters import rebuild_reply_counters
+
+    post_model = apps.get_model('mmo_board_chat', 'Post')
+    posts = post_model.objects.using(schema_editor.connection.alias)
+    rebuild_reply_counters(post_model, apps.get_model('mmo_board_chat', 'Reply'), posts=posts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mmo_board_chat', '0013_backfill_post_rendered_content'),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_replies, migrations.RunPython.noop),
+    ]
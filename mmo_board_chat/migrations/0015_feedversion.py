@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    feed_version = apps.get_model('mmo_board_chat', 'FeedVersion')
+    feed_version.objects.using(schema_editor.connection.alias).get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mmo_board_chat', '0014_recount_replies_on_migrated_database'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+            ],
+            options={
+                'verbose_name': 'Версия ленты',
+                'verbose_name_plural': 'Версия ленты',
+            },
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
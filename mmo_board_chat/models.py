@@ -1,33 +1,44 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from ckeditor.fields import RichTextField
 
+from mmo_board_chat.images import responsive_variants
 from mmo_board_chat.resources import CATEGORIES
-import secrets
+from mmo_board_chat.sanitize import make_excerpt, sanitize_html
+from mmo_board_chat.sqlite_backend.base import write_transaction
+from mmo_board_chat.storage import upload_storage
+from mmo_board_chat.tracking import FieldTrackerMixin
 
 
-class User(AbstractUser):
+class User(FieldTrackerMixin, AbstractUser):
     """
     КАСТОМНАЯ МОДЕЛЬ ПОЛЬЗОВАТЕЛЯ
     """
+    tracked_fields = ('email', 'username', 'email_confirmed', 'notification_frequency')
+
+    NOTIFY_IMMEDIATE = 'immediate'
+    NOTIFY_HOURLY = 'hourly'
+    NOTIFY_DAILY = 'daily'
+    NOTIFICATION_FREQUENCIES = [
+        (NOTIFY_IMMEDIATE, 'Сразу'),
+        (NOTIFY_HOURLY, 'Сводка раз в час'),
+        (NOTIFY_DAILY, 'Сводка раз в день'),
+    ]
+
     email = models.EmailField(unique=True)
     email_confirmed = models.BooleanField(default=False)
-    confirmation_code = models.CharField(max_length=40, blank=True)
     username = models.CharField(max_length=30)
+    notification_frequency = models.CharField(
+        'Уведомления об откликах',
+        max_length=10,
+        choices=NOTIFICATION_FREQUENCIES,
+        default=NOTIFY_IMMEDIATE,
+    )
 
     USERNAME_FIELD = 'email' # Авторизация по email
     REQUIRED_FIELDS = ['username']
 
-    def generate_confirmation_code(self):
-        """
-        Генерация уникального кода подтверждения для email
-        Используется при регистрации
-        """
-        code = secrets.token_urlsafe(20)
-        self.confirmation_code = code
-        self.save()
-        return code
-
     def __str__(self):
         return self.email
 
@@ -40,12 +51,17 @@ class Category(models.Model):
     def __str__(self):
         return dict(CATEGORIES).get(self.name, self.name)
 
-class Post(models.Model):
+class Post(FieldTrackerMixin, models.Model):
     """
     МОДЕЛЬ ОБЪЯВЛЕНИЙ
     """
+    tracked_fields = ('title', 'content', 'category', 'image')
+
     title = models.CharField('Заголовок', max_length=200)
     content = RichTextField('Содержание')
+    # Производные от content, пересчитываются при сохранении (см. save)
+    content_html = models.TextField('Очищенный HTML', blank=True, editable=False)
+    excerpt = models.CharField('Анонс', max_length=300, blank=True, editable=False)
     author = models.ForeignKey(
         'User',
         on_delete=models.CASCADE, # При удалении пользователя удаляются его объявления
@@ -59,20 +75,104 @@ class Post(models.Model):
     image = models.ImageField(
         'Изображение',
         upload_to='posts/', # Папка для загрузки изображений
+        storage=upload_storage, # Дедупликация по содержимому (см. storage.py)
         blank=True,
         null=True
     )
+    # Уменьшенные копии изображения (см. images.py):
+    # {'thumb': {'width': .., 'height': .., 'jpeg': путь, 'webp': путь}, 'display': {...}}
+    image_variants = models.JSONField('Варианты изображения', default=dict, blank=True, editable=False)
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     updated_at = models.DateTimeField('Дата обновления', auto_now=True)
+    # Денормализованные счётчики откликов, поддерживаются сигналами (см. signals.py)
+    reply_count = models.PositiveIntegerField('Откликов', default=0, editable=False)
+    accepted_reply_count = models.PositiveIntegerField('Принятых откликов', default=0, editable=False)
+
+    # Тяжёлые колонки, которые не нужны спискам объявлений
+    HEAVY_FIELDS = ('content', 'content_html')
+
+    def render_content(self):
+        """Пересчёт очищенного HTML и анонса из content"""
+        self.content_html = sanitize_html(self.content)
+        self.excerpt = make_excerpt(self.content)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self.has_changed('content') and (update_fields is None or 'content' in update_fields):
+            self.render_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'content_html', 'excerpt'}
+        super().save(*args, **kwargs)
+
+    @property
+    def card_version(self):
+        """
+        Версия карточки для кеша фрагментов в ленте
+        Меняется при редактировании, изменении числа откликов и появлении превью,
+        а также при переименовании автора или категории (они выбираются тем же JOIN)
+        """
+        return '-'.join(map(str, [
+            self.updated_at.timestamp(), self.reply_count, int('thumb' in self.image_variants),
+            self.author.username, self.category.name,
+        ]))
+
+    def image_variant_url(self, variant, image_format='jpeg'):
+        """URL уменьшенной копии; пока её нет - URL оригинала"""
+        name = self.image_variants.get(variant, {}).get(image_format)
+        if name:
+            return self.image.storage.url(name)
+        return self.image.url if self.image else ''
+
+    def image_srcset(self, image_format):
+        """Значение атрибута srcset из готовых вариантов с пропорциями оригинала"""
+        entries = [self.image_variants.get(name, {}) for name in responsive_variants()]
+        candidates = sorted(
+            (entry['width'], self.image.storage.url(entry[image_format]))
+            for entry in entries
+            if entry.get(image_format)
+        )
+        return ', '.join(f'{url} {width}w' for width, url in candidates)
+
+    @property
+    def jpeg_srcset(self):
+        return self.image_srcset('jpeg')
+
+    @property
+    def webp_srcset(self):
+        return self.image_srcset('webp')
+
+    @property
+    def thumbnail_url(self):
+        return self.image_variant_url('thumb')
+
+    @property
+    def thumbnail_webp_url(self):
+        return self.image_variant_url('thumb', 'webp')
+
+    @property
+    def display_image_url(self):
+        return self.image_variant_url('display')
+
+    class Meta:
+        indexes = [
+            # Лента и API: сортировка от новых к старым, в т.ч. с фильтром по категории/автору
+            models.Index(fields=['-created_at', '-id'], name='post_feed_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='post_category_feed_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_feed_idx'),
+            # MAX(updated_at) - проверка свежести ленты для условных GET
+            models.Index(fields=['updated_at'], name='post_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
-class Reply(models.Model):
+class Reply(FieldTrackerMixin, models.Model):
     """
     МОДЕЛЬ ОТКЛИКОВ
     """
+    tracked_fields = ('is_accepted',)
+
     post = models.ForeignKey(Post, on_delete=models.CASCADE, verbose_name="Объявление")
     author = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Автор")
     text = models.TextField("Текст отклика")
@@ -91,8 +191,168 @@ class Reply(models.Model):
         ordering = ['-created_at']
         verbose_name = "Отклик"
         verbose_name_plural = "Отклики"
+        indexes = [
+            # Отклики объявления, автора и общий список - от новых к старым
+            models.Index(fields=['post', '-created_at', '-id'], name='reply_post_feed_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='reply_author_feed_idx'),
+            models.Index(fields=['-created_at', '-id'], name='reply_feed_idx'),
+        ]
 
     def __str__(self):
         return f"Отклик от {self.author.username} на {self.post.title}"
 
+    def accept(self):
+        """
+        Принятие отклика; повторное (двойной клик, второй экземпляр) ничего не меняет
+        Строку переключает условный UPDATE - счётчики и уведомления (сигналы
+        post_save) срабатывают, только если он изменил строку. Возвращает, принят ли сейчас
+        """
+        with write_transaction():
+            if not Reply.objects.filter(pk=self.pk, is_accepted=False).update(is_accepted=True):
+                return False
+            self.is_accepted = True
+            self.save(update_fields=['is_accepted'])
+        return True
+
+    def remove(self):
+        """
+        Удаление отклика; повторное ничего не меняет
+        Удаление через queryset: сигнал post_delete (счётчики) приходит только
+        для строк, найденных в базе. Возвращает, удалён ли сейчас
+        """
+        with write_transaction():
+            deleted, _ = Reply.objects.filter(pk=self.pk).delete()
+        return bool(deleted)
+
+
+
+
+class ReplyNotification(models.Model):
+    """
+    ОТЛОЖЕННОЕ УВЕДОМЛЕНИЕ ОБ ОТКЛИКЕ
+    Копится для авторов, выбравших сводку, и отправляется одним письмом
+    (manage.py send_reply_digests)
+    """
+    reply = models.OneToOneField(Reply, on_delete=models.CASCADE, verbose_name='Отклик')
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Получатель')
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    sent_at = models.DateTimeField('Включено в сводку', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Уведомление об отклике'
+        verbose_name_plural = 'Уведомления об откликах'
+        indexes = [
+            # Выборка неотправленных уведомлений по получателям
+            models.Index(fields=['sent_at', 'recipient', 'created_at'], name='reply_notif_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'Уведомление для {self.recipient_id} об отклике {self.reply_id}'
+
+
+class FeedVersion(models.Model):
+    """
+    ВЕРСИЯ ЛЕНТЫ ДЛЯ УСЛОВНЫХ GET (одна строка)
+    Растёт при изменениях, которые не видны по MAX(Post.updated_at):
+    удаление объявления, переименование автора или категории (см. counters.bump_feed_version)
+    """
+    version = models.PositiveBigIntegerField('Версия', default=0)
+
+    class Meta:
+        verbose_name = 'Версия ленты'
+        verbose_name_plural = 'Версия ленты'
+
+    def __str__(self):
+        return str(self.version)
+
+
+class StoredBlob(models.Model):
+    """
+    СЧЁТЧИК ССЫЛОК НА ФАЙЛ В ХРАНИЛИЩЕ ЗАГРУЗОК
+    Один файл может использоваться несколькими объявлениями (см. storage.py)
+    """
+    name = models.CharField('Путь', max_length=255, unique=True)
+    refcount = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл загрузки'
+        verbose_name_plural = 'Файлы загрузок'
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+
+class OutgoingEmail(models.Model):
+    """
+    ОЧЕРЕДЬ ИСХОДЯЩИХ ПИСЕМ (OUTBOX)
+    Письмо записывается в той же транзакции, что и изменение данных,
+    а отправляется отдельным процессом (manage.py send_outbox)
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'Ожидает отправки'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Не удалось отправить'),
+    ]
 
+    dedup_key = models.CharField('Ключ дедупликации', max_length=200, unique=True)
+    recipient = models.EmailField('Получатель')
+    subject = models.CharField('Тема', max_length=255)
+    body = models.TextField('Текст')
+    status = models.CharField('Статус', max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    next_attempt_at = models.DateTimeField('Следующая попытка', default=timezone.now)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    sent_at = models.DateTimeField('Дата отправки', null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        indexes = [
+            # Выборка очереди воркером: статус + время следующей попытки
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {self.recipient}'
+
+
+class ImportRun(models.Model):
+    """
+    ЗАГРУЗКА ДАННЫХ ИЗ JSONL (manage.py import_board)
+    Хранит число обработанных строк файла - прерванную загрузку можно продолжить
+    """
+    name = models.CharField('Имя загрузки', max_length=200, unique=True)
+    source = models.CharField('Файл', max_length=500)
+    lines_done = models.PositiveBigIntegerField('Обработано строк', default=0)
+    started_at = models.DateTimeField('Начата', auto_now_add=True)
+    finished_at = models.DateTimeField('Завершена', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Загрузка данных'
+        verbose_name_plural = 'Загрузки данных'
+
+    def __str__(self):
+        return self.name
+
+
+class ImportMapping(models.Model):
+    """Соответствие id записи в файле загрузки и id созданной (или найденной) записи"""
+    run = models.ForeignKey(ImportRun, on_delete=models.CASCADE, related_name='mappings')
+    model = models.CharField('Модель', max_length=20)
+    old_id = models.BigIntegerField('id в файле')
+    new_id = models.BigIntegerField('id в базе')
+
+    class Meta:
+        verbose_name = 'Соответствие id при загрузке'
+        verbose_name_plural = 'Соответствия id при загрузке'
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'model', 'old_id'], name='import_mapping_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.old_id} -> {self.new_id}'
@@ -0,0 +1,116 @@
+"""
+ПОСТРАНИЧНАЯ НАВИГАЦИЯ ПО КУРСОРУ (KEYSET)
+
+Вместо OFFSET страница выбирается условием по паре (created_at, id),
+поэтому стоимость запроса не зависит от номера страницы и размера таблицы.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+DEFAULT_PAGE_SIZE = 20
+
+
+def encode_cursor(created_at, pk):
+    """Упаковка позиции (дата создания, id) в строку для URL"""
+    raw = f'{created_at.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Распаковка курсора из URL
+    При повреждённом курсоре выбрасывает ValueError
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError('Некорректный курсор') from exc
+
+
+class KeysetPage:
+    """
+    Страница выборки
+    older_cursor / newer_cursor - курсоры для перехода к более старым/новым записям
+    """
+
+    def __init__(self, items, older_cursor=None, newer_cursor=None):
+        self.items = items
+        self.older_cursor = older_cursor
+        self.newer_cursor = newer_cursor
+
+    @property
+    def has_older(self):
+        return self.older_cursor is not None
+
+    @property
+    def has_newer(self):
+        return self.newer_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def older_than(queryset, cursor, field='created_at'):
+    """Фильтр "строго старше позиции курсора" в порядке (field, id)"""
+    value, pk = decode_cursor(cursor)
+    return queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}))
+
+
+def newer_than(queryset, cursor, field='created_at'):
+    """Фильтр "строго новее позиции курсора" в порядке (field, id)"""
+    value, pk = decode_cursor(cursor)
+    return queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk}))
+
+
+def _keyset_slice(queryset, before, after, per_page, field):
+    """Запрос страницы (на одну запись больше для проверки продолжения)"""
+    if after is not None:
+        return newer_than(queryset, after, field).order_by(field, 'pk')[:per_page + 1]
+    if before is not None:
+        queryset = older_than(queryset, before, field)
+    return queryset.order_by(f'-{field}', '-pk')[:per_page + 1]
+
+
+def _keyset_page(rows, before, after, per_page, field):
+    """Страница из прочитанных строк запроса _keyset_slice"""
+    if after is not None:
+        has_newer = len(rows) > per_page
+        items = rows[:per_page][::-1]
+        has_older = True
+    else:
+        has_older = len(rows) > per_page
+        items = rows[:per_page]
+        has_newer = before is not None
+
+    older_cursor = newer_cursor = None
+    if items and has_older:
+        older_cursor = encode_cursor(getattr(items[-1], field), items[-1].pk)
+    if items and has_newer:
+        newer_cursor = encode_cursor(getattr(items[0], field), items[0].pk)
+    return KeysetPage(items, older_cursor=older_cursor, newer_cursor=newer_cursor)
+
+
+def paginate_keyset(queryset, before=None, after=None, per_page=DEFAULT_PAGE_SIZE, field='created_at'):
+    """
+    Выборка одной страницы, отсортированной от новых к старым
+    before - курсор: вернуть записи старше него
+    after - курсор: вернуть записи новее него
+    Выполняет ровно один запрос к БД
+    """
+    rows = list(_keyset_slice(queryset, before, after, per_page, field))
+    return _keyset_page(rows, before, after, per_page, field)
+
+
+async def apaginate_keyset(queryset, before=None, after=None, per_page=DEFAULT_PAGE_SIZE, field='created_at'):
+    """Асинхронный вариант paginate_keyset для async-view"""
+    rows = [row async for row in _keyset_slice(queryset, before, after, per_page, field)]
+    return _keyset_page(rows, before, after, per_page, field)
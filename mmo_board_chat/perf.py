@@ -0,0 +1,123 @@
+"""
+ЗАМЕРЫ СТРАНИЦ ДЛЯ ТЕСТОВ ПРОИЗВОДИТЕЛЬНОСТИ
+
+measure_view() прогоняет URL через тестовый клиент несколько раз и
+собирает p50/p95 времени ответа и число SQL-запросов. VIEW_BUDGETS -
+допустимые значения: число запросов на страницу (сессия и пользователь
+берутся из кеша; для home, post_detail и api_posts - вместе с проверкой
+свежести для условных GET) и p95 в миллисекундах. Без REDIS_URL сессия
+и пользователь читаются из базы - страницам с пользователем добавляется
+AUTH_QUERIES. tests.py проверяет
+только число запросов (время на общей машине CI нестабильно), время
+проверяет manage.py benchmark_views на рабочей базе после seed_board.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# Имя страницы -> (запросов не больше, p95 не больше, мс)
+VIEW_BUDGETS = {
+    'home': (2, 150),
+    'post_detail': (3, 150),
+    'profile': (3, 150),
+    'api_posts': (2, 150),
+}
+
+# Страницы, которые загружают пользователя сессии
+PERSONAL_VIEWS = {'home', 'post_detail', 'profile'}
+# Запросы сессии и пользователя, когда они не берутся из кеша
+AUTH_QUERIES = 2
+
+# Множитель порогов времени для медленных машин (CI): PERF_LATENCY_SCALE=3
+LATENCY_SCALE = float(os.getenv('PERF_LATENCY_SCALE', 1))
+
+
+def cached_auth_enabled():
+    """Сессия и пользователь берутся из кеша (настройки с REDIS_URL)"""
+    return (settings.SESSION_ENGINE == 'django.contrib.sessions.backends.cached_db'
+            and 'mmo_board_chat.middleware.CachedAuthenticationMiddleware' in settings.MIDDLEWARE)
+
+
+class ViewStats:
+    def __init__(self, name, url, timings, queries):
+        self.name = name
+        self.url = url
+        self.timings = sorted(timings)
+        self.queries = queries
+
+    def percentile(self, share):
+        return self.timings[min(int(len(self.timings) * share), len(self.timings) - 1)] * 1000
+
+    @property
+    def p50(self):
+        return self.percentile(0.5)
+
+    @property
+    def p95(self):
+        return self.percentile(0.95)
+
+    def budget_errors(self, budgets=VIEW_BUDGETS, latency_scale=LATENCY_SCALE, check_latency=True):
+        """Список нарушений бюджета (пустой - всё в порядке); check_latency=False - только число запросов"""
+        max_queries, max_p95 = budgets[self.name]
+        if self.name in PERSONAL_VIEWS and not cached_auth_enabled():
+            max_queries += AUTH_QUERIES
+        errors = []
+        if self.queries > max_queries:
+            errors.append(f'{self.name}: {self.queries} SQL-запросов при бюджете {max_queries}')
+        if check_latency and self.p95 > max_p95 * latency_scale:
+            errors.append(f'{self.name}: p95 {self.p95:.1f} мс при пороге {max_p95 * latency_scale:.0f} мс')
+        return errors
+
+    def as_dict(self):
+        return {'url': self.url, 'p50_ms': round(self.p50, 2), 'p95_ms': round(self.p95, 2), 'queries': self.queries}
+
+    def __str__(self):
+        return f'{self.name:<12} p50 {self.p50:7.1f} мс  p95 {self.p95:7.1f} мс  запросов {self.queries}'
+
+
+def measure_view(client, name, url, iterations=20, warmup=2):
+    """
+    Замер страницы: warmup холостых запросов, затем iterations замеров
+    Число запросов - максимум по замерам; потоковый ответ читается целиком
+    """
+    timings = []
+    queries = 0
+    for index in range(warmup + iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise AssertionError(f'{url}: ответ {response.status_code}')
+        if index >= warmup:
+            timings.append(elapsed)
+            queries = max(queries, len(captured))
+    return ViewStats(name, url, timings, queries)
+
+
+def benchmark_targets():
+    """
+    Пользователь для входа (автор с наибольшим числом объявлений) и URL замеряемых страниц
+    Для post_detail берётся объявление с наибольшим числом откликов
+    """
+    from .models import Post, User
+
+    author_id = (
+        Post.objects.values('author').annotate(posts=Count('pk')).order_by('-posts')
+        .values_list('author', flat=True).first()
+    )
+    busiest_post = Post.objects.order_by('-reply_count').values_list('pk', flat=True).first()
+    urls = {
+        'home': reverse('mmo_board_chat:home'),
+        'post_detail': reverse('mmo_board_chat:post_detail', args=[busiest_post]),
+        'profile': reverse('mmo_board_chat:profile'),
+        'api_posts': reverse('mmo_board_chat:api_posts') + '?limit=50',
+    }
+    return User.objects.get(pk=author_id), urls
@@ -0,0 +1,213 @@
+"""
+ОГРАНИЧЕНИЕ ЧАСТОТЫ ЗАПРОСОВ И СБРОС НАГРУЗКИ
+
+Вход, регистрация, ввод кода и повторная отправка кода - дорогие
+запросы (хеширование пароля PBKDF2, поиск пользователя, письмо).
+Декоратор rate_limit ограничивает их число по IP и по учётной записи,
+concurrency_limit - число одновременно выполняемых в процессе. Отказ -
+короткий текстовый ответ 429/503 с Retry-After, без шаблонов и базы.
+
+Лимиты задаются в settings.RATE_LIMITS строками вида '10/m' (число
+запросов за секунду/минуту/час, можно '10/5m'). Алгоритм - скользящее
+окно: счётчики текущего и прошлого окна, прошлое учитывается с весом
+по доле окна, которая ещё не прошла. Счётчики хранятся в памяти
+процесса (LocalBackend) или в кеше Django (CacheBackend, общий для
+процессов при Redis) - см. settings.RATELIMIT_BACKEND. Лимиты по IP
+за обратным прокси - см. settings.RATELIMIT_IP_HEADER.
+"""
+import hashlib
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+_PERIODS = {'s': 1, 'm': 60, 'h': 3600}
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60); '10/5m' -> (10, 300)"""
+    count, _, period = rate.partition('/')
+    multiplier = period[:-1] or '1'
+    if not count.isdigit() or not multiplier.isdigit() or period[-1:] not in _PERIODS:
+        raise ValueError(f'Неверный лимит {rate!r}')
+    return int(count), int(multiplier) * _PERIODS[period[-1]]
+
+
+class LocalBackend:
+    """Счётчики окон в памяти процесса"""
+
+    # Истёкшие окна удаляются при каждом CLEANUP_EVERY-м обращении
+    CLEANUP_EVERY = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._calls = 0
+
+    def incr(self, key, timeout):
+        now = time.monotonic()
+        with self._lock:
+            self._calls += 1
+            if self._calls % self.CLEANUP_EVERY == 0:
+                self._counters = {name: item for name, item in self._counters.items() if item[1] > now}
+            count, expires = self._counters.get(key, (0, 0))
+            if expires <= now:
+                count, expires = 0, now + timeout
+            self._counters[key] = (count + 1, expires)
+            return count + 1
+
+    def get(self, key):
+        with self._lock:
+            count, expires = self._counters.get(key, (0, 0))
+        return count if expires > time.monotonic() else 0
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class CacheBackend:
+    """Счётчики окон в кеше settings.RATELIMIT_CACHE (add + incr атомарны в Redis и LocMem)"""
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+
+    def incr(self, key, timeout):
+        self.cache.add(key, 0, timeout)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Ключ истёк между add и incr
+            self.cache.set(key, 1, timeout)
+            return 1
+
+    def get(self, key):
+        return self.cache.get(key, 0)
+
+    def clear(self):
+        self.cache.clear()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'RATELIMIT_BACKEND', 'mmo_board_chat.ratelimit.LocalBackend')
+                _backend = import_string(path)()
+    return _backend
+
+
+def hit(scope, key, rate, now=None):
+    """
+    Учёт запроса в скользящем окне
+    Возвращает 0, если запрос разрешён, иначе - через сколько секунд повторить
+    """
+    limit, period = parse_rate(rate)
+    now = time.time() if now is None else now
+    window, elapsed = divmod(now, period)
+    window = int(window)
+    prefix = f'rl:{scope}:{key}:{period}'
+    backend = get_backend()
+
+    current = backend.incr(f'{prefix}:{window}', period * 2)
+    previous = backend.get(f'{prefix}:{window - 1}')
+    weight = 1 - elapsed / period
+    if previous * weight + current <= limit:
+        return 0
+
+    # Ждать, пока вес прошлого окна не опустится достаточно для ещё одного запроса,
+    # или до конца окна, если переполнено текущее
+    left = period - elapsed
+    if previous and current < limit:
+        left = min(left, (previous * weight + current + 1 - limit) / previous * period)
+    return max(1, math.ceil(left))
+
+
+def client_ip(request):
+    """
+    IP клиента: REMOTE_ADDR или, за обратным прокси, заголовок settings.RATELIMIT_IP_HEADER
+    (например 'HTTP_X_FORWARDED_FOR'). Адрес берётся RATELIMIT_TRUSTED_PROXIES-м с конца
+    списка - его дописал наш ближайший прокси, более левые клиент может подделать
+    """
+    header = getattr(settings, 'RATELIMIT_IP_HEADER', None)
+    if header:
+        addresses = [address.strip() for address in request.META.get(header, '').split(',') if address.strip()]
+        trusted = getattr(settings, 'RATELIMIT_TRUSTED_PROXIES', 1)
+        if addresses:
+            return addresses[-min(trusted, len(addresses))]
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+def post_field(name):
+    """Ключ по полю формы (логин, email) - для лимита на учётную запись"""
+    def key(request):
+        value = request.POST.get(name, '').strip().lower()
+        return hashlib.sha1(value.encode()).hexdigest()[:20] if value else None
+    return key
+
+
+def current_user(request):
+    return str(request.user.pk) if request.user.is_authenticated else None
+
+
+def too_many_requests(retry_after, status=429):
+    response = HttpResponse('Слишком много запросов, повторите позже', status=status,
+                            content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(scope, key, methods=('POST',)):
+    """
+    Декоратор view: лимит settings.RATE_LIMITS[scope] по ключу key(request)
+    Запросы других методов и запросы с ключом None не учитываются
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if getattr(settings, 'RATELIMIT_ENABLED', True) and request.method in methods:
+                value = key(request)
+                if value is not None:
+                    retry_after = hit(scope, value, settings.RATE_LIMITS[scope])
+                    if retry_after:
+                        return too_many_requests(retry_after)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_slots = {}
+
+
+def concurrency_limit(name, limit, methods=('POST',)):
+    """
+    Декоратор view: не больше limit одновременных запросов в процессе
+    на все view с тем же name; лишние сразу получают 503, а не ждут
+    в очереди, занимая рабочий поток
+    """
+    slots = _slots.setdefault(name, threading.BoundedSemaphore(limit))
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return view(request, *args, **kwargs)
+            if not slots.acquire(blocking=False):
+                return too_many_requests(1, status=503)
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                slots.release()
+        return wrapper
+    return decorator
@@ -0,0 +1,133 @@
+"""
+МАРШРУТИЗАЦИЯ ЗАПРОСОВ К БД: ЗАПИСЬ - В ОСНОВНУЮ, ЧТЕНИЕ - С КОПИЙ
+
+Копии для чтения перечислены в settings.REPLICA_DATABASES. Читать с копии
+разрешается только внутри веб-запроса (см. ReplicaPinningMiddleware);
+команды manage.py, фоновые потоки и всё, что записывает, работают с 'default'.
+Сессии и пользователи всегда читаются с основной базы - сразу после входа
+копия может ещё не знать о новой сессии.
+
+Запись замечается и через роутер, и по SQL (execute wrapper на соединении
+основной базы) - так учитываются и записи через cursor(), например
+в поисковый индекс. После первой записи запрос до конца читает с основной
+базы, а браузер получает cookie со временем записи: пока копия не
+синхронизирована после этого момента (manage.py sync_replicas записывает
+время копирования), пользователь читает с основной базы и видит свои
+изменения. REPLICA_PIN_SECONDS - предельный срок такого закрепления.
+"""
+import random
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY_DATABASE = 'default'
+
+# Модели, которые читаются только с основной базы: сессии и пользователи
+PRIMARY_ONLY_APPS = ('sessions', 'auth')
+
+# Копии, с которых текущему запросу можно читать
+_replica_reads = ContextVar('replica_reads', default=())
+# Была ли в текущем запросе запись
+_wrote = ContextVar('wrote_to_primary', default=False)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'REPLICA_DATABASES', []))
+
+
+def synced_marker_path(alias):
+    """Файл рядом с копией, в котором sync_replicas хранит время копирования"""
+    return f'{settings.DATABASES[alias]["NAME"]}.synced'
+
+
+def replica_synced_at(alias):
+    """Момент основной базы, который отражает копия (time.time()); None - неизвестно"""
+    try:
+        with open(synced_marker_path(alias)) as file:
+            return float(file.read())
+    except (KeyError, OSError, ValueError):
+        return None
+
+
+def replicas_synced_since(moment):
+    """Копии, синхронизированные после момента moment (время записи пользователя)"""
+    return [alias for alias in replica_aliases() if (replica_synced_at(alias) or 0) >= moment]
+
+
+@contextmanager
+def replica_reads(allowed=True):
+    """
+    Разрешение чтения с копий на время блока
+    allowed: True - все копии, False - ни одной, список - только эти копии
+    """
+    if allowed is True:
+        allowed = replica_aliases()
+    allowed_token = _replica_reads.set(tuple(allowed or ()))
+    wrote_token = _wrote.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(allowed_token)
+        _wrote.reset(wrote_token)
+
+
+def pin_to_primary():
+    """Дальнейшие чтения текущего запроса - только с основной базы"""
+    _replica_reads.set(())
+
+
+def mark_write():
+    _wrote.set(True)
+    pin_to_primary()
+
+
+def wrote_to_primary():
+    return _wrote.get()
+
+
+_WRITE_SQL_RE = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE)\b', re.I)
+
+
+def detect_raw_writes(execute, sql, params, many, context):
+    """Execute wrapper соединения основной базы: запись мимо роутера (cursor()) тоже закрепляет запрос"""
+    if _WRITE_SQL_RE.match(sql):
+        mark_write()
+    return execute(sql, params, many, context)
+
+
+def install_write_detector(sender, connection, **kwargs):
+    """Обработчик connection_created"""
+    if connection.alias == PRIMARY_DATABASE and detect_raw_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(detect_raw_writes)
+
+
+class PrimaryReplicaRouter:
+    """Роутер для DATABASE_ROUTERS"""
+
+    def db_for_read(self, model, **hints):
+        replicas = _replica_reads.get()
+        if replicas and not self.primary_only(model):
+            return random.choice(replicas)
+        return PRIMARY_DATABASE
+
+    def db_for_write(self, model, **hints):
+        mark_write()
+        return PRIMARY_DATABASE
+
+    @staticmethod
+    def primary_only(model):
+        return model._meta.app_label in PRIMARY_ONLY_APPS or model._meta.label == settings.AUTH_USER_MODEL
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY_DATABASE, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема копий повторяет основную базу (manage.py sync_replicas)
+        if db in replica_aliases():
+            return False
+        return None
@@ -0,0 +1,138 @@
+"""
+ОЧИСТКА HTML ИЗ РЕДАКТОРА
+
+sanitize_html() оставляет только разрешённые теги и атрибуты
+(то, что умеет панель CKEditor), html_to_text() и make_excerpt()
+дают простой текст для анонса в ленте и поискового индекса.
+Вызываются один раз при сохранении объявления, а не при каждом показе.
+"""
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+ALLOWED_TAGS = {
+    'p', 'br', 'strong', 'b', 'em', 'i', 'u', 's', 'blockquote',
+    'ol', 'ul', 'li', 'a', 'img', 'video', 'source', 'span', 'div',
+}
+VOID_TAGS = {'br', 'img', 'source'}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'video': {'src', 'controls', 'width', 'height', 'poster'},
+    'source': {'src', 'type'},
+}
+URL_ATTRIBUTES = {'href', 'src', 'poster'}
+ALLOWED_SCHEMES = {'', 'http', 'https', 'mailto'}
+# Содержимое этих тегов выбрасывается целиком
+DROP_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template'}
+# Теги, после которых в простом тексте нужен разрыв строки
+BLOCK_TAGS = {'p', 'br', 'div', 'li', 'blockquote', 'ol', 'ul'}
+
+EXCERPT_LENGTH = 250
+
+
+def _safe_url(value):
+    scheme = urlparse(value.strip()).scheme.lower()
+    return scheme in ALLOWED_SCHEMES
+
+
+class _Sanitizer(HTMLParser):
+    """Разбор HTML с пересборкой только разрешённой разметки"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append('\n')
+        if tag not in ALLOWED_TAGS:
+            return
+
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        rendered = []
+        for name, value in attrs:
+            if name not in allowed:
+                continue
+            if value is None:
+                rendered.append(name)
+                continue
+            if name in URL_ATTRIBUTES and not _safe_url(value):
+                continue
+            rendered.append(f'{name}="{escape(value)}"')
+        if tag == 'a':
+            rendered.append('rel="nofollow noopener"')
+
+        self.html.append(f'<{tag}{" " if rendered else ""}{" ".join(rendered)}>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in self.open_tags and tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append('\n')
+        if tag not in self.open_tags:
+            return
+        # Закрываем всё, что осталось открытым внутри (битая разметка)
+        while self.open_tags:
+            current = self.open_tags.pop()
+            self.html.append(f'</{current}>')
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        self.html.append(escape(data, quote=False))
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.html.append(f'</{self.open_tags.pop()}>')
+
+
+def _parse(content):
+    parser = _Sanitizer()
+    parser.feed(content or '')
+    parser.close()
+    return parser
+
+
+def sanitize_html(content):
+    """HTML пользователя -> безопасный HTML для вывода без экранирования"""
+    return ''.join(_parse(content).html)
+
+
+def html_to_text(content):
+    """HTML -> простой текст: без тегов, с раскрытыми сущностями и сжатыми пробелами"""
+    text = ''.join(_parse(content).text)
+    lines = (re.sub(r'[ \t\r\f\v\xa0]+', ' ', line).strip() for line in text.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    """Анонс: начало простого текста, обрезанное по границе слова"""
+    text = html_to_text(content).replace('\n', ' ')
+    if len(text) <= length:
+        return text
+    cut = text[:length].rsplit(' ', 1)[0] or text[:length]
+    return cut.rstrip(' .,;:!?-') + '…'
@@ -0,0 +1,154 @@
+"""
+ПОЛНОТЕКСТОВЫЙ ПОИСК ПО ОБЪЯВЛЕНИЯМ (SQLite FTS5)
+
+Виртуальная таблица mmo_board_chat_post_fts хранит заголовок и текст
+объявления без HTML-тегов; rowid совпадает с id объявления.
+Индекс обновляется сигналами при сохранении/удалении объявления,
+первичное заполнение - manage.py rebuild_search_index.
+"""
+import re
+
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .sanitize import html_to_text
+
+FTS_TABLE = 'mmo_board_chat_post_fts'
+
+# Веса колонок для bm25: совпадение в заголовке важнее совпадения в тексте
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+# Служебные маркеры подсветки: текст экранируется, затем маркеры меняются на <mark>
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_INSERT_SQL = f'INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)'
+
+
+def search_available():
+    """FTS5 есть только в SQLite"""
+    return connection.vendor == 'sqlite'
+
+
+def index_post(post):
+    """Добавление/обновление объявления в индексе"""
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(_INSERT_SQL, [post.pk, post.title, html_to_text(post.content)])
+
+
+def index_new_posts(rows):
+    """Добавление пачки новых объявлений [(id, title, content)] одним executemany"""
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(_INSERT_SQL, [(pk, title, html_to_text(content)) for pk, title, content in rows])
+
+
+def remove_post(post_id):
+    """Удаление объявления из индекса"""
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild_index(chunk_size=500):
+    """
+    Полная перестройка индекса
+    Объявления читаются порциями, в память целиком не загружаются
+    Одна транзакция: поиск до коммита видит прежний индекс (WAL), сбой откатывает всё
+    Возвращает число проиндексированных объявлений
+    """
+    from .models import Post
+
+    if not search_available():
+        return 0
+    total = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        batch = []
+        rows = Post.objects.order_by().values_list('id', 'title', 'content').iterator(chunk_size=chunk_size)
+        for pk, title, content in rows:
+            batch.append((pk, title, html_to_text(content)))
+            if len(batch) >= chunk_size:
+                cursor.executemany(_INSERT_SQL, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(_INSERT_SQL, batch)
+            total += len(batch)
+    return total
+
+
+def build_match_query(text):
+    """
+    Строка пользователя -> безопасный запрос FTS5
+    Каждое слово берётся в кавычки (никакого синтаксиса FTS от пользователя),
+    последнее слово ищется по префиксу
+    """
+    tokens = _TOKEN_RE.findall(text or '')
+    if not tokens:
+        return None
+    quoted = [f'"{token}"' for token in tokens]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _highlight(snippet):
+    """Экранирование сниппета и подсветка совпадений тегом <mark>"""
+    return mark_safe(str(escape(snippet)).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+
+class SearchResult:
+    """Найденное объявление со сниппетом и рангом bm25 (меньше - лучше)"""
+
+    def __init__(self, post, snippet, rank):
+        self.post = post
+        self.snippet = snippet
+        self.rank = rank
+
+
+def search_posts(text, page=1, per_page=20):
+    """
+    Поиск объявлений, отсортированных по bm25
+    Возвращает (список SearchResult, есть ли следующая страница)
+    Два запроса: поиск по индексу и загрузка найденных объявлений
+    """
+    from .models import Post
+
+    match = build_match_query(text)
+    if match is None or not search_available():
+        return [], False
+
+    offset = (max(page, 1) - 1) * per_page
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            SELECT rowid,
+                   bm25({FTS_TABLE}, %s, %s) AS rank,
+                   snippet({FTS_TABLE}, 1, %s, %s, '…', 24)
+            FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH %s
+            ORDER BY rank
+            LIMIT %s OFFSET %s
+            ''',
+            [TITLE_WEIGHT, BODY_WEIGHT, _MARK_START, _MARK_END, match, per_page + 1, offset],
+        )
+        rows = cursor.fetchall()
+
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = Post.objects.select_related('author', 'category').defer(*Post.HEAVY_FIELDS).in_bulk([row[0] for row in rows])
+    results = [
+        SearchResult(posts[pk], _highlight(snippet), rank)
+        for pk, rank, snippet in rows
+        if pk in posts
+    ]
+    return results, has_next
@@ -0,0 +1,136 @@
+"""
+СЕРИАЛИЗАЦИЯ ДЛЯ JSON API
+
+Сериализаторы работают со строками .values(), а не с экземплярами моделей:
+из БД читаются только запрошенные колонки, объекты моделей не создаются.
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .pagination import encode_cursor
+
+
+def media_url(name):
+    """Относительный путь файла -> URL (или None для пустого поля)"""
+    return f'{settings.MEDIA_URL}{name}' if name else None
+
+
+class ValuesSerializer:
+    """
+    Базовый сериализатор
+    fields - публичное имя поля -> путь ORM для .values()
+    converters - публичное имя поля -> функция преобразования значения
+    """
+    fields = {}
+    converters = {}
+    # Поля, нужные для курсора, читаются всегда, даже если не запрошены
+    cursor_paths = ('created_at', 'id')
+
+    def __init__(self, requested=None):
+        """
+        requested - строка из параметра fields= ("id,title,author")
+        При неизвестном поле выбрасывает ValueError
+        """
+        if requested:
+            names = [name.strip() for name in requested.split(',') if name.strip()]
+            unknown = [name for name in names if name not in self.fields]
+            if unknown:
+                raise ValueError(f'Неизвестные поля: {", ".join(unknown)}')
+            self.names = names
+        else:
+            self.names = list(self.fields)
+
+    def value_paths(self):
+        """Список колонок для queryset.values()"""
+        paths = [self.fields[name] for name in self.names]
+        return paths + [path for path in self.cursor_paths if path not in paths]
+
+    def to_dict(self, row):
+        """Строка .values() -> словарь ответа"""
+        data = {}
+        for name in self.names:
+            value = row[self.fields[name]]
+            converter = self.converters.get(name)
+            data[name] = converter(value) if converter else value
+        return data
+
+
+class PostSerializer(ValuesSerializer):
+    fields = {
+        'id': 'id',
+        'title': 'title',
+        'content': 'content_html',  # Очищенный HTML, безопасный для вставки на страницу
+        'excerpt': 'excerpt',
+        'category': 'category__name',
+        'author_id': 'author_id',
+        'author': 'author__username',
+        'image': 'image',
+        'reply_count': 'reply_count',
+        'accepted_reply_count': 'accepted_reply_count',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    converters = {'image': media_url}
+
+
+class ReplySerializer(ValuesSerializer):
+    fields = {
+        'id': 'id',
+        'post_id': 'post_id',
+        'post_title': 'post__title',
+        'author_id': 'author_id',
+        'author': 'author__username',
+        'text': 'text',
+        'is_accepted': 'is_accepted',
+        'created_at': 'created_at',
+    }
+
+
+def stream_page(queryset, serializer, limit, chunk_size=200):
+    """
+    Потоковая выдача страницы в виде JSON:
+    {"results": [...], "next": "<курсор>" | null}
+
+    queryset должен быть отсортирован от новых к старым; читается limit + 1
+    строка через .iterator(), в памяти держится только текущий фрагмент
+    """
+    rows = queryset.values(*serializer.value_paths())[:limit + 1].iterator(chunk_size=chunk_size)
+    last = None
+    has_more = False
+
+    yield '{"results": ['
+    for index, row in enumerate(rows):
+        if index == limit:
+            has_more = True
+            break
+        if index:
+            yield ','
+        yield json.dumps(serializer.to_dict(row), cls=DjangoJSONEncoder, ensure_ascii=False)
+        last = row
+
+    next_cursor = encode_cursor(last['created_at'], last['id']) if has_more and last else None
+    yield '], "next": ' + json.dumps(next_cursor) + '}'
+
+
+async def astream_page(queryset, serializer, limit, chunk_size=200):
+    """Асинхронный вариант stream_page: строки читаются через aiterator() порциями по chunk_size"""
+    last = None
+    has_more = False
+    index = 0
+
+    yield '{"results": ['
+    rows = queryset.values(*serializer.value_paths())[:limit + 1].aiterator(chunk_size=chunk_size)
+    async for row in rows:
+        if index == limit:
+            has_more = True
+            break
+        if index:
+            yield ','
+        yield json.dumps(serializer.to_dict(row), cls=DjangoJSONEncoder, ensure_ascii=False)
+        last = row
+        index += 1
+
+    next_cursor = encode_cursor(last['created_at'], last['id']) if has_more and last else None
+    yield '], "next": ' + json.dumps(next_cursor) + '}'
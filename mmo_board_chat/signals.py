@@ -1,16 +1,137 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.db import transaction
 from django.dispatch import receiver
-from django.core.mail import send_mail
 from django.conf import settings
-from .models import Reply
+from .cache import forget_cached_user
+from .counters import bump_feed_version, change_reply_counters
+from .digests import flush_digest
+from .events import hub, reply_event_data
+from .images import release_files, schedule_variants, variant_files
+from .mail import enqueue_email
+from .models import Category, Post, Reply, ReplyNotification, User
+from .search import index_post, remove_post
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Сброс закешированного пользователя сессии
+    Повторно - после коммита: параллельный запрос мог успеть закешировать старую версию
+    """
+    user_id = instance.pk
+    forget_cached_user(user_id)
+    transaction.on_commit(lambda: forget_cached_user(user_id))
+
+
+@receiver(post_save, sender=User)
+def flush_pending_digest(sender, instance, created, **kwargs):
+    """Переход со сводки на мгновенные письма: накопленные уведомления - одной сводкой сразу"""
+    if (not created and instance.notification_frequency == User.NOTIFY_IMMEDIATE
+            and instance.has_changed('notification_frequency')):
+        flush_digest(instance, instance.previous('notification_frequency'))
+
+
+@receiver(pre_save, sender=Post)
+def reset_image_variants(sender, instance, **kwargs):
+    """
+    Новая картинка - старые уменьшенные копии больше не подходят
+    Прежние файлы запоминаются, чтобы освободить их после коммита
+    """
+    if instance.has_changed('image'):
+        if instance.is_tracking():
+            instance._stale_image_files = [instance.previous('image')] + variant_files(instance.image_variants)
+        instance.image_variants = {}
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, **kwargs):
+    stale = getattr(instance, '_stale_image_files', None)
+    if stale:
+        instance._stale_image_files = None
+        transaction.on_commit(lambda: release_files(stale))
+
+
+@receiver(post_delete, sender=Post)
+def release_post_image(sender, instance, **kwargs):
+    """Освобождение картинки и её копий после удаления объявления"""
+    if instance.image:
+        files = [instance.image.name] + variant_files(instance.image_variants)
+        transaction.on_commit(lambda: release_files(files))
+
+
+@receiver(post_save, sender=Post)
+def build_image_variants(sender, instance, created, **kwargs):
+    """Фоновая генерация уменьшенных копий после загрузки картинки"""
+    if instance.image and instance.has_changed('image'):
+        schedule_variants(instance)
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, created, **kwargs):
+    """Переиндексация объявления только при изменении заголовка или текста"""
+    if created or instance.has_changed('title') or instance.has_changed('content'):
+        index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_search_index(sender, instance, **kwargs):
+    remove_post(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def mark_feed_changed(sender, instance, **kwargs):
+    """Удаление не меняет MAX(updated_at) ленты - новая версия для условных GET"""
+    bump_feed_version()
+
+
+@receiver(post_save, sender=User)
+def mark_feed_author_renamed(sender, instance, created, **kwargs):
+    """Имя автора показывается в карточках ленты"""
+    if not created and instance.has_changed('username'):
+        bump_feed_version()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def mark_feed_category_changed(sender, instance, **kwargs):
+    """Название категории показывается в карточках ленты"""
+    bump_feed_version()
+
+
+@receiver(post_save, sender=Reply)
+def count_saved_reply(sender, instance, created, **kwargs):
+    """Обновление счётчиков объявления при создании и принятии отклика"""
+    if created:
+        change_reply_counters(instance.post_id, replies=1, accepted=int(instance.is_accepted))
+    elif instance.has_changed('is_accepted'):
+        change_reply_counters(instance.post_id, accepted=1 if instance.is_accepted else -1)
+
+
+@receiver(post_delete, sender=Reply)
+def count_deleted_reply(sender, instance, origin=None, **kwargs):
+    """
+    Обновление счётчиков при удалении отклика (в т.ч. каскадном и из админки)
+    Если удаляется само объявление, счётчики трогать незачем
+    """
+    if isinstance(origin, Post) and origin.pk == instance.post_id:
+        return
+    change_reply_counters(instance.post_id, replies=-1, accepted=-int(instance.is_accepted))
 
 
 @receiver(post_save, sender=Reply)
 def notify_about_new_reply(sender, instance, created, **kwargs):
     """
-    Отправка уведомления автору объявления о новом отклике
+    Уведомление автора объявления о новом отклике
+    Письмо ставится в очередь в той же транзакции, что и сам отклик;
+    если автор выбрал сводку - отклик откладывается до send_reply_digests
     """
     if created:  # Только при создании нового отклика
+        post_author = instance.post.author
+        if post_author.notification_frequency != User.NOTIFY_IMMEDIATE:
+            ReplyNotification.objects.create(reply=instance, recipient=post_author)
+            return
+
         subject = f'Новый отклик на ваше объявление "{instance.post.title}"'
         message = f'''Пользователь {instance.author.username} оставил отклик:
 
@@ -18,39 +139,51 @@ def notify_about_new_reply(sender, instance, created, **kwargs):
 
 Просмотреть все отклики: {settings.SITE_URL}/profile/''' # Ссылка на приватную страницу
 
-        send_mail(
+        enqueue_email(
+            dedup_key=f'reply:{instance.pk}:created',
+            recipient=post_author.email, # Отправка автору объявления
             subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[instance.post.author.email], # Отправка автору объявления
-            fail_silently=False, # Выбрасывать исключение при ошибке отправки
+            body=message,
         )
 
 
 @receiver(post_save, sender=Reply)
-def notify_about_accepted_reply(sender, instance, **kwargs):
+def notify_about_accepted_reply(sender, instance, created, **kwargs):
     """
-    Отправка уведомления автору отклика о его принятии
+    Уведомление автора отклика о его принятии (через очередь писем)
+    Срабатывает только на переходе "не принят -> принят"
     """
-    if instance.is_accepted and instance.pk:  # Если отклик принят и уже существует в БД
-        # Проверяем, изменился ли статус принятия
-        try:
-            old_instance = Reply.objects.get(pk=instance.pk)
-            if not old_instance.is_accepted:  # Если статус изменился с непринятого на принятый
-                subject = f'Ваш отклик принят!'
-                message = f'''Ваш отклик на объявление "{instance.post.title}" был принят автором.
+    if created or not instance.is_accepted or not instance.has_changed('is_accepted'):
+        return
+
+    subject = f'Ваш отклик принят!'
+    message = f'''Ваш отклик на объявление "{instance.post.title}" был принят автором.
 
 Текст отклика:
 {instance.text}
 
 Связаться с автором: {instance.post.author.email}'''
 
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[instance.author.email],
-                    fail_silently=False,
-                )
-        except Reply.DoesNotExist:
-            pass
\ No newline at end of file
+    enqueue_email(
+        dedup_key=f'reply:{instance.pk}:accepted',
+        recipient=instance.author.email,
+        subject=subject,
+        body=message,
+    )
+
+
+@receiver(post_save, sender=Reply)
+def publish_reply_events(sender, instance, created, **kwargs):
+    """
+    Живые уведомления (SSE) после фиксации транзакции:
+    новый отклик - автору объявления, принятие - автору отклика и автору объявления
+    """
+    if created:
+        recipients, event_type = [instance.post.author_id], 'reply'
+    elif instance.is_accepted and instance.has_changed('is_accepted'):
+        recipients, event_type = {instance.author_id, instance.post.author_id}, 'accepted'
+    else:
+        return
+
+    data = reply_event_data(instance)
+    transaction.on_commit(lambda: [hub.publish(user_id, event_type, data) for user_id in recipients])
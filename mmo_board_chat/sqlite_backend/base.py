@@ -0,0 +1,158 @@
+"""
+SQLITE С НАСТРОЙКОЙ СОЕДИНЕНИЯ
+
+Стандартный бэкенд django.db.backends.sqlite3, который при открытии
+соединения выполняет PRAGMA из OPTIONS['pragmas'] (WAL, busy_timeout,
+размер кеша и т.д.).
+
+Транзакции по умолчанию начинаются как обычно (BEGIN DEFERRED): чтение
+в atomic() не берёт блокировку записи и не ждёт пишущих. Транзакция,
+которая сначала читает, а потом пишет, открывается через
+write_transaction() - BEGIN IMMEDIATE берёт блокировку записи сразу, и
+конкурирующие записи ждут busy_timeout, а не падают с "database is
+locked" при попытке повысить блокировку. OPTIONS['transaction_mode']
+задаёт режим для всех транзакций сразу.
+
+on_rollback() - пара к transaction.on_commit(): функция выполняется,
+если транзакция (или точка сохранения, внутри которой она
+зарегистрирована) откатывается. Нужна для уборки файлов, записанных
+в транзакции, которая в итоге не зафиксирована; в функции не должно
+быть запросов к базе.
+
+    DATABASES = {'default': {
+        'ENGINE': 'mmo_board_chat.sqlite_backend',
+        'NAME': ...,
+        'OPTIONS': {'pragmas': {'journal_mode': 'wal', ...}},
+    }}
+"""
+import re
+from contextlib import contextmanager
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.backends.sqlite3 import base as sqlite3_base
+
+# Значения по умолчанию, если в OPTIONS не задан словарь pragmas
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,  # мс
+    'cache_size': -20000,  # Отрицательное значение - в КиБ, т.е. ~20 МБ
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+
+TRANSACTION_MODES = (None, 'DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+# Ключи OPTIONS, которые обрабатывает этот бэкенд, а не sqlite3.connect()
+BACKEND_OPTIONS = ('pragmas', 'transaction_mode')
+
+_PRAGMA_NAME_RE = re.compile(r'^[a-z_]+$')
+_PRAGMA_VALUE_RE = re.compile(r'^(-?\d+|[A-Za-z_]+)$')
+
+
+def pragma_statements(pragmas):
+    """Словарь PRAGMA -> список SQL-команд; имена и значения проверяются, т.к. подставляются в SQL"""
+    statements = []
+    for name, value in pragmas.items():
+        value = str(value)
+        if not _PRAGMA_NAME_RE.match(name) or not _PRAGMA_VALUE_RE.match(value):
+            raise ImproperlyConfigured(f'Недопустимая PRAGMA: {name} = {value}')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+class DatabaseWrapper(sqlite3_base.DatabaseWrapper):
+
+    def __init__(self, settings_dict, *args, **kwargs):
+        super().__init__(settings_dict, *args, **kwargs)
+        self.begin_immediate = False  # Следующая транзакция - BEGIN IMMEDIATE (write_transaction)
+        self.run_on_rollback = []  # (точки сохранения на момент регистрации, функция)
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = options.get('pragmas', DEFAULT_PRAGMAS)
+        self.transaction_mode = options.get('transaction_mode')
+        if self.transaction_mode is not None:
+            self.transaction_mode = self.transaction_mode.upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {", ".join(map(str, TRANSACTION_MODES[1:]))}'
+            )
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for key in BACKEND_OPTIONS:
+            params.pop(key, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in pragma_statements(self.pragmas):
+            conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = 'IMMEDIATE' if self.begin_immediate else self.transaction_mode
+        self.begin_immediate = False
+        if mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f'BEGIN {mode}')
+
+    def on_rollback(self, func):
+        if self.in_atomic_block:
+            self.run_on_rollback.append((set(self.savepoint_ids), func))
+
+    def run_rollback_hooks(self, sid=None):
+        """Функции, зарегистрированные в откатываемой точке сохранения sid (None - во всей транзакции)"""
+        hooks = [func for sids, func in self.run_on_rollback if sid is None or sid in sids]
+        self.run_on_rollback = [item for item in self.run_on_rollback if sid is not None and sid not in item[0]]
+        for func in hooks:
+            func()
+
+    def commit(self):
+        super().commit()
+        self.run_on_rollback = []
+
+    def rollback(self):
+        super().rollback()
+        self.run_rollback_hooks()
+
+    def savepoint_rollback(self, sid):
+        super().savepoint_rollback(sid)
+        self.run_rollback_hooks(sid)
+
+    def close(self):
+        in_transaction = self.in_atomic_block
+        super().close()
+        if in_transaction:
+            self.run_rollback_hooks()  # Незафиксированная транзакция потеряна вместе с соединением
+        else:
+            self.run_on_rollback = []
+
+
+def on_rollback(func, using=None):
+    """
+    Выполнить func при откате текущей транзакции
+    Вне транзакции и на других бэкендах ничего не делает
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    if isinstance(connection, DatabaseWrapper):
+        connection.on_rollback(func)
+
+
+@contextmanager
+def write_transaction(using=None):
+    """
+    transaction.atomic() для транзакции с записью: на этом бэкенде
+    начинается с BEGIN IMMEDIATE, на других - обычная atomic()
+    Внутри уже открытой транзакции - просто точка сохранения
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    if isinstance(connection, DatabaseWrapper) and not connection.in_atomic_block:
+        connection.begin_immediate = True
+    try:
+        with transaction.atomic(using=using):
+            yield
+    finally:
+        if isinstance(connection, DatabaseWrapper):
+            connection.begin_immediate = False
@@ -0,0 +1,196 @@
+"""
+ХРАНИЛИЩЕ ЗАГРУЗОК С АДРЕСАЦИЕЙ ПО СОДЕРЖИМОМУ
+
+Файл при загрузке потоково пишется во временный файл с одновременным
+подсчётом SHA-256 и кладётся под именем <раздел>/ab/cd/<sha256>.<расширение>.
+Одинаковые загрузки хранятся один раз; число ссылок на файл ведётся
+в таблице StoredBlob, физическое удаление - когда ссылок не осталось
+(файлы без записи в StoredBlob не удаляются). Новый файл переносится
+на место после фиксации транзакции, в которой добавлена ссылка; при
+откате временный файл удаляется.
+
+Здесь же хранилище статики для collectstatic (см. assets.py).
+"""
+import gzip
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from .sqlite_backend.base import on_rollback
+
+try:
+    import brotli
+except ImportError:  # Без пакета brotli статика сжимается только в .gz
+    brotli = None
+
+HASH_ALGORITHM = 'sha256'
+INCOMING_DIR = '.incoming'
+
+# Статика, которую имеет смысл сжимать заранее (шрифты woff/woff2 и картинки уже сжаты)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.ttf', '.eot', '.ico')
+COMPRESS_MIN_SIZE = 512
+
+_HASHED_NAME_RE = re.compile(r'^(?:[^/]+/)?[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(?:\.\w+)?$')
+
+# Файлы незафиксированных транзакций: итоговый путь -> временный файл в INCOMING_DIR
+_pending = {}
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage с дедупликацией
+    Имя, переданное при сохранении, определяет только раздел (первый
+    каталог, например posts/ или uploads/) и расширение файла
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя зависит от содержимого, переименовывать при совпадении не нужно
+        return name
+
+    @staticmethod
+    def is_content_addressed(name):
+        """Файл уже лежит под именем-хешем (а не загружен до дедупликации)"""
+        return bool(_HASHED_NAME_RE.match(name or ''))
+
+    def hashed_name(self, name, digest):
+        section = name.replace('\\', '/').split('/', 1)[0] if '/' in name else ''
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(section, digest[:2], digest[2:4], f'{digest}{extension}')
+
+    def path(self, name):
+        # До фиксации транзакции файл читается из временного
+        path = super().path(name)
+        return _pending.get(path, path)
+
+    def _save(self, name, content):
+        incoming = self.path(INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+
+        digest = hashlib.new(HASH_ALGORITHM)
+        fd, tmp_path = tempfile.mkstemp(dir=incoming)
+        final_path = None
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+
+            final_name = self.hashed_name(name, digest.hexdigest())
+            final_path = super().path(final_name)
+            # Наличие файла проверяется после добавления ссылки, под блокировкой записи:
+            # параллельный delete() снимет последнюю ссылку и удалит файл либо до, либо после.
+            # Новый файл появляется на месте только вместе с фиксацией ссылки
+            with transaction.atomic():
+                self.add_reference(final_name)
+                if os.path.exists(final_path) or final_path in _pending:
+                    os.remove(tmp_path)  # Такой файл уже есть - второй экземпляр не нужен
+                else:
+                    _pending[final_path] = tmp_path
+                    transaction.on_commit(lambda: self._move_pending(final_path))
+                    on_rollback(lambda: self._discard_pending(final_path, tmp_path))
+        except BaseException:
+            self._discard_pending(final_path, tmp_path)
+            raise
+        return final_name
+
+    def _move_pending(self, final_path):
+        tmp_path = _pending.pop(final_path, None)
+        if tmp_path is None:
+            return  # Удалён до фиксации
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(tmp_path, final_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(final_path, self.file_permissions_mode)
+
+    @staticmethod
+    def _discard_pending(final_path, tmp_path):
+        if _pending.get(final_path) == tmp_path:
+            del _pending[final_path]
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def add_reference(self, name):
+        from .models import StoredBlob
+
+        with transaction.atomic():
+            StoredBlob.objects.bulk_create([StoredBlob(name=name, refcount=0)], ignore_conflicts=True)
+            StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+    def delete(self, name):
+        """
+        Снятие одной ссылки на файл; файл удаляется вместе с последней
+        Файл без записи в StoredBlob не трогается: неизвестно, кто ещё на него ссылается
+        (старые загрузки переносит и чистит manage.py dedupe_media)
+        """
+        from .models import StoredBlob
+
+        if not name:
+            return
+        with transaction.atomic():
+            StoredBlob.objects.filter(name=name, refcount__gt=0).update(refcount=F('refcount') - 1)
+            # Удаляется только строка с нулём: параллельный add_reference мог уже добавить ссылку
+            deleted, _ = StoredBlob.objects.filter(name=name, refcount=0).delete()
+            if deleted:
+                super().delete(name)
+                _pending.pop(super().path(name), None)
+
+
+def upload_storage():
+    """Хранилище для Post.image (вызываемый объект, чтобы не менять миграции при смене настроек)"""
+    return ContentAddressedStorage()
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Статика для collectstatic: имена с хешем содержимого (staticfiles.json)
+    и рядом с каждым файлом - сжатые копии .gz и, если установлен brotli, .br
+    Их отдаёт PrecompressedStaticMiddleware по Accept-Encoding
+    """
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            if self.hashed_files:
+                raise
+            # Статика не собрана (разработка, тесты) - ссылка на исходный файл
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+        if not dry_run:
+            for hashed_name in sorted(hashed_names):
+                self.compress(hashed_name)
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        path = self.path(name)
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data)
+        for suffix, compressed in variants.items():
+            if len(compressed) < len(data):
+                with open(path + suffix, 'wb') as file:
+                    file.write(compressed)
@@ -0,0 +1,37 @@
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from mmo_board_chat.assets import STATIC_PREFIX, UNBUILT_BUNDLES, bundle_path
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def bundle_built(name):
+    """Бандл собран: есть в манифесте collectstatic или (без него) среди исходной статики"""
+    path = bundle_path(name)
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', None)
+    if hashed_files:
+        return path in hashed_files
+    return finders.find(path) is not None
+
+
+def bundle_urls(name):
+    if bundle_built(name):
+        return [static(bundle_path(name))]
+    return [url if '://' in url else static(f'{STATIC_PREFIX}/{url}') for url in UNBUILT_BUNDLES[name]]
+
+
+@register.simple_tag
+def asset_bundle(name):
+    """Теги <link>/<script> бандла из assets.BUNDLES"""
+    if name.endswith('.css'):
+        html = '<link rel="stylesheet" href="{}">'
+    else:
+        html = '<script src="{}"></script>'
+    return format_html_join('\n    ', html, ((url,) for url in bundle_urls(name)))
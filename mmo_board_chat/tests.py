@@ -1,3 +1,1287 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models.signals import pre_save
+from django.http import FileResponse, HttpResponse
+from django.test import AsyncClient, AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import async_views, views
+from .assets import minify_css, rebase_css_urls
+from .cache import user_cache_key
+from .confirmation import make_confirmation_token, user_by_confirmation_token
+from .digests import send_digests
+from .events import EventHub, event_stream, hub
+from .images import generate_variants, variant_files
+from .mail import deliver_outbox, enqueue_email
+from .metrics import RequestMetrics, view_counters
+from .middleware import PIN_COOKIE, BaseMiddleware, PrecompressedStaticMiddleware, ReplicaPinningMiddleware
+from .models import Category, ImportRun, OutgoingEmail, Post, Reply, ReplyNotification, StoredBlob, User
+from .pagination import DEFAULT_PAGE_SIZE, encode_cursor
+from .perf import benchmark_targets, measure_view
+from .ratelimit import client_ip, get_backend, hit
+from .routers import PrimaryReplicaRouter, replica_reads, wrote_to_primary
+from .sanitize import make_excerpt, sanitize_html
+from .search import index_post as search_index_post, search_posts
+from .sqlite_backend.base import write_transaction
+from .storage import INCOMING_DIR, ContentAddressedStorage
+from .transfer import Importer, export_lines
+
+# Строка плана SQLite вида "SCAN <таблица>" без "USING ... INDEX" - полный проход по таблице
+FULL_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+
+# Справочники из нескольких строк, читаемые целиком намеренно
+SMALL_TABLES = {'mmo_board_chat_category'}
+
+
+class QueryPlanTests(TestCase):
+    """
+    Запросы горячих страниц не должны читать таблицы целиком
+    Каждый SELECT, выполненный страницей, прогоняется через EXPLAIN QUERY PLAN
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        cls.other = User.objects.create_user(email='other@example.com', username='other', password='pass')
+        cls.pending = User.objects.create_user(email='new@example.com', username='new', password='pass')
+        cls.category = Category.objects.create(name='tank')
+        cls.posts = [
+            Post.objects.create(title=f'Объявление {index}', content='<p>Ищу группу</p>',
+                                author=cls.author, category=cls.category)
+            for index in range(5)
+        ]
+        for post in cls.posts:
+            for index in range(3):
+                Reply.objects.create(post=post, author=cls.other, text=f'Отклик {index}')
+
+    def assertNoFullScans(self, queries):
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+            for step in plan:
+                match = FULL_SCAN_RE.match(step)
+                if match and match.group(1) not in SMALL_TABLES:
+                    self.fail(f'Полный проход по {match.group(1)}:\n{sql}\n' + '\n'.join(plan))
+
+    def assertPageUsesIndexes(self, url, method='get', data=None, login=None):
+        if login:
+            self.client.force_login(login)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+            if response.streaming:
+                b''.join(response.streaming_content)  # Запросы потоковых ответов идут при чтении
+        self.assertLess(response.status_code, 400)
+        self.assertNoFullScans(queries)
+
+    def test_home(self):
+        self.assertPageUsesIndexes(reverse('mmo_board_chat:home'))
+
+    def test_home_older_page(self):
+        post = self.posts[2]
+        self.assertPageUsesIndexes(reverse('mmo_board_chat:home'), data={'before': encode_cursor(post.created_at, post.pk)})
+
+    def test_post_detail(self):
+        self.assertPageUsesIndexes(reverse('mmo_board_chat:post_detail', args=[self.posts[0].pk]), login=self.other)
+
+    def test_profile(self):
+        url = reverse('mmo_board_chat:profile')
+        self.assertPageUsesIndexes(url, login=self.author)
+        self.assertPageUsesIndexes(url, data={'status': 'accepted'})
+        self.assertPageUsesIndexes(url, data={'status': 'pending', 'post': self.posts[0].pk})
+
+    def test_confirm_email(self):
+        token = make_confirmation_token(self.pending)
+        self.assertPageUsesIndexes(reverse('mmo_board_chat:confirm_email', args=[token]))
+
+    def test_confirm_email_manual(self):
+        self.assertPageUsesIndexes(reverse('mmo_board_chat:confirm_email_manual'), method='post',
+                                   data={'code': 'wrong-code'})
+
+    def test_search(self):
+        self.assertPageUsesIndexes(reverse('mmo_board_chat:search'), data={'q': 'группу'})
+
+    def test_api_posts(self):
+        url = reverse('mmo_board_chat:api_posts')
+        self.assertPageUsesIndexes(url)
+        self.assertPageUsesIndexes(url, data={'category': 'tank'})
+        self.assertPageUsesIndexes(url, data={'author': self.author.pk})
+
+    def test_api_replies(self):
+        url = reverse('mmo_board_chat:api_replies')
+        self.assertPageUsesIndexes(url)
+        self.assertPageUsesIndexes(url, data={'post': self.posts[0].pk})
+        self.assertPageUsesIndexes(url, data={'author': self.other.pk, 'accepted': '0'})
+
+
+class ConfirmationTokenTests(TestCase):
+    """Подписанные коды подтверждения email"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='new@example.com', username='new', password='pass')
+
+    def test_confirm_by_token(self):
+        url = reverse('mmo_board_chat:confirm_email', args=[make_confirmation_token(self.user)])
+        self.assertRedirects(self.client.get(url), reverse('mmo_board_chat:profile'))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.email_confirmed)
+
+        # Использованный код больше не действует
+        self.client.logout()
+        self.assertRedirects(self.client.get(url), reverse('mmo_board_chat:home'))
+
+    def test_rejects_tampered_expired_and_stale_tokens(self):
+        token = make_confirmation_token(self.user)
+        self.assertEqual(user_by_confirmation_token(token), self.user)
+        self.assertIsNone(user_by_confirmation_token(token[:-1] + ('A' if token[-1] != 'A' else 'B')))
+        self.assertIsNone(user_by_confirmation_token('garbage'))
+        with override_settings(EMAIL_CONFIRMATION_MAX_AGE=-1):
+            self.assertIsNone(user_by_confirmation_token(token))
+        self.user.email = 'changed@example.com'
+        self.user.save()
+        self.assertIsNone(user_by_confirmation_token(token))
+
+    def test_register_writes_user_once(self):
+        data = {'username': 'player', 'email': 'player@example.com',
+                'password1': 'Sl0w-and-steady', 'password2': 'Sl0w-and-steady'}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('mmo_board_chat:register'), data)
+        user_writes = [query['sql'] for query in queries.captured_queries
+                       if query['sql'].startswith(('INSERT INTO "mmo_board_chat_user"', 'UPDATE "mmo_board_chat_user"'))]
+        self.assertEqual(len(user_writes), 1)
+        self.assertRedirects(response, reverse('mmo_board_chat:confirm_email_manual'))
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    """Почтовый бэкенд, у которого SMTP-сервер недоступен"""
+
+    def send_messages(self, email_messages):
+        raise SMTPException('Сервер недоступен')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', DEFAULT_FROM_EMAIL='board@example.com')
+class OutboxTests(TestCase):
+    """Очередь писем: запись в транзакции данных, повторы с задержкой, без дублей"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        cls.player = User.objects.create_user(email='player@example.com', username='player', password='pass')
+        cls.post = Post.objects.create(title='Объявление', content='<p>Ищу группу</p>', author=cls.author,
+                                       category=Category.objects.create(name='tank'))
+
+    def test_email_enqueued_only_with_committed_reply(self):
+        try:
+            with transaction.atomic():
+                Reply.objects.create(post=self.post, author=self.player, text='Откатится')
+                self.assertEqual(OutgoingEmail.objects.count(), 1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+        Reply.objects.create(post=self.post, author=self.player, text='Я')
+        self.assertEqual(list(OutgoingEmail.objects.values_list('recipient', flat=True)), [self.author.email])
+        self.assertEqual(mail.outbox, [])  # В запросе письмо не отправляется
+
+    def test_dedup_key_is_idempotent(self):
+        for _ in range(2):
+            enqueue_email('test:1', 'player@example.com', 'Тема', 'Текст')
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+
+        self.assertEqual(deliver_outbox(), (1, 0))
+        self.assertEqual(deliver_outbox(), (0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['player@example.com'])
+        self.assertEqual(OutgoingEmail.objects.get().status, OutgoingEmail.SENT)
+
+    @override_settings(EMAIL_BACKEND='mmo_board_chat.tests.FailingEmailBackend', OUTBOX_MAX_ATTEMPTS=2,
+                       OUTBOX_RETRY_DELAY=10)
+    def test_retry_with_backoff_then_fail(self):
+        enqueue_email('test:retry', 'player@example.com', 'Тема', 'Текст')
+        with self.assertLogs('mmo_board_chat.mail', 'WARNING'):
+            self.assertEqual(deliver_outbox(), (0, 1))
+        email = OutgoingEmail.objects.get()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.PENDING, 1))
+        self.assertEqual(round((email.next_attempt_at - timezone.now()).total_seconds()), 10)
+        self.assertEqual(deliver_outbox(), (0, 0))  # Задержка ещё не прошла
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        with self.assertLogs('mmo_board_chat.mail', 'WARNING'):
+            self.assertEqual(deliver_outbox(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.FAILED, 2))
+        self.assertIn('недоступен', email.last_error)
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_outbox(), (0, 0))  # Неотправленные больше не берутся
+
+
+class DigestTests(TestCase):
+    """Сводки об откликах: пропущенные окна и переход на мгновенные письма"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='author@example.com', username='author', password='pass',
+                                              notification_frequency=User.NOTIFY_DAILY)
+        cls.player = User.objects.create_user(email='player@example.com', username='player', password='pass')
+        cls.post = Post.objects.create(title='Объявление', content='<p>Ищу группу</p>', author=cls.author,
+                                       category=Category.objects.create(name='tank'))
+
+    def reply(self, created_at):
+        reply = Reply.objects.create(post=self.post, author=self.player, text='Я')
+        ReplyNotification.objects.filter(reply=reply).update(created_at=created_at)
+
+    def test_label_starts_at_oldest_pending(self):
+        now = timezone.now()
+        self.reply(now - timedelta(days=3))  # Запуски за два дня пропущены
+        self.reply(now - timedelta(days=1))
+        self.assertEqual(send_digests(User.NOTIFY_DAILY, now), 1)
+        email = OutgoingEmail.objects.get()
+        self.assertIn(timezone.localtime(now - timedelta(days=3)).strftime('%d.%m.%Y'), email.subject)
+        self.assertIn('Новых откликов: 2', email.body)
+
+    def test_switch_to_immediate_flushes_pending(self):
+        self.reply(timezone.now())
+        self.assertFalse(OutgoingEmail.objects.exists())
+        self.author.notification_frequency = User.NOTIFY_IMMEDIATE
+        self.author.save()
+        self.assertEqual(OutgoingEmail.objects.get().recipient, self.author.email)
+        self.assertFalse(ReplyNotification.objects.filter(sent_at__isnull=True).exists())
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Общий файл удаляется только вместе с последней ссылкой"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = directory.name
+        self.storage = ContentAddressedStorage(location=directory.name)
+
+    def on_disk(self, name):
+        return os.path.isfile(os.path.join(self.location, name))
+
+    def incoming_files(self):
+        return os.listdir(os.path.join(self.location, INCOMING_DIR))
+
+    def test_shared_file_deleted_with_last_reference(self):
+        first = self.storage.save('posts/a.png', ContentFile(b'same'))
+        second = self.storage.save('posts/b.png', ContentFile(b'same'))
+        self.assertEqual(first, second)
+        self.assertEqual(StoredBlob.objects.get(name=first).refcount, 2)
+
+        self.storage.delete(first)
+        self.assertTrue(self.storage.exists(first))
+        self.storage.delete(first)
+        self.assertFalse(self.storage.exists(first))
+        self.assertFalse(StoredBlob.objects.filter(name=first).exists())
+
+    def test_file_without_refcount_is_kept(self):
+        name = self.storage.save('posts/a.png', ContentFile(b'data'))
+        StoredBlob.objects.filter(name=name).delete()
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_file_moved_into_place_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            name = self.storage.save('posts/a.png', ContentFile(b'data'))
+            self.assertFalse(self.on_disk(name))
+            with self.storage.open(name) as file:  # Внутри транзакции файл уже читается
+                self.assertEqual(file.read(), b'data')
+            self.assertEqual(self.storage.save('posts/b.png', ContentFile(b'data')), name)
+        self.assertTrue(self.on_disk(name))
+        self.assertEqual(self.incoming_files(), [])
+
+    def test_rolled_back_save_leaves_no_file(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                name = self.storage.save('posts/a.png', ContentFile(b'data'))
+                raise RuntimeError
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+        self.assertEqual(self.incoming_files(), [])
+
+    def test_deleted_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            name = self.storage.save('posts/a.png', ContentFile(b'data'))
+            self.storage.delete(name)
+        self.assertFalse(self.on_disk(name))
+        self.assertEqual(self.incoming_files(), [])
+
+
+class SanitizeTests(TestCase):
+    """Очистка HTML редактора, анонс и их пересчёт при сохранении объявления"""
+
+    def test_dangerous_markup_removed(self):
+        html = sanitize_html(
+            '<p onclick="steal()">Текст<script>alert(1)</script></p>'
+            '<a href="javascript:alert(1)" onmouseover="x()">ссылка</a>'
+            '<a href=" JaVaScRiPt:alert(1)">ещё</a><img src="java\tscript:x" onerror="x()">'
+            '<style>p {}</style><iframe src="https://example.com"></iframe>'
+        )
+        self.assertEqual(html, '<p>Текст</p><a rel="nofollow noopener">ссылка</a>'
+                               '<a rel="nofollow noopener">ещё</a><img>')
+
+    def test_allowed_markup_kept(self):
+        html = ('<p><strong>Рейд</strong> в <em>пятницу</em></p><ul><li>танк</li></ul>'
+                '<a href="https://example.com/?a=1&amp;b=2" title="Сайт">сайт</a><img src="/media/a.png" alt="a">')
+        self.assertEqual(sanitize_html(html), html.replace('title="Сайт">', 'title="Сайт" rel="nofollow noopener">'))
+        self.assertEqual(sanitize_html('<p>&lt;b&gt; <b>жирный'), '<p>&lt;b&gt; <b>жирный</b></p>')
+
+    def test_excerpt(self):
+        self.assertEqual(make_excerpt('<p>Коротко</p><p>и ясно</p>'), 'Коротко и ясно')
+        text = '<p>' + ' '.join(['слово'] * 100) + '</p>'
+        excerpt = make_excerpt(text, length=20)
+        self.assertEqual(excerpt, 'слово слово слово…')
+        self.assertEqual(make_excerpt('<p>' + 'а' * 30 + '</p>', length=20), 'а' * 20 + '…')
+        self.assertEqual(make_excerpt('<p>Ровно, до. точки</p>', length=10), 'Ровно…')
+
+    def test_post_save_renders_only_changed_content(self):
+        author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        post = Post.objects.create(title='Объявление', content='<p onclick="x()">Текст</p>', author=author,
+                                   category=Category.objects.create(name='tank'))
+        self.assertEqual((post.content_html, post.excerpt), ('<p>Текст</p>', 'Текст'))
+
+        with mock.patch('mmo_board_chat.models.sanitize_html', wraps=sanitize_html) as sanitize:
+            post.title = 'Новое'
+            post.save()
+            post.save(update_fields=['title'])
+            self.assertFalse(sanitize.called)
+
+            post.content = '<p>Другой</p>'
+            post.save(update_fields=['title'])  # content не сохраняется - и не пересчитывается
+            self.assertFalse(sanitize.called)
+            self.assertEqual(Post.objects.get(pk=post.pk).content_html, '<p>Текст</p>')
+
+            post.save(update_fields=['content'])
+            self.assertEqual(sanitize.call_count, 1)
+        saved = Post.objects.get(pk=post.pk)
+        self.assertEqual((saved.content, saved.content_html, saved.excerpt), ('<p>Другой</p>', '<p>Другой</p>', 'Другой'))
+
+
+class SearchTests(TestCase):
+    """Полнотекстовый поиск (FTS5): обновление индекса, порядок bm25, сниппеты"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        self.category = Category.objects.create(name='tank')
+
+    def create(self, title, content):
+        return Post.objects.create(title=title, content=content, author=self.author, category=self.category)
+
+    def found(self, query):
+        return [result.post.pk for result in search_posts(query)[0]]
+
+    def test_index_follows_save_edit_delete(self):
+        post = self.create('Рейд в подземелье', '<p>Нужен танк</p>')
+        self.assertEqual(self.found('подземелье'), [post.pk])
+        post.title = 'Арена'
+        post.save()
+        self.assertEqual(self.found('подземелье'), [])
+        self.assertEqual(self.found('арена'), [post.pk])
+        post.delete()
+        self.assertEqual(self.found('арена'), [])
+
+    def test_ranked_by_bm25_with_title_first(self):
+        in_body = self.create('Ищу группу', '<p>Нужен хил на босса</p>')
+        in_title = self.create('Хил на вечер', '<p>Ищу группу</p>')
+        results = search_posts('хил')[0]
+        self.assertEqual([result.post.pk for result in results], [in_title.pk, in_body.pk])
+        self.assertLessEqual(results[0].rank, results[1].rank)
+
+    def test_snippet_is_escaped_and_highlighted(self):
+        self.create('Танк', '<p>Код &lt;b&gt; и танки</p>')
+        snippet = str(search_posts('танк')[0][0].snippet)
+        self.assertIn('<mark>танки</mark>', snippet)
+        self.assertIn('&lt;b&gt;', snippet)
+        self.assertNotIn('<b>', snippet)
+
+    def test_fts_syntax_in_query_is_harmless(self):
+        post = self.create('Рейд', '<p>Нужен танк</p>')
+        for query in ('"рейд', 'рейд AND (', 'NEAR(рейд', '***', 'title:рейд'):
+            response = self.client.get(reverse('mmo_board_chat:search'), {'q': query})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.client.get(reverse('mmo_board_chat:api_search'), {'q': query}).status_code, 200)
+        self.assertEqual(self.found('"рейд'), [post.pk])
+        self.assertEqual(self.found('***'), [])
+
+
+class FieldTrackerTests(TestCase):
+    """FieldTrackerMixin: изменения видны в pre_save/post_save, снимок обновляется после save()"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        self.category = Category.objects.create(name='tank')
+        self.seen = []
+        pre_save.connect(self.remember, sender=Post)
+        self.addCleanup(pre_save.disconnect, self.remember, sender=Post)
+
+    def remember(self, sender, instance, **kwargs):
+        self.seen.append((instance.has_changed('title'), instance.changed_fields()))
+
+    def new_post(self):
+        return Post(title='Объявление', content='<p>Текст</p>', author=self.author, category=self.category)
+
+    def test_new_object(self):
+        post = self.new_post()
+        post.save()
+        changed, fields = self.seen[-1]
+        self.assertTrue(changed)
+        self.assertEqual(fields, dict.fromkeys(Post.tracked_fields))
+        self.assertFalse(post.has_changed('title'))
+        self.assertEqual(post.changed_fields(), {})
+
+    def test_existing_object(self):
+        self.new_post().save()
+        post = Post.objects.get()
+        self.assertEqual(post.changed_fields(), {})
+        post.title = 'Новое'
+        self.assertEqual(post.changed_fields(), {'title': 'Объявление'})
+        post.save()
+        self.assertEqual(self.seen[-1], (True, {'title': 'Объявление'}))
+        self.assertFalse(post.has_changed('title'))
+        self.assertEqual(post.previous('title'), 'Новое')
+
+    def test_update_fields_keeps_other_changes(self):
+        self.new_post().save()
+        post = Post.objects.get()
+        post.title, post.content = 'Новое', '<p>Другой</p>'
+        post.save(update_fields=['title'])
+        self.assertEqual(post.changed_fields(), {'content': '<p>Текст</p>'})
+
+    def test_deferred_fields_are_not_changed(self):
+        self.new_post().save()
+        post = Post.objects.only('id', 'title').get()
+        self.assertFalse(post.has_changed('content'))
+        self.assertEqual(post.changed_fields(), {})
+        post.content  # Загрузка отложенного поля
+        self.assertEqual(post.changed_fields(), {})
+        post.title = 'Новое'
+        post.save()
+        self.assertEqual(self.seen[-1], (True, {'title': 'Объявление'}))
+
+
+class ReplyCounterTests(TestCase):
+    """Денормализованные счётчики откликов не расходятся с таблицей, в т.ч. при повторных действиях"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        self.reader = User.objects.create_user(email='reader@example.com', username='reader', password='pass')
+        self.post = Post.objects.create(title='Объявление', content='<p>Ищу группу</p>', author=self.author,
+                                        category=Category.objects.create(name='tank'))
+
+    def assertCounters(self, replies, accepted):
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.reply_count, self.post.accepted_reply_count), (replies, accepted))
+        self.assertEqual(Reply.objects.filter(post=self.post).count(), replies)
+        self.assertEqual(Reply.objects.filter(post=self.post, is_accepted=True).count(), accepted)
+
+    def test_create(self):
+        Reply.objects.create(post=self.post, author=self.reader, text='Я')
+        Reply.objects.create(post=self.post, author=self.reader, text='И я', is_accepted=True)
+        self.assertCounters(2, 1)
+
+    def test_double_accept(self):
+        reply = Reply.objects.create(post=self.post, author=self.reader, text='Я')
+        first, second = Reply.objects.get(pk=reply.pk), Reply.objects.get(pk=reply.pk)
+        self.assertTrue(first.accept())
+        self.assertFalse(second.accept())
+        self.assertCounters(1, 1)
+        self.assertEqual(OutgoingEmail.objects.filter(dedup_key=f'reply:{reply.pk}:accepted').count(), 1)
+
+    def test_double_delete(self):
+        Reply.objects.create(post=self.post, author=self.reader, text='Остаётся')
+        reply = Reply.objects.create(post=self.post, author=self.reader, text='Я', is_accepted=True)
+        first, second = Reply.objects.get(pk=reply.pk), Reply.objects.get(pk=reply.pk)
+        self.assertTrue(first.remove())
+        self.assertFalse(second.remove())
+        self.assertCounters(1, 0)
+
+    def test_views_repeat_safely(self):
+        reply = Reply.objects.create(post=self.post, author=self.reader, text='Я')
+        self.client.force_login(self.author)
+        for _ in range(2):
+            self.client.get(reverse('mmo_board_chat:reply_accept', args=[reply.pk]))
+        self.assertCounters(1, 1)
+        self.client.get(reverse('mmo_board_chat:reply_delete', args=[reply.pk]))
+        self.assertEqual(self.client.get(reverse('mmo_board_chat:reply_delete', args=[reply.pk])).status_code, 404)
+        self.assertCounters(0, 0)
+
+    def test_cascade_delete(self):
+        Reply.objects.create(post=self.post, author=self.author, text='Своё')
+        Reply.objects.create(post=self.post, author=self.reader, text='Я', is_accepted=True)
+        self.reader.delete()  # Отклики удаляются каскадом
+        self.assertCounters(1, 0)
+
+
+class ProfileInboxTests(TestCase):
+    """Отклики в профиле: переход по страницам курсором и счётчики фильтров"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        cls.reader = User.objects.create_user(email='reader@example.com', username='reader', password='pass')
+        category = Category.objects.create(name='tank')
+        cls.posts = [Post.objects.create(title=f'Объявление {number}', content='<p>Текст</p>', author=cls.author,
+                                         category=category) for number in range(2)]
+        for number in range(DEFAULT_PAGE_SIZE + 5):
+            Reply.objects.create(post=cls.posts[number % 2], author=cls.reader, text=f'Отклик {number}')
+        Reply.objects.update(created_at=timezone.now())  # Одинаковое время: порядок - по id
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def page(self, **params):
+        response = self.client.get(reverse('mmo_board_chat:profile'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['page'], response.context['facets']
+
+    def test_pages(self):
+        first, _ = self.page()
+        second, _ = self.page(before=first.older_cursor)
+        self.assertFalse(first.has_newer)
+        self.assertFalse(second.has_older)
+        ids = [reply.pk for reply in first] + [reply.pk for reply in second]
+        self.assertEqual(ids, list(Reply.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+        back, _ = self.page(after=second.newer_cursor)
+        self.assertEqual([reply.pk for reply in back], [reply.pk for reply in first])
+        self.assertFalse(back.has_newer)
+
+    def test_pages_keep_filters(self):
+        Reply.objects.filter(post=self.posts[1]).update(post=self.posts[0])
+        Reply.objects.create(post=self.posts[1], author=self.reader, text='Чужой отклик')
+        first, _ = self.page(post=self.posts[0].pk)
+        second, _ = self.page(post=self.posts[0].pk, before=first.older_cursor)
+        self.assertFalse(second.has_older)
+        replies = list(first) + list(second)
+        self.assertEqual({reply.post.pk for reply in replies}, {self.posts[0].pk})
+        self.assertEqual(len(replies), Reply.objects.filter(post=self.posts[0]).count())
+
+    def test_facets_follow_accept_and_delete(self):
+        total = DEFAULT_PAGE_SIZE + 5
+        self.assertEqual(self.page()[1], {'all': total, 'accepted': 0, 'pending': total})
+        replies = list(Reply.objects.filter(post=self.posts[0]).order_by('pk')[:2])
+        replies[0].accept()
+        self.assertEqual(self.page()[1], {'all': total, 'accepted': 1, 'pending': total - 1})
+        replies[0].remove()
+        replies[1].remove()
+        self.assertEqual(self.page()[1], {'all': total - 2, 'accepted': 0, 'pending': total - 2})
+        in_post = Reply.objects.filter(post=self.posts[0]).count()
+        self.assertEqual(self.page(post=self.posts[0].pk)[1], {'all': in_post, 'accepted': 0, 'pending': in_post})
+
+
+class ImportTests(TestCase):
+    """import_board: даты сохраняются, права персонала - только по флагу, ссылки на общие файлы пересчитываются"""
+    IMAGE = 'posts/ab/cd/' + 'a' * 64 + '.png'
+    THUMB = 'posts/ef/01/' + 'b' * 64 + '.webp'
+
+    def run_import(self, records, **options):
+        lines = [json.dumps(record) + '\n' for record in records]
+        Importer(ImportRun.objects.create(name=f'run{ImportRun.objects.count()}'), **options).run_lines(lines)
+
+    def user_record(self, email):
+        return {'model': 'user', 'id': 1, 'fields': {
+            'email': email, 'username': email.split('@')[0], 'password': 'pbkdf2_sha256$1$salt$hash',
+            'is_active': True, 'is_staff': True, 'is_superuser': True, 'date_joined': '2024-01-01T00:00:00Z',
+        }}
+
+    def test_round_trip_keeps_dates(self):
+        author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        post = Post.objects.create(title='Старое', content='<p>Текст</p>', author=author,
+                                   category=Category.objects.create(name='tank'))
+        reply = Reply.objects.create(post=post, author=author, text='Я')
+        created = timezone.now().replace(year=2020, microsecond=0)
+        Post.objects.filter(pk=post.pk).update(created_at=created, updated_at=created + timedelta(days=1))
+        Reply.objects.filter(pk=reply.pk).update(created_at=created + timedelta(hours=1))
+
+        lines = list(export_lines())
+        Importer(ImportRun.objects.create(name='round-trip')).run_lines(lines)
+        imported = Post.objects.exclude(pk=post.pk).get()
+        self.assertEqual((imported.created_at, imported.updated_at), (created, created + timedelta(days=1)))
+        self.assertEqual(Reply.objects.get(post=imported).created_at, created + timedelta(hours=1))
+
+    def test_privileges_require_trust(self):
+        self.run_import([self.user_record('admin@example.com')])
+        user = User.objects.get(email='admin@example.com')
+        self.assertFalse(user.is_staff or user.is_superuser or user.has_usable_password())
+
+        self.run_import([self.user_record('trusted@example.com')], trust_privileges=True)
+        user = User.objects.get(email='trusted@example.com')
+        self.assertTrue(user.is_superuser and user.password == 'pbkdf2_sha256$1$salt$hash')
+
+    def test_imported_images_are_referenced(self):
+        author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        category = Category.objects.create(name='tank')
+        Post.objects.create(title='Своё', content='<p>Текст</p>', author=author, category=category, image=self.IMAGE)
+        StoredBlob.objects.create(name=self.IMAGE, refcount=1)
+
+        self.run_import([
+            {'model': 'category', 'id': 7, 'fields': {'name': 'tank'}},
+            self.user_record('admin@example.com'),
+            {'model': 'post', 'id': 3, 'fields': {
+                'title': 'Чужое', 'content': '<p>Текст</p>', 'author': 1, 'category': 7, 'image': self.IMAGE,
+                'image_variants': {'thumb': {'webp': self.THUMB}},
+            }},
+        ])
+        self.assertEqual(dict(StoredBlob.objects.values_list('name', 'refcount')), {self.IMAGE: 2, self.THUMB: 1})
+
+
+class ImageVariantTests(TestCase):
+    """Уменьшенные копии изображения объявления"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentAddressedStorage(location=directory.name)
+
+    def upload(self, width, height):
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), 'red').save(buffer, 'PNG')
+        return self.storage.save('posts/original.png', ContentFile(buffer.getvalue()))
+
+    def test_variant_sizes(self):
+        variants = generate_variants(self.upload(2000, 1000), storage=self.storage)
+        sizes = {name: (entry['width'], entry['height']) for name, entry in variants.items()}
+        self.assertEqual(sizes, {'thumb': (480, 270), 'display_small': (640, 320), 'display': (1280, 640)})
+        for variant, entry in variants.items():
+            for name in variant_files({variant: entry}):
+                with self.storage.open(name) as file:
+                    self.assertEqual(Image.open(file).size, sizes[variant])
+                self.assertEqual(StoredBlob.objects.get(name=name).refcount, 1)
+
+    def test_small_image_is_not_enlarged(self):
+        variants = generate_variants(self.upload(300, 200), storage=self.storage)
+        self.assertEqual((variants['display']['width'], variants['display']['height']), (300, 200))
+
+    def test_variants_cleared_when_image_changes(self):
+        author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        post = Post.objects.create(title='Объявление', content='<p>Текст</p>', author=author,
+                                   category=Category.objects.create(name='tank'), image='posts/old.png')
+        Post.objects.filter(pk=post.pk).update(image_variants={'thumb': {'webp': 'posts/old__thumb.webp'}})
+        post = Post.objects.get(pk=post.pk)
+        post.title = 'Новое'
+        post.save()
+        self.assertNotEqual(Post.objects.get(pk=post.pk).image_variants, {})
+        post.image = 'posts/new.png'
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).image_variants, {})
+
+
+class FragmentCacheTests(TestCase):
+    """Кешированная карточка объявления обновляется при переименовании автора и категории"""
+
+    def setUp(self):
+        caches['fragments'].clear()
+        self.author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        self.category = Category.objects.create(name='tank')
+        Post.objects.create(title='Объявление', content='<p>Ищу группу</p>', author=self.author, category=self.category)
+
+    def test_card_shows_renamed_author_and_category(self):
+        self.assertContains(self.client.get(reverse('mmo_board_chat:home')), 'author')
+        self.author.username = 'renamed'
+        self.author.save()
+        self.category.name = 'healer'
+        self.category.save()
+        response = self.client.get(reverse('mmo_board_chat:home'))
+        self.assertContains(response, 'renamed')
+        self.assertContains(response, 'healer')
+
+
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    MIDDLEWARE=[
+        'mmo_board_chat.middleware.CachedAuthenticationMiddleware'
+        if name == 'django.contrib.auth.middleware.AuthenticationMiddleware' else name
+        for name in settings.MIDDLEWARE
+    ],
+)
+class CachedAuthenticationTests(TestCase):
+    """
+    Сессия и пользователь из кеша, сброс кеша при сохранении пользователя
+    (в работе включается с REDIS_URL; здесь - на кеше в памяти)
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='player@example.com', username='player', password='pass')
+        self.client.force_login(self.user)
+        self.client.get(reverse('mmo_board_chat:profile'))  # Пользователь попадает в кеш
+
+    def page_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('mmo_board_chat:profile'))
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries.captured_queries]
+
+    def test_no_session_or_user_queries(self):
+        self.assertFalse([sql for sql in self.page_queries()
+                          if 'django_session' in sql or 'FROM "mmo_board_chat_user"' in sql])
+
+    def test_saved_user_is_reloaded(self):
+        self.user.first_name = 'Новое'
+        self.user.save()
+        self.assertTrue([sql for sql in self.page_queries() if 'FROM "mmo_board_chat_user"' in sql])
+
+    def test_password_change_ends_session(self):
+        self.user.set_password('new')
+        self.user.save()
+        response = self.client.get(reverse('mmo_board_chat:profile'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_inactive_cached_user_is_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)  # Без сигнала - запись в кеше остаётся
+        self.user.is_active = False
+        caches['sessions'].set(user_cache_key(self.user.pk), (settings.AUTHENTICATION_BACKENDS[0], self.user))
+        response = self.client.get(reverse('mmo_board_chat:profile'))
+        self.assertEqual(response.status_code, 302)
+
+
+class ReplyEventsTests(TestCase):
+    """Поток SSE: только под ASGI, повтор пропущенного по Last-Event-ID, ограниченные буферы"""
+    user_id = 10 ** 6  # Буферы хаба общие для процесса - пользователь, которого нет в других тестах
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='player@example.com', username='player', password='pass')
+
+    def test_no_stream_under_wsgi(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('mmo_board_chat:reply_events')).status_code, 204)
+        self.assertNotContains(self.client.get(reverse('mmo_board_chat:profile')), 'EventSource')
+
+    async def test_stream_under_asgi(self):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.user)
+        response = await client.get(reverse('mmo_board_chat:reply_events'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(await anext(response.streaming_content), b'retry: 5000\n\n')
+        await response.streaming_content.aclose()
+
+    async def test_replay_after_last_event_id(self):
+        seen = hub.publish(self.user_id, 'reply', {'text': 'прочитано'})
+        missed = hub.publish(self.user_id, 'reply', {'text': 'пропущено'})
+        stream = event_stream(self.user_id, last_event_id=seen.id, heartbeat=1, max_seconds=5)
+        try:
+            self.assertTrue((await anext(stream)).startswith('retry:'))
+            self.assertEqual(await anext(stream), missed.encode())
+            live = hub.publish(self.user_id, 'accepted', {'text': 'принят'})
+            self.assertEqual(await anext(stream), live.encode())
+        finally:
+            await stream.aclose()
+
+    def test_buffers_are_bounded(self):
+        events = EventHub(buffer_size=5, buffer_ttl=60, max_users=2)
+        with mock.patch('mmo_board_chat.events.time.monotonic', return_value=1000):
+            for user_id in (1, 2, 3):
+                events.publish(user_id, 'reply', {})
+        self.assertEqual(list(events._buffers), [2, 3])
+        with mock.patch('mmo_board_chat.events.time.monotonic', return_value=1100):
+            events.publish(3, 'reply', {})
+            self.assertEqual(list(events._buffers), [3])
+            self.assertEqual(len(events._buffers[3]), 2)
+
+
+class SQLiteTransactionTests(TransactionTestCase):
+    """BEGIN IMMEDIATE - только для транзакций, открытых через write_transaction()"""
+
+    def test_only_write_transactions_take_write_lock(self):
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                Category.objects.count()
+            with write_transaction():
+                Category.objects.create(name='tank')
+        begins = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('BEGIN')]
+        self.assertEqual(begins, ['BEGIN', 'BEGIN IMMEDIATE'])
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+    """Выбор базы роутером и закрепление за основной базой после записи"""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_outside_request_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_write_pins_rest_of_request(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+            self.assertEqual(self.router.db_for_write(Reply), 'default')
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_middleware_sets_pin_cookie_after_write(self):
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Post))
+            if request.GET.get('write'):
+                self.router.db_for_write(Post)
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(view)
+        factory = RequestFactory()
+
+        response = middleware(factory.get('/'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        response = middleware(factory.get('/', {'write': 1}))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        pinned = factory.get('/')
+        pinned.COOKIES[PIN_COOKIE] = '1'
+        middleware(pinned)
+        middleware(factory.post('/'))
+        self.assertEqual(seen, ['replica', 'replica', 'default', 'default'])
+
+        # Копия синхронизирована после записи - закрепление снимается
+        with mock.patch('mmo_board_chat.routers.replica_synced_at', return_value=2.0):
+            response = middleware(pinned)
+        self.assertEqual(seen[-1], 'replica')
+        self.assertEqual(response.cookies[PIN_COOKIE].value, '')
+
+    def test_sessions_and_users_read_from_primary(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Session), 'default')
+            self.assertEqual(self.router.db_for_read(User), 'default')
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaWriteDetectionTests(TestCase):
+    """Запись через cursor() мимо роутера тоже закрепляет запрос за основной базой"""
+
+    def test_raw_write_pins_request(self):
+        with replica_reads():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            self.assertFalse(wrote_to_primary())
+            post = Post(pk=1, title='Объявление', content='<p>Текст</p>')
+            search_index_post(post)
+            self.assertTrue(wrote_to_primary())
+            self.assertEqual(PrimaryReplicaRouter().db_for_read(Post), 'default')
+
+
+@override_settings(RATELIMIT_ENABLED=True, RATE_LIMITS={'login:ip': '3/m', 'login:account': '2/m', 'test': '10/m'})
+class RateLimitTests(TestCase):
+    """Скользящее окно и ответы 429 на входе"""
+
+    def setUp(self):
+        get_backend().clear()
+
+    def test_sliding_window_weights_previous_window(self):
+        for _ in range(10):
+            self.assertEqual(hit('test', 'key', '10/m', now=570), 0)  # Окно 540-600 заполнено
+        # 630 - середина следующего окна: прошлое весит 10 * 0.5 = 5, места ещё на 5 запросов
+        for _ in range(5):
+            self.assertEqual(hit('test', 'key', '10/m', now=630), 0)
+        # 5 + 6 > 10; следующему (седьмому) запросу хватит места, когда вес прошлого окна
+        # упадёт до 3, т.е. через 0.2 окна - 12 секунд
+        self.assertEqual(hit('test', 'key', '10/m', now=630), 12)
+        # 675: прошлое весит 10 * 0.25 = 2.5, в текущем 6 (отказ тоже учтён) + этот = 9.5
+        self.assertEqual(hit('test', 'key', '10/m', now=675), 0)
+
+    def test_retry_after_when_current_window_is_full(self):
+        for _ in range(10):
+            hit('test', 'other', '10/m', now=605)
+        self.assertEqual(hit('test', 'other', '10/m', now=610), 50)
+
+    def login(self, username, ip='10.0.0.1'):
+        return self.client.post(reverse('mmo_board_chat:login'), {'username': username, 'password': 'wrong'},
+                                REMOTE_ADDR=ip)
+
+    def test_login_limited_by_account_and_ip(self):
+        self.assertEqual(self.login('player').status_code, 200)
+        self.assertEqual(self.login('player').status_code, 200)
+        response = self.login('player')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(int(response['Retry-After']) > 0)
+
+        # Другой аккаунт с того же IP - уже лимит по IP
+        self.assertEqual(self.login('someone').status_code, 429)
+        self.assertEqual(self.login('someone', ip='10.0.0.2').status_code, 200)
+
+    def test_client_ip(self):
+        factory = RequestFactory()
+        request = factory.get('/', REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR='1.1.1.1, 2.2.2.2, 3.3.3.3')
+        self.assertEqual(client_ip(request), '10.0.0.9')
+        with self.settings(RATELIMIT_IP_HEADER='HTTP_X_FORWARDED_FOR'):
+            self.assertEqual(client_ip(request), '3.3.3.3')
+            with self.settings(RATELIMIT_TRUSTED_PROXIES=2):
+                self.assertEqual(client_ip(request), '2.2.2.2')
+            with self.settings(RATELIMIT_TRUSTED_PROXIES=5):
+                self.assertEqual(client_ip(request), '1.1.1.1')
+            self.assertEqual(client_ip(factory.get('/', REMOTE_ADDR='10.0.0.9')), '10.0.0.9')
+
+    @override_settings(RATELIMIT_IP_HEADER='HTTP_X_FORWARDED_FOR')
+    def test_login_limited_by_forwarded_ip(self):
+        # Все запросы приходят с адреса прокси; лимит по IP - по адресу из заголовка
+        def login(username, ip):
+            return self.client.post(reverse('mmo_board_chat:login'), {'username': username, 'password': 'wrong'},
+                                    HTTP_X_FORWARDED_FOR=ip).status_code
+
+        self.assertEqual([login(name, '1.1.1.1') for name in ('a', 'b', 'c')], [200, 200, 200])
+        self.assertEqual(login('d', '1.1.1.1'), 429)
+        self.assertEqual(login('d', '1.1.1.2'), 200)
+
+
+class ConditionalGetTests(TestCase):
+    """304 по ETag/Last-Modified для страниц объявления, ленты и API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        cls.reader = User.objects.create_user(email='reader@example.com', username='reader', password='pass')
+        cls.post = Post.objects.create(title='Объявление', content='<p>Ищу группу</p>', author=cls.author,
+                                       category=Category.objects.create(name='tank'))
+
+    def revalidate(self, url, response):
+        with CaptureQueriesContext(connection) as queries:
+            repeated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        return repeated, len(queries)
+
+    def test_post_detail_not_modified_until_new_reply(self):
+        url = reverse('mmo_board_chat:post_detail', args=[self.post.pk])
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('Cookie', response['Vary'])
+
+        repeated, queries = self.revalidate(url, response)
+        self.assertEqual(repeated.status_code, 304)
+        self.assertEqual(queries, 1)
+
+        Reply.objects.create(post=self.post, author=self.reader, text='Я')
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+    def test_personal_pages_differ_per_user(self):
+        url = reverse('mmo_board_chat:home')
+        extra = Post.objects.create(title='Лишнее', content='<p>x</p>', author=self.author, category=self.post.category)
+        self.post.save()  # Последним изменено не удаляемое объявление
+        anonymous = self.client.get(url)
+        self.client.force_login(self.reader)
+        self.client.get(url)  # Первый ответ ставит cookie CSRF, она входит в ETag
+        response = self.client.get(url)
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 304)
+
+        # Удалённое объявление меняет ленту, хотя MAX(updated_at) тот же
+        extra.delete()
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+    def test_feed_changes_on_author_and_category_rename(self):
+        url = reverse('mmo_board_chat:home')
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 304)
+        self.author.username = 'renamed'
+        self.author.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'renamed')
+        self.post.category.name = 'healer'
+        self.post.category.save()
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+    def test_feed_changes_on_author_and_category_rename(self):
+        url = reverse('mmo_board_chat:home')
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 304)
+        self.author.username = 'renamed'
+        self.author.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'renamed')
+        self.post.category.name = 'healer'
+        self.post.category.save()
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+    def test_api_posts(self):
+        url = reverse('mmo_board_chat:api_posts')
+        response = self.client.get(url)
+        b''.join(response.streaming_content)
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 304)
+        self.assertEqual(self.client.get(url, {'author': 'x'}).status_code, 400)
+
+
+class PostsApiTests(TestCase):
+    """/api/posts/: курсор, выбор полей и фильтры"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        cls.other = User.objects.create_user(email='other@example.com', username='other', password='pass')
+        tank, healer = Category.objects.create(name='tank'), Category.objects.create(name='healer')
+        for number in range(7):
+            Post.objects.create(title=f'Объявление {number}', content='<p>Ищу группу</p>',
+                                author=cls.author if number % 2 else cls.other,
+                                category=tank if number < 4 else healer)
+        # Одинаковое время создания: порядок и курсор различают объявления по id
+        Post.objects.update(created_at=timezone.now())
+
+    def fetch(self, **params):
+        response = self.client.get(reverse('mmo_board_chat:api_posts'), params)
+        if response.streaming:
+            return response.status_code, json.loads(b''.join(response.streaming_content))
+        return response.status_code, json.loads(response.content)
+
+    def test_cursor_walks_ties_without_gaps(self):
+        ids, cursor = [], None
+        while True:
+            status, page = self.fetch(limit=3, fields='id', **({'cursor': cursor} if cursor else {}))
+            self.assertEqual(status, 200)
+            ids += [row['id'] for row in page['results']]
+            cursor = page['next']
+            if not cursor:
+                break
+        self.assertEqual(ids, list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_invalid_cursor(self):
+        status, body = self.fetch(cursor='не курсор')
+        self.assertEqual(status, 400)
+        self.assertIn('error', body)
+
+    def test_fields_projection(self):
+        status, page = self.fetch(fields='id,title', limit=2)
+        self.assertEqual(status, 200)
+        self.assertEqual([set(row) for row in page['results']], [{'id', 'title'}] * 2)
+        self.assertEqual(self.fetch(fields='id,password')[0], 400)
+
+    def test_filters(self):
+        _, page = self.fetch(category='tank', fields='category')
+        self.assertEqual([row['category'] for row in page['results']], ['tank'] * 4)
+        _, page = self.fetch(author=self.author.pk, fields='author_id')
+        self.assertEqual([row['author_id'] for row in page['results']], [self.author.pk] * 3)
+        self.assertEqual(self.fetch(author='x')[0], 400)
+
+
+class AsyncViewParityTests(TestCase):
+    """Асинхронные версии страниц (ASGI) отдают то же, что синхронные"""
+    # Значение CSRF-токена маскируется заново при каждом рендеринге
+    CSRF_RE = re.compile(rb'name="csrfmiddlewaretoken" value="[^"]+"')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        cls.reader = User.objects.create_user(email='reader@example.com', username='reader', password='pass')
+        category = Category.objects.create(name='tank')
+        for number in range(3):
+            post = Post.objects.create(title=f'Объявление {number}', content='<p>Ищу группу</p>',
+                                       author=cls.author, category=category)
+            Reply.objects.create(post=post, author=cls.reader, text='Я', is_accepted=bool(number))
+        cls.post = post
+
+    def sync_response(self, view, path, *args):
+        request = RequestFactory().get(path)
+        request.user = self.author
+        return view(request, *args)
+
+    async def async_response(self, view, path, *args):
+        request = AsyncRequestFactory().get(path)
+        request.user = self.author
+        return await view(request, *args)
+
+    async def body(self, response):
+        if response.streaming:
+            if response.is_async:
+                return b''.join([chunk async for chunk in response.streaming_content])
+            return await sync_to_async(b''.join)(response.streaming_content)
+        return self.CSRF_RE.sub(b'', response.content)
+
+    async def assertSameResponse(self, name, path, *args):
+        caches['fragments'].clear()
+        expected = await sync_to_async(self.sync_response)(getattr(views, name), path, *args)
+        caches['fragments'].clear()
+        actual = await self.async_response(getattr(async_views, name), path, *args)
+        self.assertEqual((actual.status_code, expected.status_code), (200, 200))
+        body = await self.body(expected)
+        self.assertIn('Объявление 2'.encode() if name != 'api_posts' else b'"title"', body)
+        self.assertEqual(await self.body(actual), body)
+        self.assertEqual(actual.get('ETag'), expected.get('ETag'))
+
+    async def test_home(self):
+        await self.assertSameResponse('home', '/')
+
+    async def test_post_detail(self):
+        await self.assertSameResponse('post_detail', '/posts/', self.post.pk)
+
+    async def test_profile(self):
+        # Поток SSE подключается только под ASGI - для сравнения страниц одинаково в обоих вариантах
+        with mock.patch('mmo_board_chat.views.streaming_supported', return_value=False):
+            await self.assertSameResponse('profile', '/profile/?status=accepted')
+
+    async def test_api_posts(self):
+        await self.assertSameResponse('api_posts', '/api/posts/?limit=2&fields=id,title')
+
+
+class AssetBuildTests(SimpleTestCase):
+    """Минификация и пересчёт url() при склейке CSS"""
+
+    def test_minify_keeps_strings_licenses_and_descendant_colons(self):
+        css = '/*! License */\n/* note: "x" */\n.a :hover ,\n .b { content: "a ,  b ; c" ;  color : red ; }\n'
+        self.assertEqual(minify_css(css), '/*! License */ .a :hover,.b{content:"a ,  b ; c";color :red}')
+
+    def test_rebase_relative_urls_to_dist(self):
+        css = 'src: url("./fonts/icons.woff2?abc") format("woff2"), url(data:image/png;base64,AA), url(/x.png)'
+        self.assertEqual(
+            rebase_css_urls(css, 'vendor/icons/icons.css', 'dist'),
+            'src: url("../vendor/icons/fonts/icons.woff2?abc") format("woff2"), url(data:image/png;base64,AA), url(/x.png)',
+        )
+
+
+class PrecompressedStaticTests(SimpleTestCase):
+    """Раздача собранной статики: сжатая копия по Accept-Encoding, файл - потоком"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name, data in (('app.abc.css', b'body{color:red}'), ('app.abc.css.gz', b'gz'), ('plain.css', b'p{}')):
+            with open(os.path.join(directory.name, name), 'wb') as file:
+                file.write(data)
+        with self.settings(STATIC_ROOT=directory.name, STATIC_URL='/static/'):
+            self.middleware = PrecompressedStaticMiddleware(lambda request: HttpResponse('next'))
+        self.middleware.hashed_names = {'app.abc.css'}
+
+    def get(self, path, **headers):
+        response = self.middleware(RequestFactory().get(path, **headers))
+        self.addCleanup(response.close)
+        return response
+
+    def test_compressed_copy_streamed(self):
+        response = self.get('/static/app.abc.css', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(b''.join(response.streaming_content), b'gz')
+        self.assertEqual((response['Content-Encoding'], response['Content-Length']), ('gzip', '2'))
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertNotIn('Content-Disposition', response)
+
+    def test_plain_file(self):
+        response = self.get('/static/app.abc.css', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertEqual(b''.join(response.streaming_content), b'body{color:red}')
+        self.assertNotIn('Content-Encoding', response)
+        response = self.get('/static/plain.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+
+    def test_missing_file_passed_on(self):
+        self.assertEqual(self.get('/static/missing.css').content, b'next')
+        self.assertEqual(self.get('/static/../settings.py').content, b'next')
+
+
+class RequestMetricsTests(TestCase):
+    """RequestMetricsMiddleware: заголовок Server-Timing, журнал медленных запросов, счётчики по view"""
+    TIMING = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries, (\d+) duplicates", tpl;dur=([\d.]+), '
+                        r'view;dur=([\d.]+), total;dur=([\d.]+)$')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        category = Category.objects.create(name='tank')
+        Post.objects.create(title='Объявление', content='<p>Текст</p>', author=cls.author, category=category)
+
+    def setUp(self):
+        view_counters.reset()
+        self.addCleanup(view_counters.reset)
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('mmo_board_chat:home'))
+        match = self.TIMING.match(response['Server-Timing'])
+        self.assertIsNotNone(match, response['Server-Timing'])
+        self.assertEqual(int(match[1]), len(queries))
+        self.assertGreater(float(match[3]), 0)  # Шаблон рендерился
+        self.assertLessEqual(float(match[4]), float(match[5]))
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_disabled(self):
+        response = self.client.get(reverse('mmo_board_chat:home'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(view_counters.snapshot()['mmo_board_chat:home']['requests'], 1)
+
+    def test_view_counters(self):
+        self.client.get(reverse('mmo_board_chat:home'))
+        self.client.get(reverse('mmo_board_chat:home'))
+        stats = view_counters.snapshot()['mmo_board_chat:home']
+        self.assertEqual((stats['requests'], stats['slow']), (2, 0))
+        self.assertGreater(stats['avg_sql_count'], 0)
+
+    @override_settings(REQUEST_SLOW_MS=0)
+    def test_slow_request_logged(self):
+        with self.assertLogs('mmo_board_chat.requests', 'WARNING') as logs:
+            self.client.get(reverse('mmo_board_chat:home'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['view'], record['status'], record['path']), ('mmo_board_chat:home', 200, '/'))
+        self.assertEqual(view_counters.snapshot()['mmo_board_chat:home']['slow'], 1)
+
+    def test_duplicates(self):
+        metrics = RequestMetrics()
+        metrics.statements.update(['SELECT 1'] * 3 + ['SELECT 2'])
+        self.assertEqual(metrics.duplicate_count, 2)
+        self.assertEqual(metrics.duplicates(), [('SELECT 1', 3)])
+
+    def test_base_middleware_is_abstract(self):
+        with self.assertRaises(TypeError):
+            BaseMiddleware(lambda request: HttpResponse())
+
+
+class PerformanceBudgetTests(TestCase):
+    """
+    Регрессии производительности: число SQL-запросов основных страниц
+    на данных из seed_board; пороги - perf.VIEW_BUDGETS. Время ответа
+    здесь не проверяется (нестабильно), его бюджет - manage.py benchmark_views
+    PERF_REPORT=<файл> сохраняет замеры (и p50/p95) в JSON
+    """
+    results = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_board', users=30, posts=500, replies=3000, batch_size=1000, verbosity=0)
+        cls.user, cls.urls = benchmark_targets()
+
+    @classmethod
+    def tearDownClass(cls):
+        report = os.getenv('PERF_REPORT')
+        if report and cls.results:
+            with open(report, 'w') as file:
+                json.dump(cls.results, file, ensure_ascii=False, indent=2)
+        super().tearDownClass()
+
+    def assertWithinBudget(self, name):
+        self.client.force_login(self.user)
+        stats = measure_view(self.client, name, self.urls[name])
+        self.results[name] = stats.as_dict()
+        errors = stats.budget_errors(check_latency=False)
+        if errors:
+            self.fail('\n'.join(errors))
+
+    def test_home(self):
+        self.assertWithinBudget('home')
+
+    def test_post_detail(self):
+        self.assertWithinBudget('post_detail')
+
+    def test_profile(self):
+        self.assertWithinBudget('profile')
+
+    def test_api_posts(self):
+        self.assertWithinBudget('api_posts')
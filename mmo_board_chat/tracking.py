@@ -0,0 +1,73 @@
+"""
+ОТСЛЕЖИВАНИЕ ИЗМЕНЕНИЙ ПОЛЕЙ МОДЕЛИ
+
+Миксин запоминает значения выбранных полей в момент загрузки объекта из БД,
+поэтому обработчики pre_save/post_save узнают о реальных изменениях
+без повторного запроса к базе.
+"""
+from django.db.models.fields.files import FieldFile
+
+
+class FieldTrackerMixin:
+    """
+    Миксин для моделей
+    tracked_fields - имена полей, за которыми нужно следить (для ForeignKey - имя поля, не *_id)
+
+    has_changed(name) - поле изменено с момента загрузки/последнего сохранения
+    previous(name) - значение поля на тот момент (None для новых объектов)
+    changed_fields() - словарь {имя: прежнее значение} изменённых полей
+
+    Снимок обновляется после save(), поэтому внутри post_save
+    изменения текущего сохранения ещё видны.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _tracked_value(self, name):
+        """Текущее "сырое" значение поля; для файлов - имя файла"""
+        value = self.__dict__.get(self._meta.get_field(name).attname)
+        if isinstance(value, FieldFile):
+            return value.name or None
+        return None if value == '' else value
+
+    def _snapshot_tracked_fields(self, names=None):
+        """Запоминаем текущие значения; отложенные (deferred) поля пропускаются"""
+        snapshot = getattr(self, '_tracked_initial', {})
+        for name in self.tracked_fields if names is None else names:
+            if self._meta.get_field(name).attname in self.__dict__:
+                snapshot[name] = self._tracked_value(name)
+        self._tracked_initial = snapshot
+
+    def is_tracking(self):
+        """Объект загружен из БД (для новых объектов прежних значений нет)"""
+        return hasattr(self, '_tracked_initial')
+
+    def has_changed(self, name):
+        if not self.is_tracking():
+            return True
+        if name not in self._tracked_initial:
+            return False
+        return self._tracked_initial[name] != self._tracked_value(name)
+
+    def previous(self, name):
+        if not self.is_tracking():
+            return None
+        return self._tracked_initial.get(name)
+
+    def changed_fields(self):
+        return {name: self.previous(name) for name in self.tracked_fields if self.has_changed(name)}
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        names = [name for name in self.tracked_fields if name in update_fields] if update_fields else None
+        self._snapshot_tracked_fields(names)
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._snapshot_tracked_fields([name for name in self.tracked_fields if not fields or name in fields])
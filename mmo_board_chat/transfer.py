@@ -0,0 +1,263 @@
+"""
+ПЕРЕНОС ДАННЫХ МЕЖДУ БАЗАМИ В ФОРМАТЕ JSONL
+
+Одна строка - одна запись: {"model": "post", "id": 17, "fields": {...}}.
+Порядок строк: категории, пользователи, объявления, отклики - ссылки
+всегда указывают на уже прочитанные записи. Внешние ключи в файле -
+id исходной базы; при загрузке они заменяются на новые id через
+таблицу ImportMapping.
+
+Выгрузка читает базу через .values().iterator(), загрузка обрабатывает
+файл пачками (bulk_create в отдельной транзакции на пачку) - память
+не растёт с объёмом данных. После каждой пачки в ImportRun
+записывается число обработанных строк, поэтому прерванную загрузку
+можно продолжить с того же места.
+
+Хеши паролей и права персонала (is_staff, is_superuser) переносятся
+только при trust_privileges=True (import_board --trust-privileges):
+иначе файл из чужих рук мог бы создать администратора. Без этого флага
+пользователи получают непригодный пароль (вход - через сброс пароля).
+
+Файлы изображений не копируются, переносятся только пути. Если файлы
+уже лежат в хранилище с адресацией по содержимому, в конце загрузки
+пересчитываются их ссылки в StoredBlob (см. storage.py).
+"""
+import json
+from collections import Counter
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .counters import rebuild_reply_counters
+from .images import image_storage, variant_files
+from .models import Category, ImportMapping, ImportRun, Post, Reply, StoredBlob, User
+from .search import index_new_posts
+from .sqlite_backend.base import write_transaction
+from .storage import ContentAddressedStorage
+
+USER_FIELDS = (
+    'email', 'username', 'password', 'first_name', 'last_name', 'is_active', 'is_staff',
+    'is_superuser', 'date_joined', 'last_login', 'email_confirmed', 'notification_frequency',
+)
+POST_FIELDS = (
+    'title', 'content', 'content_html', 'excerpt', 'author', 'category', 'image', 'image_variants',
+    'created_at', 'updated_at',
+)
+REPLY_FIELDS = ('post', 'author', 'text', 'is_accepted', 'created_at')
+# Загружаются только с trust_privileges=True
+PRIVILEGED_USER_FIELDS = ('password', 'is_staff', 'is_superuser')
+
+DATETIME_FIELDS = {'date_joined', 'last_login', 'created_at', 'updated_at'}
+
+# Модель в файле -> (модель, поля); порядок - порядок выгрузки и загрузки
+EXPORT_MODELS = {
+    'category': (Category, ('name',)),
+    'user': (User, USER_FIELDS),
+    'post': (Post, POST_FIELDS),
+    'reply': (Reply, REPLY_FIELDS),
+}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def export_lines(chunk_size=2000):
+    """Генератор строк JSONL со всеми записями"""
+    for name, (model, fields) in EXPORT_MODELS.items():
+        rows = model.objects.order_by('pk').values('pk', *fields).iterator(chunk_size=chunk_size)
+        for row in rows:
+            pk = row.pop('pk')
+            yield json.dumps({'model': name, 'id': pk, 'fields': row}, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def _parse_fields(fields):
+    for name in DATETIME_FIELDS & fields.keys():
+        if fields[name]:
+            fields[name] = parse_datetime(fields[name])
+    return fields
+
+
+def _bulk_create_with_dates(model, objects, dates):
+    """
+    bulk_create с датами из файла: auto_now/auto_now_add при вставке ставят
+    текущее время, поэтому даты записываются следом через bulk_update (он их не трогает)
+    dates - {поле: значение} для каждого объекта; пустые значения не переносятся
+    """
+    created = model.objects.bulk_create(objects)
+    fields = sorted({name for row in dates for name, value in row.items() if value})
+    if fields:
+        for obj, row in zip(created, dates):
+            for name in fields:
+                setattr(obj, name, row.get(name) or getattr(obj, name))
+        model.objects.bulk_update(created, fields)
+    return created
+
+
+class Importer:
+    """Загрузка одного файла в рамках ImportRun"""
+
+    def __init__(self, run, batch_size=1000, trust_privileges=False):
+        self.run = run
+        self.batch_size = batch_size
+        self.trust_privileges = trust_privileges
+
+    def mapping(self, model, old_ids):
+        """id из файла -> id в базе для набора записей одной пачки"""
+        rows = ImportMapping.objects.filter(run=self.run, model=model, old_id__in=set(old_ids))
+        return dict(rows.values_list('old_id', 'new_id'))
+
+    def remember(self, model, pairs):
+        ImportMapping.objects.bulk_create([
+            ImportMapping(run=self.run, model=model, old_id=old_id, new_id=new_id) for old_id, new_id in pairs
+        ])
+
+    def resolve(self, model, records, field):
+        """Замена ссылки field в записях на новые id; ссылка на незагруженную запись - ошибка"""
+        mapped = self.mapping(model, [record['fields'][field] for record in records])
+        for record in records:
+            old_id = record['fields'][field]
+            if old_id not in mapped:
+                raise ImportFormatError(f'{record["model"]} {record["id"]}: нет {model} с id {old_id}')
+            record['fields'][field] = mapped[old_id]
+
+    def load_categories(self, records):
+        names = {record['fields']['name'] for record in records}
+        Category.objects.bulk_create([Category(name=name) for name in names], ignore_conflicts=True)
+        existing = dict(Category.objects.filter(name__in=names).values_list('name', 'pk'))
+        self.remember('category', [(record['id'], existing[record['fields']['name']]) for record in records])
+
+    def load_users(self, records):
+        # Пользователь с тем же email уже есть - используется он
+        existing = dict(
+            User.objects.filter(email__in=[record['fields']['email'] for record in records]).values_list('email', 'pk')
+        )
+        pairs = [(record['id'], existing[record['fields']['email']])
+                 for record in records if record['fields']['email'] in existing]
+        new = [record for record in records if record['fields']['email'] not in existing]
+        users = []
+        for record in new:
+            fields = _parse_fields(record['fields'])
+            if not self.trust_privileges:
+                for name in PRIVILEGED_USER_FIELDS:
+                    fields.pop(name, None)
+            user = User(**fields)
+            if not self.trust_privileges:
+                user.set_unusable_password()
+            users.append(user)
+        created = User.objects.bulk_create(users)
+        pairs += [(record['id'], user.pk) for record, user in zip(new, created)]
+        self.remember('user', pairs)
+
+    def load_posts(self, records):
+        self.resolve('user', records, 'author')
+        self.resolve('category', records, 'category')
+        posts, dates = [], []
+        for record in records:
+            fields = _parse_fields(record['fields'])
+            fields['author_id'] = fields.pop('author')
+            fields['category_id'] = fields.pop('category')
+            dates.append({'created_at': fields.get('created_at'), 'updated_at': fields.get('updated_at')})
+            posts.append(Post(**fields))
+        created = _bulk_create_with_dates(Post, posts, dates)
+        self.remember('post', [(record['id'], post.pk) for record, post in zip(records, created)])
+        index_new_posts((post.pk, post.title, post.content) for post in created)
+
+    def load_replies(self, records):
+        self.resolve('post', records, 'post')
+        self.resolve('user', records, 'author')
+        replies, dates = [], []
+        for record in records:
+            fields = _parse_fields(record['fields'])
+            fields['post_id'] = fields.pop('post')
+            fields['author_id'] = fields.pop('author')
+            dates.append({'created_at': fields.get('created_at')})
+            replies.append(Reply(**fields))
+        _bulk_create_with_dates(Reply, replies, dates)
+
+    LOADERS = {
+        'category': 'load_categories',
+        'user': 'load_users',
+        'post': 'load_posts',
+        'reply': 'load_replies',
+    }
+
+    def load_batch(self, records, lines_done):
+        """Пачка записей и отметка о прогрессе - в одной транзакции (сначала чтение соответствий, затем запись)"""
+        with write_transaction():
+            for model in EXPORT_MODELS:
+                group = [record for record in records if record['model'] == model]
+                if group:
+                    getattr(self, self.LOADERS[model])(group)
+            ImportRun.objects.filter(pk=self.run.pk).update(lines_done=lines_done)
+        self.run.lines_done = lines_done
+
+    def run_lines(self, lines, progress=None):
+        """
+        Загрузка строк файла; уже обработанные в прошлый раз строки пропускаются
+        progress(lines_done) вызывается после каждой пачки
+        """
+        records = []
+        number = 0
+        for number, line in enumerate(lines, start=1):
+            if number <= self.run.lines_done or not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                raise ImportFormatError(f'Строка {number}: {exc}')
+            if record.get('model') not in EXPORT_MODELS:
+                raise ImportFormatError(f'Строка {number}: неизвестная модель {record.get("model")!r}')
+            records.append(record)
+            if len(records) >= self.batch_size:
+                self.load_batch(records, number)
+                records = []
+                if progress:
+                    progress(number)
+        if records or number > self.run.lines_done:
+            self.load_batch(records, number)
+            if progress:
+                progress(number)
+        self.finish()
+
+    def rebuild_blob_refcounts(self, posts, chunk_size=500):
+        """
+        Ссылки StoredBlob на изображения и варианты загруженных объявлений
+        Считаются по всем объявлениям с теми же исходными изображениями -
+        так учитываются и ссылки, которые были в базе до загрузки
+        """
+        storage = image_storage()
+        if not isinstance(storage, ContentAddressedStorage):
+            return
+        images, names = set(), set()
+        rows = posts.exclude(image='').exclude(image__isnull=True).values_list('image', 'image_variants')
+        for image, variants in rows.iterator(chunk_size=chunk_size):
+            images.add(image)
+            names.update(name for name in [image] + variant_files(variants) if storage.is_content_addressed(name))
+
+        images = sorted(images)
+        counts = Counter()
+        for start in range(0, len(images), chunk_size):
+            sharing = Post.objects.filter(image__in=images[start:start + chunk_size])
+            sharing = sharing.values_list('image', 'image_variants')
+            for image, variants in sharing.iterator(chunk_size=chunk_size):
+                counts.update(name for name in [image] + variant_files(variants) if name in names)
+
+        names = sorted(names)
+        for start in range(0, len(names), chunk_size):
+            chunk = names[start:start + chunk_size]
+            StoredBlob.objects.bulk_create([StoredBlob(name=name, refcount=0) for name in chunk], ignore_conflicts=True)
+            blobs = list(StoredBlob.objects.filter(name__in=chunk))
+            for blob in blobs:
+                blob.refcount = counts[blob.name]
+            StoredBlob.objects.bulk_update(blobs, ['refcount'])
+
+    def finish(self):
+        """Счётчики откликов и ссылки на файлы загруженных объявлений, отметка о завершении"""
+        with write_transaction():
+            imported_ids = ImportMapping.objects.filter(run=self.run, model='post').values('new_id')
+            imported = Post.objects.filter(pk__in=imported_ids)
+            rebuild_reply_counters(Post, Reply, posts=imported)
+            self.rebuild_blob_refcounts(imported)
+            ImportRun.objects.filter(pk=self.run.pk).update(finished_at=timezone.now())
@@ -1,14 +1,18 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 from django.conf import settings
 from ckeditor_uploader import views as ckeditor_views
 from django.views.decorators.csrf import csrf_exempt
 
 app_name = 'mmo_board_chat'  # Пространство имен приложения
 
+# Под ASGI страницы для чтения обслуживаются асинхронными версиями (см. async_views.py)
+read_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     # Главная страница
-    path('', views.home, name='home'),
+    path('', read_views.home, name='home'),
+    path('search/', views.search, name='search'),
 
     # Авторизация
     path('register/', views.register_view, name='register'), # Регистрация
@@ -23,15 +27,23 @@ urlpatterns = [
     path('replies/<int:reply_id>/delete/', views.reply_delete, name='reply_delete'),
 
     # Личный кабинет
-    path('profile/', views.profile, name='profile'),
+    path('profile/', read_views.profile, name='profile'),
+    path('profile/notifications/', views.notification_settings, name='notification_settings'),
+    path('profile/events/', views.reply_events, name='reply_events'), # Живые уведомления (SSE)
 
     # Работа с объявлениями
     path('posts/create/', views.create_post, name='post_create'),
-    path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('posts/<int:post_id>/', read_views.post_detail, name='post_detail'),
     path('posts/<int:post_id>/reply/', views.create_reply, name='reply_create'),
 
+    # Служебное
+    path('staff/cache-stats/', views.cache_stats, name='cache_stats'),
+    path('staff/request-stats/', views.request_stats, name='request_stats'),
+
     # API-эндпоинты
-    path('api/posts/', views.api_posts, name='api_posts'),
+    path('api/posts/', read_views.api_posts, name='api_posts'),
+    path('api/replies/', views.api_replies, name='api_replies'),
+    path('api/search/', views.api_search, name='api_search'),
 
     path('upload/', csrf_exempt(ckeditor_views.upload)), # Загрузка файлов для CKEditor
     path('browse/', csrf_exempt(ckeditor_views.browse)), # Просмотр загруженных файлов
@@ -1,26 +1,34 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import login, authenticate, logout
 from django.contrib import messages
-from django.core.mail import send_mail
-from django.http import HttpResponseForbidden, JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.conf import settings
-import random
-import string
-
-from .forms import RegisterForm, PostForm, ReplyForm
-from .models import Post, Reply, Category, User
+from django.db import router, transaction
+from django.db.models import OuterRef, Subquery, Sum
+from asgiref.sync import sync_to_async
+from urllib.parse import urlencode
+
+from .cache import all_cache_stats
+from .conditional import conditional_view
+from .confirmation import make_confirmation_token, user_by_confirmation_token
+from .events import event_stream, parse_last_event_id, streaming_supported
+from .metrics import view_counters
+from .forms import RegisterForm, PostForm, ReplyForm, NotificationSettingsForm
+from .mail import enqueue_email
+from .models import FeedVersion, Post, Reply, Category, User
+from .pagination import older_than, paginate_keyset
+from .ratelimit import client_ip, concurrency_limit, current_user, post_field, rate_limit
+from .search import search_posts
+from .serializers import PostSerializer, ReplySerializer, stream_page
 
 
 
 """ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ"""
 
-def generate_confirmation_code():
-    """Генерация кода подтверждения"""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=20))
-
-def send_confirmation_email(user, code):
-    """Отправка email с кодом подтверждения регистрации"""
+def send_confirmation_email(user):
+    """Постановка в очередь письма с кодом подтверждения регистрации (подписанный токен)"""
+    code = make_confirmation_token(user)
     subject = 'Подтверждение регистрации'
     message = f'''Здравствуйте, {user.username}!
 
@@ -31,21 +39,90 @@ def send_confirmation_email(user, code):
 
 Спасибо за регистрацию!'''
 
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        fail_silently=False,
+    enqueue_email(
+        dedup_key=f'confirm:{user.pk}:{code}',
+        recipient=user.email,
+        subject=subject,
+        body=message,
     )
 
 """ГЛАВНАЯ СТРАНИЦА"""
+def home_queryset():
+    """Объявления для ленты (общая часть синхронной и асинхронной версий)"""
+    return (
+        Post.objects
+        .select_related('author', 'category')  # Автор и категория одним JOIN
+        .defer(*Post.HEAVY_FIELDS)  # Карточке хватает готового анонса
+    )
+
+
+def home_context(page):
+    return {
+        'posts': page,
+        'page': page,
+    }
+
+
+def feed_stamps(posts):
+    """
+    Последнее изменение объявления (индекс по updated_at) и FeedVersion - одним запросом
+    FeedVersion растёт при удалениях и переименованиях, которые не меняют updated_at;
+    без строки версии - None (условный ответ не выдаётся)
+    """
+    last = Subquery(posts.order_by('-updated_at').values('updated_at')[:1])
+    stamps = FeedVersion.objects.filter(pk=1).annotate(last=last).values_list('last', 'version').first()
+    return list(stamps) if stamps else None
+
+
+def feed_freshness(request):
+    """Версия ленты"""
+    return feed_stamps(Post.objects.all())
+
+
+@conditional_view(feed_freshness, personal=True)
 def home(request):
-    """Главная страница со списком всех объявлений"""
-    posts = Post.objects.all().order_by('-created_at')  # Сортировка по дате
-    return render(request, 'mmo_board_chat/home.html', {'posts': posts})
+    """Главная страница со списком объявлений, постранично по курсору"""
+    posts = home_queryset()
+    try:
+        page = paginate_keyset(posts, before=request.GET.get('before'), after=request.GET.get('after'))
+    except ValueError:
+        # Битый курсор - показываем первую страницу
+        page = paginate_keyset(posts)
+    return render(request, 'mmo_board_chat/home.html', home_context(page))
+
+"""ПОИСК"""
+
+SEARCH_PAGE_SIZE = 20
+
+
+def _search_page_number(request):
+    try:
+        return max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return 1
+
+
+def search(request):
+    """Полнотекстовый поиск по объявлениям"""
+    query = request.GET.get('q', '').strip()
+    page = _search_page_number(request)
+    results, has_next = search_posts(query, page=page, per_page=SEARCH_PAGE_SIZE)
+    return render(request, 'mmo_board_chat/search.html', {
+        'query': query,
+        'results': results,
+        'page_number': page,
+        'has_next': has_next,
+    })
 
 """АУТЕНТИФИКАЦИЯ"""
+
+# Проверка пароля и регистрация хешируют пароль (PBKDF2) - число одновременных ограничено
+auth_slots = concurrency_limit('auth', settings.AUTH_MAX_CONCURRENT)
+
+
+@rate_limit('login:ip', client_ip)
+@rate_limit('login:account', post_field('username'))
+@auth_slots
 def login_view(request):
     """Обработка входа пользователя"""
     if request.method == 'POST':
@@ -68,13 +145,16 @@ def login_view(request):
     next_url = request.GET.get('next', '')
     return render(request, 'mmo_board_chat/login.html', {'next': next_url})
 
+@rate_limit('register:ip', client_ip)
+@auth_slots
 def register_view(request):
     """Регистрация нового пользователя"""
     if request.method == 'POST':
         form = RegisterForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            send_confirmation_email(user, user.confirmation_code)
+            with transaction.atomic():
+                user = form.save()
+                send_confirmation_email(user)
             messages.success(request, 'Проверьте email для подтверждения')
             return redirect('mmo_board_chat:confirm_email_manual')
     else:
@@ -83,21 +163,26 @@ def register_view(request):
     return render(request, 'mmo_board_chat/register.html', {'form': form})
 
 
+def _confirm_user(request, user):
+    """Отметка о подтверждении и вход"""
+    user.email_confirmed = True
+    user.save(update_fields=['email_confirmed'])
+    login(request, user)
+
+
+@rate_limit('confirm:ip', client_ip, methods=('GET',))
 def confirm_email(request, code):
     """Автоподтверждение email по ссылке"""
-    try:
-        user = User.objects.get(confirmation_code=code)
-        user.email_confirmed = True
-        user.confirmation_code = ''
-        user.save()
-        login(request, user)
-        messages.success(request, 'Email подтвержден!')
-        return redirect('mmo_board_chat:profile')
-    except User.DoesNotExist:
-        messages.error(request, 'Неверный код')
+    user = user_by_confirmation_token(code)
+    if user is None:
+        messages.error(request, 'Неверный или устаревший код')
         return redirect('mmo_board_chat:home')
+    _confirm_user(request, user)
+    messages.success(request, 'Email подтвержден!')
+    return redirect('mmo_board_chat:profile')
 
 
+@rate_limit('confirm:ip', client_ip)
 def confirm_email_manual(request):
     """Ручной ввод кода подтверждения (альтернатива ссылке)"""
     if request.method == 'POST':
@@ -106,35 +191,27 @@ def confirm_email_manual(request):
             messages.error(request, 'Пожалуйста, введите код подтверждения')
             return render(request, 'mmo_board_chat/confirm_email.html')
 
-        try:
-            # Ищем пользователя с таким кодом подтверждения
-            user = User.objects.get(confirmation_code=code)
-
-            # Подтверждаем email
-            user.email_confirmed = True
-            user.confirmation_code = ''  # Удаляем использованный код
-            user.save()
-
-            # Авторизуем пользователя
-            login(request, user)
-
-            messages.success(request, 'Email успешно подтвержден!')
-            return redirect('mmo_board_chat:profile')
-
-        except User.DoesNotExist:
-            messages.error(request, 'Неверный код подтверждения')
+        # Проверяем подпись и срок кода, ищем пользователя по id из него
+        user = user_by_confirmation_token(code)
+        if user is None:
+            messages.error(request, 'Неверный или устаревший код подтверждения')
             return render(request, 'mmo_board_chat/confirm_email.html')
 
+        # Подтверждаем email и авторизуем пользователя
+        _confirm_user(request, user)
+        messages.success(request, 'Email успешно подтвержден!')
+        return redirect('mmo_board_chat:profile')
+
     # GET-запрос - просто отображаем форму
     return render(request, 'mmo_board_chat/confirm_email.html')
 
+@rate_limit('resend:ip', client_ip, methods=('GET', 'POST'))
+@rate_limit('resend:account', current_user, methods=('GET', 'POST'))
 def resend_code(request):
     """Повторная отправка кода подтверждения"""
     if request.user.is_authenticated and not request.user.email_confirmed:
-        code = request.user.generate_confirmation_code()
-
-        # Отправка письма (используйте вашу функцию отправки)
-        send_confirmation_email(request.user, code)
+        # Новый токен не сохраняется - пишется только письмо в очередь
+        send_confirmation_email(request.user)
 
         messages.success(request, 'Новый код подтверждения отправлен на ваш email')
     else:
@@ -167,10 +244,30 @@ def create_post(request):
         'title': 'Создание объявления'
     })
 
+def post_replies(post):
+    """Отклики объявления с авторами (одним JOIN)"""
+    return Reply.objects.filter(post=post).select_related('author').order_by('-created_at')
+
+
+def post_freshness(request, post_id):
+    """
+    Версия страницы объявления одним запросом: Post.updated_at (меняется и при
+    изменении счётчиков откликов) и время последнего отклика; None - объявления нет
+    """
+    last_reply = Reply.objects.filter(post=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+    return (
+        Post.objects.filter(pk=post_id)
+        .annotate(last_reply=Subquery(last_reply))
+        .values_list('updated_at', 'last_reply')
+        .first()
+    )
+
+
+@conditional_view(post_freshness, personal=True)
 def post_detail(request, post_id):
     """Просмотр деталей объявления с откликами"""
-    post = get_object_or_404(Post, id=post_id)
-    replies = Reply.objects.filter(post=post).order_by('-created_at')
+    post = get_object_or_404(Post.objects.select_related('author', 'category'), id=post_id)
+    replies = post_replies(post)
 
     if request.method == 'POST' and request.user.is_authenticated:
         form = ReplyForm(request.POST)
@@ -178,16 +275,9 @@ def post_detail(request, post_id):
             reply = form.save(commit=False)
             reply.author = request.user
             reply.post = post
-            reply.save()
-
-            # Отправка уведомления автору поста
-            send_mail(
-                subject=f'Новый отклик на ваше объявление "{post.title}"',
-                message=f'Пользователь {request.user.username} оставил отклик:\n\n{reply.text}',
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[post.author.email],
-                fail_silently=True,
-            )
+            # Уведомление автору поста ставится в очередь сигналом в той же транзакции
+            with transaction.atomic():
+                reply.save()
 
             messages.success(request, 'Ваш отклик успешно отправлен!')
             return redirect('mmo_board_chat:post_detail', post_id=post.id)
@@ -202,35 +292,126 @@ def post_detail(request, post_id):
 
 """РАБОТА С ОТКЛИКАМИ"""
 
-@login_required
-def profile(request):
-    """"Приватная страница с откликами на объявления пользователя"""
-    # Получаем все отклики на объявления пользователя
-    replies = Reply.objects.filter(post__author=request.user).order_by('-created_at')
+def profile_filters(request):
+    """Фильтры страницы откликов: статус и id объявления (непроверенный id отбрасывается)"""
+    status_filter = request.GET.get('status')
+    post_filter = request.GET.get('post', '')
+    if not post_filter.isdigit():
+        post_filter = ''
+    return status_filter, post_filter
+
+
+def profile_replies(user, status_filter, post_filter):
+    """Отклики на объявления пользователя; автор и объявление - одним JOIN"""
+    replies = (
+        Reply.objects
+        .filter(post__author=user)
+        .select_related('author', 'post')
+        .only('id', 'text', 'created_at', 'is_accepted', 'author__username', 'post__id', 'post__title')
+    )
 
     # Фильтрация по статусу (принятые/непринятые)
-    status_filter = request.GET.get('status')
     if status_filter == 'accepted':
         replies = replies.filter(is_accepted=True)
     elif status_filter == 'pending':
         replies = replies.filter(is_accepted=False)
 
     # Фильтрация по конкретному объявлению
-    post_filter = request.GET.get('post')
     if post_filter:
         replies = replies.filter(post_id=post_filter)
+    return replies
+
+
+def profile_counted_posts(user, post_filter):
+    """
+    Объявления, по счётчикам которых считаются фильтры по статусу -
+    один агрегирующий запрос по денормализованным счётчикам, а не COUNT(*) по откликам
+    """
+    posts = Post.objects.filter(author=user)
+    if post_filter:
+        posts = posts.filter(pk=post_filter)
+    return posts
+
+
+def profile_user_posts(user):
+    """Объявления пользователя для выпадающего списка - только id и заголовок"""
+    return Post.objects.filter(author=user).only('id', 'title').order_by('-created_at')
+
+
+PROFILE_TOTALS = {'all': Sum('reply_count'), 'accepted': Sum('accepted_reply_count')}
+
 
-    # Получаем все объявления пользователя для фильтра
-    user_posts = Post.objects.filter(author=request.user)
+def profile_context(request, page, user_posts, totals, status_filter, post_filter):
+    totals = {key: value or 0 for key, value in totals.items()}
+    totals['pending'] = totals['all'] - totals['accepted']
 
-    context = {
+    # Текущие фильтры - для ссылок на соседние страницы
+    filters = {key: value for key, value in (('status', status_filter), ('post', post_filter)) if value}
+
+    return {
+        'notification_form': NotificationSettingsForm(instance=request.user),
         'user_posts': user_posts,
-        'replies': replies,
+        'replies': page,
+        'page': page,
+        'facets': totals,
+        'replies_total': totals.get(status_filter, totals['all']),
         'current_status': status_filter,
         'current_post': post_filter,
+        'filter_query': urlencode(filters),
+        'live_events': streaming_supported(request),  # Живые уведомления - только под ASGI
     }
+
+
+@login_required
+def profile(request):
+    """"Приватная страница с откликами на объявления пользователя, постранично по курсору"""
+    status_filter, post_filter = profile_filters(request)
+    replies = profile_replies(request.user, status_filter, post_filter)
+    try:
+        page = paginate_keyset(replies, before=request.GET.get('before'), after=request.GET.get('after'))
+    except ValueError:
+        page = paginate_keyset(replies)
+
+    user_posts = profile_user_posts(request.user)
+    totals = profile_counted_posts(request.user, post_filter).aggregate(**PROFILE_TOTALS)
+
+    context = profile_context(request, page, user_posts, totals, status_filter, post_filter)
     return render(request, 'mmo_board_chat/profile.html', context)
 
+
+async def reply_events(request):
+    """
+    Поток живых уведомлений об откликах (Server-Sent Events)
+    Работает только под ASGI: ответ - бесконечный асинхронный генератор.
+    Под WSGI - 204: по стандарту SSE браузер после него не переподключается
+    """
+    if not streaming_supported(request):
+        return HttpResponse(status=204)
+    user_id = await sync_to_async(lambda: request.user.pk if request.user.is_authenticated else None)()
+    if user_id is None:
+        return HttpResponse(status=401)
+
+    last_event_id = parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    )
+    response = StreamingHttpResponse(event_stream(user_id, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Отключение буферизации в nginx
+    return response
+
+
+@login_required
+def notification_settings(request):
+    """Сохранение частоты уведомлений об откликах"""
+    if request.method == 'POST':
+        form = NotificationSettingsForm(request.POST, instance=request.user)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Настройки уведомлений сохранены')
+        else:
+            messages.error(request, 'Не удалось сохранить настройки уведомлений')
+    return redirect('mmo_board_chat:profile')
+
 @login_required
 def reply_accept(request, reply_id):
     """Принятие отклика на объявление"""
@@ -240,10 +421,8 @@ def reply_accept(request, reply_id):
     if request.user != reply.post.author:
         return HttpResponseForbidden()
 
-    reply.is_accepted = True
-    reply.save()
-
-    messages.success(request, f'Отклик от {reply.author.username} принят!')
+    if reply.accept():  # Отклик, счётчики и письмо - одной транзакцией
+        messages.success(request, f'Отклик от {reply.author.username} принят!')
     return redirect('mmo_board_chat:profile')
 
 @login_required
@@ -255,8 +434,8 @@ def reply_delete(request, reply_id):
     if request.user not in [reply.post.author, reply.author]:
         return HttpResponseForbidden()
 
-    reply.delete()
-    messages.success(request, 'Отклик удалён.')
+    if reply.remove():
+        messages.success(request, 'Отклик удалён.')
     return redirect('mmo_board_chat:profile')
 
 @login_required
@@ -268,8 +447,8 @@ def delete_reply(request, reply_id):
     if request.user not in [reply.post.author, reply.author]:
         return HttpResponseForbidden()
 
-    reply.delete()
-    messages.success(request, 'Отклик удалён.')
+    if reply.remove():
+        messages.success(request, 'Отклик удалён.')
     return redirect('mmo_board_chat:post_detail', post_id=post_id)
 
 @login_required
@@ -277,16 +456,131 @@ def create_reply(request, post_id):
     """Создание отклика"""
     return redirect('post_detail', post_id=post_id)
 
-"""API"""
-def api_posts(request):
-    return JsonResponse({'posts': []})  # Заглушка для API
+"""СЛУЖЕБНЫЕ СТРАНИЦЫ"""
 
+@user_passes_test(lambda user: user.is_staff)
+def cache_stats(request):
+    """Попадания/промахи кешей текущего процесса - для настройки размера и TTL"""
+    return JsonResponse(all_cache_stats())
 
 
+@user_passes_test(lambda user: user.is_staff)
+def request_stats(request):
+    """Средние время, число SQL-запросов и повторов по каждому view текущего процесса"""
+    return JsonResponse(view_counters.snapshot())
 
+"""API"""
 
+API_DEFAULT_LIMIT = 50
+API_MAX_LIMIT = 1000
 
 
+def _int_param(request, name, default=None):
+    """Целочисленный GET-параметр; при мусоре - ValueError с понятным текстом"""
+    value = request.GET.get(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'Параметр {name} должен быть целым числом')
+
 
+def api_page_response(request, queryset, serializer_class, stream=stream_page):
+    """
+    Общая часть списочных API: поля, лимит, курсор и потоковый ответ
+    stream - stream_page или astream_page (для async-view)
+    Ошибки параметров возвращаются как 400 с описанием
+    """
+    try:
+        serializer = serializer_class(request.GET.get('fields'))
+        limit = min(max(_int_param(request, 'limit', API_DEFAULT_LIMIT), 1), API_MAX_LIMIT)
+        cursor = request.GET.get('cursor')
+        if cursor:
+            queryset = older_than(queryset, cursor)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    # Ответ читается после выхода из view, поэтому база (копия или основная) выбирается сейчас
+    queryset = queryset.using(router.db_for_read(queryset.model)).order_by('-created_at', '-id')
+    return StreamingHttpResponse(stream(queryset, serializer, limit), content_type='application/json')
+
+
+def api_posts_queryset(request):
+    """Объявления с фильтрами из параметров запроса; при неверном параметре - ValueError"""
+    posts = Post.objects.all()
+    category = request.GET.get('category')
+    if category:
+        posts = posts.filter(category__name=category)
+    author = _int_param(request, 'author')
+    if author is not None:
+        posts = posts.filter(author_id=author)
+    return posts
+
+
+def api_posts_freshness(request):
+    """Версия выборки API: последнее изменение среди отфильтрованных объявлений и версия ленты"""
+    try:
+        posts = api_posts_queryset(request)
+    except ValueError:
+        return None
+    return feed_stamps(posts)
 
 
+@conditional_view(api_posts_freshness)
+def api_posts(request):
+    """
+    Список объявлений
+    Параметры: cursor, limit, fields, category (код категории), author (id автора)
+    """
+    try:
+        posts = api_posts_queryset(request)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return api_page_response(request, posts, PostSerializer)
+
+
+def api_search(request):
+    """
+    Поиск объявлений
+    Параметры: q (строка поиска), page (номер страницы)
+    """
+    page = _search_page_number(request)
+    results, has_next = search_posts(request.GET.get('q', ''), page=page, per_page=SEARCH_PAGE_SIZE)
+    return JsonResponse({
+        'results': [
+            {
+                'id': result.post.id,
+                'title': result.post.title,
+                'category': result.post.category.name,
+                'author': result.post.author.username,
+                'created_at': result.post.created_at,
+                'snippet': result.snippet,
+                'rank': result.rank,
+            }
+            for result in results
+        ],
+        'page': page,
+        'has_next': has_next,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+def api_replies(request):
+    """
+    Список откликов
+    Параметры: cursor, limit, fields, post (id объявления), author (id автора), accepted (1/0)
+    """
+    replies = Reply.objects.all()
+    try:
+        post = _int_param(request, 'post')
+        author = _int_param(request, 'author')
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    if post is not None:
+        replies = replies.filter(post_id=post)
+    if author is not None:
+        replies = replies.filter(author_id=author)
+    accepted = request.GET.get('accepted')
+    if accepted in ('1', '0'):
+        replies = replies.filter(is_accepted=accepted == '1')
+    return api_page_response(request, replies, ReplySerializer)